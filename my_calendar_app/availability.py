@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+from typing import Iterable, List, Tuple
+
+# 勤務時間（開始時, 終了時。空き時間の検索とstatsの稼働率で共通）と、候補にする空き時間の最短の長さ（分）
+WORK_HOURS = (9, 18)
+MIN_SLOT_MINUTES = 30
+
+def merge_intervals(intervals: Iterable[Tuple[datetime, datetime]]) -> List[Tuple[datetime, datetime]]:
+    """
+    重なっているか接している時間帯をまとめる
+
+    Args:
+        intervals: (開始, 終了)の時間帯
+
+    Returns:
+        List[Tuple[datetime, datetime]]: まとめた時間帯（開始順）
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+def working_windows(start: datetime, end: datetime, work_hours: Tuple[int, int] = WORK_HOURS,
+                    weekdays_only: bool = True) -> List[Tuple[datetime, datetime]]:
+    """
+    期間内の日ごとの勤務時間帯を返す
+
+    Args:
+        start: 期間の開始日（0時）
+        end: 期間の最終日（0時、この日を含む）
+        work_hours: 勤務時間（開始時, 終了時）
+        weekdays_only: Trueなら土日を除く
+
+    Returns:
+        List[Tuple[datetime, datetime]]: 勤務時間帯
+    """
+    windows = []
+    day = start
+    while day <= end:
+        if not weekdays_only or day.weekday() < 5:
+            windows.append((day.replace(hour=work_hours[0]), day.replace(hour=work_hours[1])))
+        day += timedelta(days=1)
+    return windows
+
+def free_slots(busy: Iterable[Tuple[datetime, datetime]], windows: List[Tuple[datetime, datetime]],
+               min_minutes: int = MIN_SLOT_MINUTES) -> List[Tuple[datetime, datetime]]:
+    """
+    勤務時間帯から予定の入っている時間を除いた空き時間を返す
+
+    複数のアカウントの予定をまとめて渡すと、全員が空いている時間になる。
+
+    Args:
+        busy: 予定が入っている時間帯（重なっていてもよい）
+        windows: 空き時間を探す時間帯（開始順、互いに重ならない）
+        min_minutes: これより短い空き時間は返さない
+
+    Returns:
+        List[Tuple[datetime, datetime]]: 空き時間（開始順）
+    """
+    busy = merge_intervals(busy)
+    min_length = timedelta(minutes=min_minutes)
+    slots = []
+    index = 0
+    for window_start, window_end in windows:
+        # 前の時間帯より前に終わる予定は以降の時間帯にも関係しない
+        while index < len(busy) and busy[index][1] <= window_start:
+            index += 1
+        cursor = window_start
+        position = index
+        while position < len(busy) and busy[position][0] < window_end:
+            busy_start, busy_end = busy[position]
+            if busy_start - cursor >= min_length:
+                slots.append((cursor, busy_start))
+            cursor = max(cursor, busy_end)
+            position += 1
+        if window_end - cursor >= min_length:
+            slots.append((cursor, window_end))
+    return slots
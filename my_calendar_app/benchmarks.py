@@ -0,0 +1,292 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from local_data_manager import (
+    load_events,
+    save_events,
+    save_deleted_events,
+    migrate_to_shards,
+    EventStore,
+    SNAPSHOT_SUFFIX
+)
+
+# 計測する件数（1M件はYAMLの書き出しだけで数分かかるため、既定では含めない）
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+MAX_SIZE = 1_000_000
+
+# 計測する操作
+#   load_yaml: スナップショットのない状態からの読み込み（YAMLの解析）
+#   load: スナップショットがある状態からの読み込み
+#   save: 全件の保存
+#   add/update/delete: 1件の追加・更新・削除（コマンド1回分。読み込みと保存を含む）
+#   archive: 削除済みイベントファイルへの1件の追加（ファイルの件数は計測する件数と同じ）
+OPERATIONS = ('load_yaml', 'load', 'save', 'add', 'update', 'delete', 'archive')
+LAYOUTS = ('flat', 'sharded')
+
+# 回帰とみなす、件数が10倍になったときの時間の増え方の上限（指数。1.0で件数に比例）
+# 削除済みイベントへの追加はどちらの保存形式でも件数によらず一定であるべき
+MAX_SCALING_EXPONENTS = {
+    'flat': {'load_yaml': 1.3, 'load': 1.3, 'save': 1.3, 'add': 1.3, 'update': 1.3, 'delete': 1.3, 'archive': 0.5},
+    'sharded': {'load_yaml': 1.3, 'load': 1.3, 'save': 1.3, 'add': 1.0, 'update': 1.0, 'delete': 1.0, 'archive': 0.5},
+}
+
+# 分割保存の1件の変更は、シャード1つと対応表（件数に比例するが小さい）の読み書きだけなので、
+# 同じ件数の1ファイルの保存形式より少なくともこの倍率だけ速いはず（件数が少ないと差が出ないため、
+# MIN_SIZE_FOR_SPEEDUP件以上のときだけ判定する）
+MIN_SHARDED_SPEEDUP = {'add': 5.0, 'update': 5.0, 'delete': 5.0}
+MIN_SIZE_FOR_SPEEDUP = 5_000
+
+# 回帰とみなす、1件あたりのメモリ使用量のピーク（バイト）
+MAX_PEAK_BYTES_PER_EVENT = {'load_yaml': 16 * 1024, 'load': 2 * 1024, 'save': 8 * 1024}
+
+# 生成するイベントの1か月あたりの件数（件数が増えると期間が延び、シャードの大きさは一定になる）
+EVENTS_PER_MONTH = 200
+
+# これより短い計測は誤差が大きいため、増え方の判定に使わない（秒）
+MIN_SECONDS_FOR_SCALING = 0.01
+
+TITLES = ['定例ミーティング', 'プロジェクト進捗確認', '1on1面談', '顧客打ち合わせ（東京本社）', '週次レビュー',
+          '採用面接', '勉強会：Python入門', '経費精算の締め切り', '歯医者の予約', 'リリース作業']
+DETAILS = [None, 'オンライン（Google Meet）', '会議室A\n資料は事前に共有フォルダへ',
+           'アジェンダ:\n- 先週の振り返り\n- 今週の予定', '持ち物：ノートPC、名刺']
+RECURRENCES = [None, None, None, 'daily', 'weekly', 'monthly', 'weekday']
+
+def synthetic_events(count: int, seed: int = 0, start: datetime = datetime(2020, 1, 1)) -> Iterator[Dict]:
+    """
+    日本語のタイトル・詳細と繰り返しを含む、計測用のイベントを生成
+
+    開始日時は1か月あたりEVENTS_PER_MONTH件程度になるよう件数に応じた期間に散らばる
+    （1万件で約4年、100万件で約400年）。
+
+    Args:
+        count: 生成する件数
+        seed: 乱数の種（同じ値なら同じイベントを生成する）
+        start: 最初の日
+
+    Yields:
+        Dict: ローカル形式のイベント
+    """
+    generator = random.Random(seed)
+    days = max(30, count * 30 // EVENTS_PER_MONTH)
+    for number in range(count):
+        begin = start + timedelta(days=generator.randrange(days), hours=generator.randrange(8, 20),
+                                  minutes=generator.choice((0, 15, 30, 45)))
+        yield {
+            'id': f'bench{number:07d}',
+            'title': f"{generator.choice(TITLES)} #{number}",
+            'start_datetime': begin.strftime("%Y-%m-%d %H:%M"),
+            'end_datetime': (begin + timedelta(minutes=generator.choice((30, 60, 90)))).strftime("%Y-%m-%d %H:%M"),
+            'detail': generator.choice(DETAILS),
+            'recurrence': generator.choice(RECURRENCES),
+        }
+
+def measure(operation: Callable[[], any], trace_memory: bool = False) -> Tuple[float, Optional[int]]:
+    """
+    操作の時間（とメモリ使用量のピーク）を計測
+
+    tracemallocは実行を遅くするため、時間とメモリは別々に計測すること。
+
+    Returns:
+        Tuple[float, Optional[int]]: (秒, trace_memoryならピークのバイト数、そうでなければNone)
+    """
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            operation()
+            return 0.0, tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    started = time.perf_counter()
+    operation()
+    return time.perf_counter() - started, None
+
+def _build_base(directory: str, count: int, layout: str) -> Dict:
+    """計測の元になるイベントファイルと削除済みイベントファイルを作成"""
+    events = list(synthetic_events(count))
+    events_file = os.path.join(directory, 'events.yml')
+    save_events(events_file, events)
+    if layout == 'sharded':
+        migrate_to_shards(events_file)
+        os.remove(f"{events_file}.bak")
+    save_deleted_events([dict(event) for event in synthetic_events(count, seed=1)],
+                        os.path.join(directory, 'deletedevents.yml'))
+    return {'events': events, 'target': events[count // 2]['id']}
+
+def _operation(name: str, directory: str, base: Dict) -> Callable[[], any]:
+    """計測する操作を作成（directoryは元のファイルのコピー）"""
+    events_file = os.path.join(directory, 'events.yml')
+    deleted_events_file = os.path.join(directory, 'deletedevents.yml')
+    added = {'id': 'benchadded', 'title': '追加した予定', 'start_datetime': '2022-06-15 10:00',
+             'end_datetime': '2022-06-15 11:00', 'detail': '計測用', 'recurrence': None}
+
+    if name == 'load_yaml':
+        for root, _, files in os.walk(directory):
+            for file_name in files:
+                if file_name.endswith(SNAPSHOT_SUFFIX):
+                    os.remove(os.path.join(root, file_name))
+        return lambda: load_events(events_file)
+    if name == 'load':
+        return lambda: load_events(events_file)
+    if name == 'save':
+        return lambda: save_events(events_file, base['events'])
+    if name == 'archive':
+        return lambda: save_deleted_events([dict(added)], deleted_events_file)
+
+    def change():
+        store = EventStore(events_file)
+        if name == 'add':
+            store.add(dict(added))
+        elif name == 'update':
+            store.update(base['target'], {'title': '変更後のタイトル'})
+        else:
+            removed = store.delete(base['target'])
+            save_deleted_events([removed.copy()], deleted_events_file)
+        store.save()
+    return change
+
+def run_benchmarks(sizes: Tuple[int, ...] = DEFAULT_SIZES, layouts: Tuple[str, ...] = LAYOUTS,
+                   operations: Tuple[str, ...] = OPERATIONS, repeat: int = 3,
+                   progress: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
+    """
+    件数ごと・保存形式ごとに各操作の時間とメモリ使用量のピークを計測
+
+    操作は毎回、元のファイルのコピーに対して行う。時間はrepeat回の最小値。
+
+    Args:
+        sizes: 計測する件数
+        layouts: 'flat'（1ファイル）と'sharded'（月別に分割）のどれを計測するか
+        operations: 計測する操作（OPERATIONSのうち）
+        repeat: 時間を計測する回数
+        progress: 計測結果を1件ずつ受け取る関数
+
+    Returns:
+        List[Dict]: size, layout, operation, seconds, peak_bytesを持つ計測結果
+    """
+    rows = []
+    with tempfile.TemporaryDirectory(prefix='calendar-bench-') as root:
+        for layout in layouts:
+            for size in sizes:
+                base_dir = os.path.join(root, f"{layout}-{size}")
+                os.makedirs(base_dir)
+                base = _build_base(base_dir, size, layout)
+                for name in operations:
+                    samples = []
+                    for attempt in range(repeat + 1):
+                        work_dir = os.path.join(root, 'work')
+                        shutil.copytree(base_dir, work_dir)
+                        try:
+                            # 最後の1回はtracemallocでメモリ使用量のピークだけを計測する
+                            samples.append(measure(_operation(name, work_dir, base), trace_memory=attempt == repeat))
+                        finally:
+                            shutil.rmtree(work_dir)
+                    row = {'size': size, 'layout': layout, 'operation': name,
+                           'seconds': min(seconds for seconds, _ in samples[:-1]), 'peak_bytes': samples[-1][1]}
+                    rows.append(row)
+                    if progress:
+                        progress(row)
+                shutil.rmtree(base_dir)
+    return rows
+
+def scaling_exponents(rows: List[Dict]) -> List[Dict]:
+    """
+    隣り合う件数の間で、時間が件数の何乗で増えたかを計算（スケーリングの曲線）
+
+    Returns:
+        List[Dict]: layout, operation, from_size, to_size, exponentを持つ結果。
+            短すぎて誤差の大きい計測の区間はexponentがNone
+    """
+    curves = []
+    grouped: Dict[Tuple[str, str], List[Dict]] = {}
+    for row in rows:
+        grouped.setdefault((row['layout'], row['operation']), []).append(row)
+    for (layout, operation), group in grouped.items():
+        group = sorted(group, key=lambda row: row['size'])
+        for smaller, larger in zip(group, group[1:]):
+            exponent = None
+            if larger['seconds'] >= MIN_SECONDS_FOR_SCALING and smaller['seconds'] > 0:
+                exponent = math.log(larger['seconds'] / smaller['seconds']) / math.log(larger['size'] / smaller['size'])
+            curves.append({'layout': layout, 'operation': operation, 'from_size': smaller['size'],
+                           'to_size': larger['size'], 'exponent': exponent})
+    return curves
+
+def check_thresholds(rows: List[Dict]) -> List[str]:
+    """
+    計測結果を回帰の上限と比べる
+
+    Returns:
+        List[str]: 上限を超えたものの説明（なければ空リスト）
+    """
+    violations = []
+    for curve in scaling_exponents(rows):
+        limit = MAX_SCALING_EXPONENTS[curve['layout']].get(curve['operation'])
+        if curve['exponent'] is not None and limit is not None and curve['exponent'] > limit:
+            violations.append(f"{curve['layout']}/{curve['operation']}: {curve['from_size']}件→{curve['to_size']}件で"
+                              f"時間が件数の{curve['exponent']:.2f}乗で増えています（上限 {limit}）")
+    flat = {(row['operation'], row['size']): row['seconds'] for row in rows if row['layout'] == 'flat'}
+    for row in rows:
+        minimum = MIN_SHARDED_SPEEDUP.get(row['operation'])
+        baseline = flat.get((row['operation'], row['size']))
+        if (row['layout'] == 'sharded' and minimum is not None and baseline and row['size'] >= MIN_SIZE_FOR_SPEEDUP
+                and row['seconds'] >= MIN_SECONDS_FOR_SCALING):
+            if baseline / row['seconds'] < minimum:
+                violations.append(f"sharded/{row['operation']}: {row['size']}件で1ファイルの保存形式の"
+                                  f"{baseline / row['seconds']:.1f}倍の速さしかありません（下限 {minimum}倍）")
+    for row in rows:
+        limit = MAX_PEAK_BYTES_PER_EVENT.get(row['operation'])
+        if limit is not None and row['peak_bytes'] is not None and row['peak_bytes'] > limit * row['size']:
+            violations.append(f"{row['layout']}/{row['operation']}: {row['size']}件でメモリのピークが"
+                              f"1件あたり{row['peak_bytes'] // row['size']}バイトです（上限 {limit}）")
+    return violations
+
+def format_row(row: Dict) -> str:
+    """計測結果を1行の表示にする"""
+    return (f"{row['layout']:<8}{row['operation']:<10}{row['size']:>10,}件"
+            f"{row['seconds'] * 1000:>12.1f} ms{row['peak_bytes'] / 1024 / 1024:>10.1f} MiB")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """計測を実行して結果を表示（--checkなら回帰の上限を超えた場合に1を返す）"""
+    parser = argparse.ArgumentParser(description='ローカルのイベントファイルの読み書きの計測')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help=f'計測する件数（デフォルト: {" ".join(map(str, DEFAULT_SIZES))}、最大 {MAX_SIZE}）')
+    parser.add_argument('--layout', choices=LAYOUTS + ('both',), default='both', help='計測する保存形式')
+    parser.add_argument('--operations', nargs='+', choices=OPERATIONS, default=list(OPERATIONS),
+                        help='計測する操作')
+    parser.add_argument('--repeat', type=int, default=3, help='時間を計測する回数（最小値を使う）')
+    parser.add_argument('--json', dest='json_file', help='計測結果とスケーリングの曲線を書き出すJSONファイル')
+    parser.add_argument('--check', action='store_true', help='回帰の上限を超えたら終了コード1で終了する')
+    args = parser.parse_args(argv)
+    if any(size <= 0 or size > MAX_SIZE for size in args.sizes):
+        parser.error(f"件数は1から{MAX_SIZE}までで指定してください")
+
+    layouts = LAYOUTS if args.layout == 'both' else (args.layout,)
+    print(f"{'layout':<8}{'operation':<10}{'size':>11}{'time':>15}{'peak':>14}")
+    rows = run_benchmarks(tuple(sorted(args.sizes)), layouts, tuple(args.operations), repeat=args.repeat,
+                          progress=lambda row: print(format_row(row), flush=True))
+
+    print("\nスケーリング（件数が増えたときの時間の増え方。1.0で件数に比例）")
+    curves = scaling_exponents(rows)
+    for curve in curves:
+        exponent = '-' if curve['exponent'] is None else f"{curve['exponent']:.2f}"
+        print(f"  {curve['layout']:<8}{curve['operation']:<10}{curve['from_size']:>10,}→{curve['to_size']:<10,}{exponent:>6}")
+    if args.json_file:
+        with open(args.json_file, 'w', encoding='utf-8') as f:
+            json.dump({'measured_at': datetime.now().isoformat(timespec='seconds'), 'results': rows,
+                       'scaling': curves}, f, ensure_ascii=False, indent=2)
+
+    violations = check_thresholds(rows)
+    for violation in violations:
+        print(f"⚠️ {violation}")
+    return 1 if args.check and violations else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,23 +1,152 @@
 import argparse
-from datetime import datetime
-from typing import Optional, List, Dict
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Callable, Tuple
+import os
+import re
 import sys
+import json
+import socket
+import httplib2
+from concurrent.futures import ThreadPoolExecutor
+from google.auth.exceptions import TransportError
 from googleapiclient.errors import HttpError
 
 from google_calendar_service import (
     get_authenticated_service,
+    get_or_create_calendar,
     add_event as google_add_event,
     update_event as google_update_event,
     delete_event as google_delete_event,
-    list_events as google_list_events
+    list_events as google_list_events,
+    iter_events as google_iter_events,
+    add_events_batch as google_add_events_batch,
+    delete_events_batch,
+    patch_events_batch,
+    execute_batch,
+    resolve_insert_conflicts,
+    build_event_body,
+    build_patch_body,
+    shift_event_body,
+    recurrence_until,
+    query_busy,
+    to_local_event,
+    event_id_for,
+    new_event_id,
+    enable_response_cache,
+    response_cache_enabled,
+    use_profile,
+    validate_profile,
+    current_profile,
+    profile_path,
+    BATCH_SIZE,
+    CACHE_TTL,
+    CACHE_MAX_ENTRIES,
+    DEFAULT_PROFILE,
+    JST
 )
 from local_data_manager import (
     load_events,
-    save_events,
-    add_local_event,
-    update_local_event,
-    delete_local_event
+    save_deleted_event,
+    save_deleted_events,
+    migrate_to_shards,
+    migrate_to_flat,
+    is_sharded,
+    iter_deleted_events,
+    remove_deleted_events,
+    start_key,
+    EventStore
 )
+from ics_manager import (
+    iter_ics_events,
+    write_ics,
+    ics_signature,
+    load_import_progress,
+    save_import_progress
+)
+from search_index import (
+    load_or_build_index,
+    update_index,
+    source_stamps,
+    search as search_events
+)
+from mutation_queue import (
+    queue_path_for,
+    load_queue,
+    save_queue,
+    enqueue,
+    has_pending,
+    flush_queue
+)
+from calendar_stats import (
+    require_numpy,
+    to_minutes,
+    collect_occurrences,
+    compute_stats,
+    format_stats_table
+)
+from availability import (
+    working_windows,
+    free_slots,
+    WORK_HOURS,
+    MIN_SLOT_MINUTES
+)
+from reminders import (
+    upcoming,
+    watch_reminders,
+    desktop_notify,
+    REMINDER_LEAD_MINUTES
+)
+from prefetch import (
+    record_request,
+    plan_prefetch,
+    start_prefetch,
+    wait_prefetch,
+    PREFETCH_HISTORY_FILE,
+    PREFETCH_RANGES
+)
+from push_sync import (
+    NotificationReceiver,
+    open_channel,
+    close_channel,
+    watch_changes,
+    RECEIVER_HOST,
+    RECEIVER_PORT
+)
+from command_profiler import profile_command
+from script_runner import (
+    parse_operations,
+    schedule_rounds,
+    MUTATIONS,
+    UPDATE_FIELDS
+)
+from sync_manager import (
+    sync_state_path_for,
+    load_sync_state,
+    save_sync_state,
+    fetch_remote_changes,
+    plan_reconcile,
+    apply_remote_plan,
+    content_hash,
+    POLICIES
+)
+
+# Google Calendarに接続できないときに送出される例外（この場合は変更を送信待ちキューに入れる）
+NETWORK_ERRORS = (ConnectionError, TimeoutError, socket.gaierror, httplib2.HttpLib2Error, TransportError)
+
+# 認証、ローカルファイルの読み込み、Google Calendarへのリクエストを並行させるスレッド数
+PIPELINE_WORKERS = 3
+
+def start_pipeline() -> ThreadPoolExecutor:
+    """
+    互いに依存しない処理（認証・ローカルファイルの読み込みなど）を並行させるスレッドプールを作成
+
+    ローカルへの書き込みはGoogle Calendarへの反映が成功してから（または送信待ちキューに
+    入れてから）行うため、ローカルがGoogle Calendarより先に進むことはない。
+
+    Returns:
+        ThreadPoolExecutor: withで使うスレッドプール
+    """
+    return ThreadPoolExecutor(max_workers=PIPELINE_WORKERS)
 
 def format_datetime(datetime_str: str) -> str:
     """日時文字列を見やすい形式に整形"""
@@ -34,10 +163,15 @@ def validate_datetime(datetime_str: str) -> bool:
 
 def handle_add(start_datetime_str: str, end_datetime_str: str, title: str,
               detail: Optional[str] = None, recurrence: Optional[str] = None,
-              events_file: str = "events.yml") -> None:
+              events_file: str = "events.yml", deleted_events_file: str = "deletedevents.yml",
+              defer: bool = False, idempotency_key: Optional[str] = None) -> None:
     """
     イベントを追加
 
+    イベントIDは送信前に決めるため、Google Calendarへの送信中にローカルのイベントファイルを
+    並行して読み込める。同じIDでの再送は作成済みとして扱われるので重複しない。
+    Google Calendarに接続できない場合は、同じIDのままローカルに保存して送信待ちキューに入れる。
+
     Args:
         start_datetime_str: 開始日時 (例: "2024-03-20 15:00")
         end_datetime_str: 終了日時 (例: "2024-03-20 16:00")
@@ -45,6 +179,10 @@ def handle_add(start_datetime_str: str, end_datetime_str: str, title: str,
         detail: イベントの詳細（オプション）
         recurrence: 定期イベントのパターン（オプション）
         events_file: イベントファイルのパス
+        deleted_events_file: 削除済みイベントファイルのパス
+        defer: TrueならGoogle Calendarには送信せず送信待ちキューに入れる
+        idempotency_key: イベントIDを決める冪等キー（オプション）。同じキーで再実行しても
+            イベントは1つだけ作成される。省略時は毎回新しいIDを生成する
     """
     try:
         # 日時のバリデーション
@@ -60,24 +198,49 @@ def handle_add(start_datetime_str: str, end_datetime_str: str, title: str,
             print("エラー: 開始時刻は終了時刻より前である必要があります。")
             sys.exit(1)
 
-        # Google Calendarに追加
-        service = get_authenticated_service()
-        event = google_add_event(service, start_datetime_str, end_datetime_str, title, detail, recurrence=recurrence)
-
-        # ローカルにも保存
-        events = load_events(events_file)
         local_event = {
-            'id': event['id'],
+            'id': event_id_for(idempotency_key) if idempotency_key else new_event_id(),
             'title': title,
             'start_datetime': start_datetime_str,
             'end_datetime': end_datetime_str,
             'detail': detail,
             'recurrence': recurrence
         }
-        updated_events = add_local_event(events, local_event)
-        save_events(events_file, updated_events)
+
+        store = EventStore(events_file)
+        event = None
+        with start_pipeline() as pipeline:
+            # 認証・送信と並行してローカルのイベントファイルを読み込んでおく
+            loading = pipeline.submit(store.prefetch, [local_event])
+            if not defer:
+                connecting = pipeline.submit(get_authenticated_service)
+                try:
+                    # Google Calendarに追加
+                    event = google_add_event(connecting.result(), start_datetime_str, end_datetime_str, title,
+                                             detail, recurrence=recurrence, event_id=local_event['id'])
+                except NETWORK_ERRORS as error:
+                    print(f"⚠️ Google Calendarに接続できません（{error}）")
+            loading.result()
+
+        if event is None:
+            # 同じIDのままローカルに保存し、送信待ちキューに入れる（送信済みだった場合もflushで重複しない）
+            queue_file = queue_path_for(events_file)
+            queue = enqueue(load_queue(queue_file), 'add', local_event['id'],
+                            data={key: value for key, value in local_event.items() if key != 'id'})
+            save_queue(queue_file, queue)
+
+        # ローカルにも保存（月別シャードの場合は該当する月だけを書き込む）
+        stamps = source_stamps(events_file, deleted_events_file)
+        if store.get(local_event['id']) is None:
+            store.add(local_event)
+            store.save()
+        update_index(events_file, deleted_events_file, stamps, upserts=[local_event])
         
-        print(f"\n✨ イベントを追加しました")
+        if event is None:
+            print(f"\n📮 イベントをローカルに追加し、送信待ちにしました（flushコマンドで送信します）")
+        else:
+            print(f"\n✨ イベントを追加しました")
+        print(f"イベントID: {local_event['id']}")
         print(f"タイトル: {title}")
         print(f"開始時刻: {start_datetime_str}")
         print(f"終了時刻: {end_datetime_str}")
@@ -100,10 +263,14 @@ def handle_add(start_datetime_str: str, end_datetime_str: str, title: str,
 def handle_update(event_id: str, new_title: Optional[str] = None,
                  new_start_datetime: Optional[str] = None, new_end_datetime: Optional[str] = None,
                  new_detail: Optional[str] = None, new_recurrence: Optional[str] = None,
-                 events_file: str = "events.yml") -> None:
+                 events_file: str = "events.yml", deleted_events_file: str = "deletedevents.yml",
+                 defer: bool = False) -> None:
     """
     イベントを更新
 
+    Google Calendarに接続できない場合や、送信待ちの変更があるイベントの場合は、
+    ローカルを更新したうえで送信待ちキューに入れる。
+
     Args:
         event_id: 更新対象のイベントID
         new_title: 新しいタイトル（オプション）
@@ -112,6 +279,8 @@ def handle_update(event_id: str, new_title: Optional[str] = None,
         new_detail: 新しい詳細（オプション）
         new_recurrence: 新しい繰り返しパターン（オプション）
         events_file: イベントファイルのパス
+        deleted_events_file: 削除済みイベントファイルのパス
+        defer: TrueならGoogle Calendarには送信せず送信待ちキューに入れる
     """
     try:
         # 日時のバリデーション
@@ -132,19 +301,6 @@ def handle_update(event_id: str, new_title: Optional[str] = None,
                 print("エラー: 開始時刻は終了時刻より前である必要があります。")
                 sys.exit(1)
 
-        # Google Calendarを更新
-        service = get_authenticated_service()
-        event = google_update_event(
-            service, event_id,
-            new_title=new_title,
-            new_start_datetime=new_start_datetime,
-            new_end_datetime=new_end_datetime,
-            new_detail=new_detail,
-            new_recurrence=new_recurrence
-        )
-
-        # ローカルも更新
-        events = load_events(events_file)
         new_data = {}
         if new_title:
             new_data['title'] = new_title
@@ -157,10 +313,48 @@ def handle_update(event_id: str, new_title: Optional[str] = None,
         if new_recurrence:
             new_data['recurrence'] = new_recurrence
 
-        updated_events = update_local_event(events, event_id, new_data)
-        save_events(events_file, updated_events)
+        queue_file = queue_path_for(events_file)
+        store = EventStore(events_file)
+        with start_pipeline() as pipeline:
+            # 送信待ちキュー、ローカルのイベント、認証を並行して準備する
+            loading_queue = pipeline.submit(load_queue, queue_file)
+            loading = pipeline.submit(store.get, event_id)
+            connecting = None if defer else pipeline.submit(get_authenticated_service)
+
+            # 送信待ちの変更があるイベントは、送信の順序を保つためキューに追加する
+            queue = loading_queue.result()
+            deferred = defer or has_pending(queue, event_id)
+            if not deferred:
+                try:
+                    # Google Calendarを更新
+                    event = google_update_event(
+                        connecting.result(), event_id,
+                        new_title=new_title,
+                        new_start_datetime=new_start_datetime,
+                        new_end_datetime=new_end_datetime,
+                        new_detail=new_detail,
+                        new_recurrence=new_recurrence
+                    )
+                except NETWORK_ERRORS as error:
+                    print(f"⚠️ Google Calendarに接続できません（{error}）")
+                    deferred = True
+            base = loading.result()
+
+        # ローカルも更新（Google Calendarの更新が失敗した場合はここに来ない）
+        stamps = source_stamps(events_file, deleted_events_file)
+        if deferred:
+            save_queue(queue_file, enqueue(queue, 'update', event_id, data=new_data,
+                                           base=dict(base) if base else None))
+
+        updated_event = store.update(event_id, new_data)
+        store.save()
+        update_index(events_file, deleted_events_file, stamps,
+                     upserts=[updated_event] if updated_event else [])
         
-        print(f"\n✨ イベントを更新しました")
+        if deferred:
+            print(f"\n📮 イベントをローカルで更新し、送信待ちにしました（flushコマンドで送信します）")
+        else:
+            print(f"\n✨ イベントを更新しました")
         print(f"イベントID: {event_id}")
         if new_title:
             print(f"新しいタイトル: {new_title}")
@@ -186,26 +380,56 @@ def handle_update(event_id: str, new_title: Optional[str] = None,
         print(f"エラー: 予期せぬエラーが発生しました - {str(error)}")
         sys.exit(1)
 
-def handle_delete(event_id: str, events_file: str = "events.yml", deleted_events_file: str = "deletedevents.yml") -> None:
+def handle_delete(event_id: str, events_file: str = "events.yml", deleted_events_file: str = "deletedevents.yml",
+                  defer: bool = False) -> None:
     """
     イベントを削除
 
+    Google Calendarに接続できない場合や、送信待ちの変更があるイベントの場合は、
+    ローカルから削除したうえで送信待ちキューに入れる。
+
     Args:
         event_id: 削除対象のイベントID
         events_file: イベントファイルのパス
         deleted_events_file: 削除済みイベントファイルのパス
+        defer: TrueならGoogle Calendarには送信せず送信待ちキューに入れる
     """
     try:
-        # Google Calendarから削除
-        service = get_authenticated_service()
-        google_delete_event(service, event_id)
+        queue_file = queue_path_for(events_file)
+        store = EventStore(events_file)
+        with start_pipeline() as pipeline:
+            # 送信待ちキュー、ローカルのイベント、認証を並行して準備する
+            loading_queue = pipeline.submit(load_queue, queue_file)
+            loading = pipeline.submit(store.get, event_id)
+            connecting = None if defer else pipeline.submit(get_authenticated_service)
+
+            # 送信待ちの変更があるイベントは、送信の順序を保つためキューに追加する
+            queue = loading_queue.result()
+            deferred = defer or has_pending(queue, event_id)
+            if not deferred:
+                try:
+                    # Google Calendarから削除
+                    google_delete_event(connecting.result(), event_id)
+                except NETWORK_ERRORS as error:
+                    print(f"⚠️ Google Calendarに接続できません（{error}）")
+                    deferred = True
+            loading.result()
 
-        # ローカルからも削除（削除済みイベントとして保存）
-        events = load_events(events_file)
-        updated_events = delete_local_event(events, event_id, deleted_events_file)
-        save_events(events_file, updated_events)
+        # ローカルからも削除（削除済みイベントとして保存。Google Calendarの削除が失敗した場合はここに来ない）
+        stamps = source_stamps(events_file, deleted_events_file)
+        removed = store.delete(event_id)
+        if deferred:
+            save_queue(queue_file, enqueue(queue, 'delete', event_id, base=dict(removed) if removed else None))
+        if removed:
+            save_deleted_event(removed.copy(), deleted_events_file)
+        store.save()
+        update_index(events_file, deleted_events_file, stamps, removals=[event_id],
+                     archived=[removed] if removed else [])
         
-        print(f"\n✨ イベントを削除しました")
+        if deferred:
+            print(f"\n📮 イベントをローカルから削除し、送信待ちにしました（flushコマンドで送信します）")
+        else:
+            print(f"\n✨ イベントを削除しました")
         print(f"イベントID: {event_id}")
 
     except HttpError as error:
@@ -221,58 +445,1009 @@ def handle_delete(event_id: str, events_file: str = "events.yml", deleted_events
         print(f"エラー: 予期せぬエラーが発生しました - {str(error)}")
         sys.exit(1)
 
+def parse_time_bound(value: Optional[str], end_of_day: bool = False) -> Optional[datetime]:
+    """
+    "YYYY-MM-DD"または"YYYY-MM-DD HH:MM"形式の日時を変換
+
+    Args:
+        value: 日時文字列（Noneならそのまま返す）
+        end_of_day: 日付だけの場合に翌日の0時（その日の終わり）にする
+
+    Raises:
+        ValueError: 形式が正しくない場合
+    """
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d %H:%M")
+    except ValueError:
+        day = datetime.strptime(value, "%Y-%m-%d")
+        return day + timedelta(days=1) if end_of_day else day
+
+def handle_restore(event_ids: Optional[List[str]] = None, deleted_after: Optional[str] = None,
+                   deleted_before: Optional[str] = None, title: Optional[str] = None, dry_run: bool = False,
+                   events_file: str = "events.yml", deleted_events_file: str = "deletedevents.yml") -> List[Dict]:
+    """
+    削除済みイベントファイルからイベントを選んでGoogle Calendarとローカルに戻す
+
+    削除済みイベントファイルは先頭から1件ずつ読みながら条件に合うものを選ぶ（同じIDが
+    何度も削除されている場合は最後に削除されたもの）。選んだイベントはバッチリクエストで
+    まとめて追加し、追加できたものだけをローカルに書き込み、削除済みイベントファイルから
+    1回の書き込みで取り除く。IDは元のIDと削除日時から決めるため、再実行しても重複しない。
+
+    Args:
+        event_ids: 戻すイベントのID
+        deleted_after: この日時以降に削除されたもの（"YYYY-MM-DD"または"YYYY-MM-DD HH:MM"）
+        deleted_before: この日時より前に削除されたもの（日付だけならその日を含む）
+        title: タイトルにこの文字列を含むもの（大文字・小文字は区別しない）
+        dry_run: Trueなら戻さずに対象を表示するだけ
+        events_file: イベントファイルのパス
+        deleted_events_file: 削除済みイベントファイルのパス
+
+    Returns:
+        List[Dict]: 戻したイベント（ローカル形式、dry_runの場合は対象のイベント）
+    """
+    try:
+        if not (event_ids or deleted_after or deleted_before or title):
+            print("エラー: --id、--deleted-after、--deleted-before、--titleのいずれかを指定してください。")
+            sys.exit(1)
+        try:
+            after = parse_time_bound(deleted_after)
+            before = parse_time_bound(deleted_before, end_of_day=True)
+        except ValueError:
+            print("エラー: 日時の形式が正しくありません。YYYY-MM-DD または YYYY-MM-DD HH:MM の形式で入力してください。")
+            sys.exit(1)
+        wanted_ids = set(event_ids or [])
+        needle = title.casefold() if title else None
+
+        selected: Dict[str, Dict] = {}
+        for archived in iter_deleted_events(deleted_events_file):
+            if wanted_ids and archived.get('id') not in wanted_ids:
+                continue
+            if needle and needle not in (archived.get('title') or '').casefold():
+                continue
+            if after or before:
+                try:
+                    deleted_at = datetime.strptime(str(archived.get('deleted_at')), "%Y-%m-%d %H:%M:%S")
+                except ValueError:
+                    continue
+                if (after and deleted_at < after) or (before and deleted_at >= before):
+                    continue
+            previous = selected.get(archived.get('id'))
+            if previous is None or str(archived.get('deleted_at')) >= str(previous.get('deleted_at')):
+                selected[archived.get('id')] = archived
+
+        targets = sorted(selected.values(), key=start_key)
+        if not targets:
+            print("\n条件に合う削除済みイベントはありません")
+            return []
+
+        print(f"\n♻️ 戻すイベント: {len(targets)}件")
+        for archived in targets:
+            print(f"  {archived['start_datetime']} {archived['title']}（削除: {archived.get('deleted_at')}）")
+        if dry_run:
+            return targets
+
+        store = EventStore(events_file)
+        with start_pipeline() as pipeline:
+            # 認証とローカルのイベントIDの読み込みを並行させる
+            connecting = pipeline.submit(get_authenticated_service)
+            loading_ids = pipeline.submit(store.ids)
+            service = connecting.result()
+            calendar_id = get_or_create_calendar(service)
+            known_ids = loading_ids.result()
+
+        fields = ('title', 'start_datetime', 'end_datetime', 'detail', 'recurrence')
+        requests = [
+            dict({field: archived.get(field) for field in fields},
+                 id=event_id_for(f"restore:{calendar_id}:{archived['id']}:{archived.get('deleted_at')}"))
+            for archived in targets
+        ]
+        results = google_add_events_batch(service, requests, calendar_id=calendar_id)
+
+        restored = []
+        restored_keys = set()
+        failed = 0
+        for archived, request, (created, error) in zip(targets, requests, results):
+            if error is not None:
+                failed += 1
+                print(f"警告: 「{archived['title']}」を戻せませんでした - {error}")
+                continue
+            restored.append(request)
+            restored_keys.add((archived['id'], archived.get('deleted_at')))
+
+        # Google Calendarに戻せたものだけをローカルに書き込み、削除済みイベントファイルから取り除く
+        stamps = source_stamps(events_file, deleted_events_file)
+        for event in restored:
+            if event['id'] not in known_ids:
+                store.add(event)
+        store.save()
+        remove_deleted_events(deleted_events_file, restored_keys)
+        update_index(events_file, deleted_events_file, stamps, upserts=restored,
+                     removals=[event_id for event_id, _ in restored_keys])
+
+        print(f"\n✨ {len(restored)}件のイベントを戻しました")
+        if failed:
+            print(f"戻せなかったイベント: {failed}件（削除済みイベントファイルに残しています）")
+        return restored
+
+    except HttpError as error:
+        print(f"エラー: Google Calendar APIとの通信に失敗しました（{error.status_code}）")
+        if error.status_code == 401:
+            print("認証に失敗しました。認証情報を確認してください。")
+        elif error.status_code == 403:
+            print("アクセス権限がありません。")
+        sys.exit(1)
+    except Exception as error:
+        print(f"エラー: 予期せぬエラーが発生しました - {str(error)}")
+        sys.exit(1)
+
+def parse_offset(value: str) -> timedelta:
+    """
+    "1d", "-2h", "1w", "1d12h", "30m"のような時間の指定を変換
+
+    Raises:
+        ValueError: 形式が正しくない場合
+    """
+    match = re.fullmatch(r'([+-]?)((?:\d+[wdhm])+)', value.strip())
+    if not match:
+        raise ValueError(f"時間の指定が正しくありません: {value}")
+    units = {'w': timedelta(weeks=1), 'd': timedelta(days=1), 'h': timedelta(hours=1), 'm': timedelta(minutes=1)}
+    delta = sum((int(amount) * units[unit] for amount, unit in re.findall(r'(\d+)([wdhm])', match.group(2))),
+                timedelta())
+    return -delta if match.group(1) == '-' else delta
+
+def select_remote_events(service: any, calendar_id: str, start_date: str, end_date: str,
+                         match: Optional[str] = None):
+    """
+    期間内に始まるイベントを1回のページ単位の一覧取得で選ぶ
+
+    定期イベントは個々の予定ではなく繰り返し全体として扱い、すべての予定が期間内にあるものだけを選ぶ
+    （繰り返し全体を削除・変更するため、期間の前後まで続いているものを選ぶと期間外の予定も変わる）。
+
+    Args:
+        service: Google Calendar APIサービスインスタンス
+        calendar_id: カレンダーID
+        start_date: 開始日 (例: "2024-03-18")
+        end_date: 終了日（この日も含む）
+        match: タイトルにこの文字列を含むものだけを選ぶ（大文字・小文字は区別しない）
+
+    Returns:
+        Tuple[List[Dict], Dict[str, int]]: (選んだイベント（開始日時順）, 期間外まで続いているため除いた
+            定期イベントの数（'before': 期間より前から続いている、'after': 期間の後まで続いている）)
+    """
+    range_start, range_end = local_date_range(start_date, end_date)
+    needle = match.casefold() if match else None
+    selected = []
+    skipped_series = {'before': 0, 'after': 0}
+    for event in google_iter_events(service, start_date, end_date, calendar_id=calendar_id, single_events=False):
+        if event.get('status') == 'cancelled':
+            continue
+        if needle and needle not in (event.get('summary') or '').casefold():
+            continue
+        local_event = to_local_event(event)
+        start = start_key(local_event)
+        if not range_start <= start < range_end:
+            if event.get('recurrence'):
+                skipped_series['before'] += 1
+            continue
+        if event.get('recurrence'):
+            until = recurrence_until(event['recurrence'])
+            if until is None or until >= range_end:
+                skipped_series['after'] += 1
+                continue
+        selected.append((start, event, local_event))
+    selected.sort(key=lambda item: item[0])
+    return [(event, local_event) for _, event, local_event in selected], skipped_series
+
+def print_bulk_targets(targets: List[tuple], heading: str, skipped_series: Dict[str, int]) -> None:
+    """一括変更の対象を表示"""
+    print(f"\n{heading}: {len(targets)}件")
+    for _, local_event, *rest in targets:
+        moved = f" → {rest[0]['start_datetime']}" if rest else ""
+        print(f"  {local_event['start_datetime']}{moved} {local_event['title']}")
+    if skipped_series['before']:
+        print(f"期間より前から続いている定期イベント{skipped_series['before']}件は対象外です（IDを指定して変更してください）")
+    if skipped_series['after']:
+        print(f"期間の後まで続いている定期イベント{skipped_series['after']}件は対象外です（IDを指定して変更してください）")
+
+def handle_bulk_delete(start_date: str, end_date: str, match: Optional[str] = None, dry_run: bool = False,
+                       events_file: str = "events.yml", deleted_events_file: str = "deletedevents.yml") -> List[Dict]:
+    """
+    期間内（とタイトル）の条件に合うイベントをまとめて削除
+
+    対象は1回のページ単位の一覧取得で選び、バッチリクエストでまとめて削除する。
+    Google Calendarから削除できたものだけをローカルから削除し、events.ymlと
+    削除済みイベントファイルはそれぞれ1回だけ書き込む。送信待ちの変更があるイベントは対象外にする。
+
+    Args:
+        start_date: 開始日 (例: "2024-03-18")
+        end_date: 終了日（この日も含む）
+        match: タイトルにこの文字列を含むものだけを削除
+        dry_run: Trueなら削除せずに対象を表示するだけ
+        events_file: イベントファイルのパス
+        deleted_events_file: 削除済みイベントファイルのパス
+
+    Returns:
+        List[Dict]: 削除したイベント（ローカル形式、dry_runの場合は対象のイベント）
+    """
+    try:
+        store = EventStore(events_file)
+        with start_pipeline() as pipeline:
+            # 認証と送信待ちキューの読み込みを並行させる
+            connecting = pipeline.submit(get_authenticated_service)
+            loading_queue = pipeline.submit(load_queue, queue_path_for(events_file))
+            service = connecting.result()
+            calendar_id = get_or_create_calendar(service)
+            targets, skipped_series = select_remote_events(service, calendar_id, start_date, end_date, match)
+            queue = loading_queue.result()
+
+        pending = [target for target in targets if has_pending(queue, target[0]['id'])]
+        targets = [target for target in targets if not has_pending(queue, target[0]['id'])]
+        print_bulk_targets(targets, "🗑️ 削除するイベント", skipped_series)
+        if pending:
+            print(f"送信待ちの変更があるイベント{len(pending)}件は対象外です（flushしてから再実行してください）")
+        if dry_run or not targets:
+            return [local_event for _, local_event in targets]
+
+        results = delete_events_batch(service, [event['id'] for event, _ in targets], calendar_id=calendar_id)
+
+        stamps = source_stamps(events_file, deleted_events_file)
+        deleted = []
+        failed = 0
+        for (event, local_event), (_, error) in zip(targets, results):
+            if error is not None:
+                failed += 1
+                print(f"警告: 「{local_event['title']}」を削除できませんでした - {error}")
+                continue
+            # ローカルにあればその内容を、なければGoogle Calendarの内容を削除済みとして残す
+            deleted.append(store.delete(event['id']) or local_event)
+        store.save()
+        archived = [dict(event) for event in deleted]
+        save_deleted_events(archived, deleted_events_file)
+        update_index(events_file, deleted_events_file, stamps, removals=[event['id'] for event in deleted],
+                     archived=archived)
+
+        print(f"\n✨ {len(deleted)}件のイベントを削除しました")
+        if failed:
+            print(f"削除に失敗: {failed}件")
+        return deleted
+
+    except HttpError as error:
+        print(f"エラー: Google Calendar APIとの通信に失敗しました（{error.status_code}）")
+        if error.status_code == 401:
+            print("認証に失敗しました。認証情報を確認してください。")
+        elif error.status_code == 403:
+            print("アクセス権限がありません。")
+        sys.exit(1)
+    except Exception as error:
+        print(f"エラー: 予期せぬエラーが発生しました - {str(error)}")
+        sys.exit(1)
+
+def handle_shift(start_date: str, end_date: str, by: str, match: Optional[str] = None, dry_run: bool = False,
+                 events_file: str = "events.yml", deleted_events_file: str = "deletedevents.yml") -> List[Dict]:
+    """
+    期間内（とタイトル）の条件に合うイベントの開始・終了をまとめてずらす
+
+    対象は1回のページ単位の一覧取得で選び、バッチリクエストでまとめて変更する。
+    Google Calendarで変更できたものだけをローカルに反映し、events.ymlは1回だけ書き込む。
+    送信待ちの変更があるイベントと、終日の予定を日単位でない時間だけずらす場合は対象外にする。
+
+    Args:
+        start_date: 開始日 (例: "2024-03-18")
+        end_date: 終了日（この日も含む）
+        by: ずらす時間 (例: "1d", "-2h", "1w")
+        match: タイトルにこの文字列を含むものだけをずらす
+        dry_run: Trueなら変更せずに対象を表示するだけ
+        events_file: イベントファイルのパス
+        deleted_events_file: 削除済みイベントファイルのパス
+
+    Returns:
+        List[Dict]: ずらした後のイベント（ローカル形式、dry_runの場合は対象のずらした後のイベント）
+    """
+    try:
+        try:
+            delta = parse_offset(by)
+        except ValueError as error:
+            print(f"エラー: {error}（例: 1d, -2h, 1w, 30m）")
+            sys.exit(1)
+
+        store = EventStore(events_file)
+        with start_pipeline() as pipeline:
+            # 認証と送信待ちキューの読み込みを並行させる
+            connecting = pipeline.submit(get_authenticated_service)
+            loading_queue = pipeline.submit(load_queue, queue_path_for(events_file))
+            service = connecting.result()
+            calendar_id = get_or_create_calendar(service)
+            selected, skipped_series = select_remote_events(service, calendar_id, start_date, end_date, match)
+            queue = loading_queue.result()
+
+        targets = []
+        skipped = 0
+        for event, local_event in selected:
+            body = shift_event_body(event, delta)
+            if body is None or has_pending(queue, event['id']):
+                skipped += 1
+                continue
+            moved = to_local_event(dict(event, **body))
+            targets.append((event, local_event, moved, body))
+        print_bulk_targets(targets, f"⏩ {by}ずらすイベント", skipped_series)
+        if skipped:
+            print(f"送信待ちの変更があるか、終日の予定を日単位でない時間だけずらすイベント{skipped}件は対象外です")
+        if dry_run or not targets:
+            return [moved for _, _, moved, _ in targets]
+
+        results = patch_events_batch(service, [(event['id'], body) for event, _, _, body in targets],
+                                     calendar_id=calendar_id)
+
+        stamps = source_stamps(events_file, deleted_events_file)
+        shifted = []
+        local_updates = []
+        failed = 0
+        for (event, local_event, moved, _), (_, error) in zip(targets, results):
+            if error is not None:
+                failed += 1
+                print(f"警告: 「{local_event['title']}」を変更できませんでした - {error}")
+                continue
+            updated = store.update(event['id'], {'start_datetime': moved['start_datetime'],
+                                                 'end_datetime': moved['end_datetime']})
+            if updated is not None:
+                local_updates.append(updated)
+            shifted.append(updated or moved)
+        store.save()
+        update_index(events_file, deleted_events_file, stamps, upserts=local_updates)
+
+        print(f"\n✨ {len(shifted)}件のイベントを{by}ずらしました")
+        if failed:
+            print(f"変更に失敗: {failed}件")
+        return shifted
+
+    except HttpError as error:
+        print(f"エラー: Google Calendar APIとの通信に失敗しました（{error.status_code}）")
+        if error.status_code == 401:
+            print("認証に失敗しました。認証情報を確認してください。")
+        elif error.status_code == 403:
+            print("アクセス権限がありません。")
+        sys.exit(1)
+    except Exception as error:
+        print(f"エラー: 予期せぬエラーが発生しました - {str(error)}")
+        sys.exit(1)
+
+def local_date_range(start_date: Optional[str] = None, end_date: Optional[str] = None):
+    """
+    開始日・終了日の指定をEventStore.query_range()に渡す期間に変換
+
+    Args:
+        start_date: 開始日 (例: "2024-03-01")。省略時は期間の始まりを限定しない
+        end_date: 終了日 (例: "2024-03-31")。この日も含む。省略時は期間の終わりを限定しない
+
+    Returns:
+        Tuple[datetime, datetime]: 期間の開始と終了（終了は含まない）
+    """
+    start = datetime.strptime(start_date, "%Y-%m-%d") if start_date else datetime.min
+    end = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1) if end_date else datetime.max
+    return start, end
+
+def print_local_events(events: List[Dict], start_date: Optional[str] = None,
+                       end_date: Optional[str] = None) -> None:
+    """ローカル形式のイベント一覧を表示"""
+    if not events:
+        print("\n📅 該当期間のイベントはありません（ローカル）")
+    else:
+        print("\n📅 イベント一覧（ローカル）")
+    if start_date and end_date:
+        print(f"期間: {start_date} から {end_date}")
+    elif start_date:
+        print(f"開始日: {start_date} 以降")
+    elif end_date:
+        print(f"終了日: {end_date} まで")
+    if not events:
+        return
+    print("=" * 50)
+    for event in events:
+        print(f"\n🔖 {event['title']}")
+        print(f"  ID: {event['id']}")
+        print(f"  開始: {event['start_datetime']}")
+        print(f"  終了: {event['end_datetime']}")
+        if event.get('detail'):
+            print(f"  詳細: {event['detail']}")
+        print("-" * 50)
+
+def print_remote_events(events: List[Dict], start_date: Optional[str] = None,
+                        end_date: Optional[str] = None, profile: Optional[str] = None) -> None:
+    """Google Calendar形式のイベント一覧を表示（profileを指定するとアカウント名を見出しに付ける）"""
+    label = f"（{profile}）" if profile else ""
+    if not events:
+        print(f"\n📅 該当期間のイベントはありません{label}")
+        if start_date and end_date:
+            print(f"期間: {start_date} から {end_date}")
+        elif start_date:
+            print(f"開始日: {start_date} 以降")
+        elif end_date:
+            print(f"終了日: {end_date} まで")
+        return
+
+    print(f"\n📅 イベント一覧{label}")
+    if start_date and end_date:
+        print(f"期間: {start_date} から {end_date}")
+    elif start_date:
+        print(f"開始日: {start_date} 以降")
+    elif end_date:
+        print(f"終了日: {end_date} まで")
+    print("=" * 50)
+    
+    for event in events:
+        start = event['start'].get('dateTime', event['start'].get('date'))
+        end = event['end'].get('dateTime', event['end'].get('date'))
+        print(f"\n🔖 {event['summary']}")
+        print(f"  ID: {event['id']}")
+        print(f"  開始: {format_datetime(start)}")
+        print(f"  終了: {format_datetime(end)}")
+        if 'description' in event and event['description']:
+            print(f"  詳細: {event['description']}")
+        print("-" * 50)
+
+def fan_out(profiles: List[str], task: Callable[[str, any], any]) -> Dict[str, any]:
+    """
+    複数のプロファイル（アカウント）に同じ処理を並行して行う
+
+    各スレッドはそれぞれのプロファイルのサービスだけを使う（サービスはスレッド間で共有しない）。
+
+    Args:
+        profiles: プロファイル名のリスト
+        task: (プロファイル名, サービス)を受け取って結果を返す関数
+
+    Returns:
+        Dict[str, any]: プロファイル名ごとの結果（profilesの順）。失敗したプロファイルがあれば例外を送出する
+    """
+    with ThreadPoolExecutor(max_workers=len(profiles)) as executor:
+        futures = {
+            profile: executor.submit(lambda profile=profile: task(profile, get_authenticated_service(profile)))
+            for profile in profiles
+        }
+    return {profile: future.result() for profile, future in futures.items()}
+
 def handle_list(start_date: Optional[str] = None, end_date: Optional[str] = None,
-                events_file: str = "events.yml") -> List[Dict]:
+                events_file: str = "events.yml", from_local: bool = False, prefetch: int = 0,
+                profiles: Optional[List[str]] = None) -> List[Dict]:
     """
     イベント一覧を取得
 
+    prefetchを指定すると、表示したあとに続けて表示されそうな期間（これまでの表示から
+    日・週・月単位の間隔を学習）をバックグラウンドで取得してレスポンスキャッシュに入れておく。
+    profilesに複数のプロファイルを指定すると、各アカウントの一覧を並行して取得して順に表示する。
+
     Args:
         start_date: 取得開始日（オプション）
         end_date: 取得終了日（オプション）
         events_file: イベントファイルのパス
+        from_local: TrueならGoogle Calendarではなくローカルのイベントから開始日時順に取得
+        prefetch: 先読みする期間の数（0で先読みしない。開始日と終了日の指定とキャッシュが必要）
+        profiles: 一覧を取得するプロファイル名のリスト（省略時は現在のプロファイル）
 
     Returns:
-        List[Dict]: イベントのリスト
+        List[Dict]: イベントのリスト（from_localの場合はローカル形式）。
+            複数のプロファイルを指定した場合はプロファイル名ごとのイベントのリストの辞書
     """
     try:
+        if profiles and len(profiles) > 1:
+            if from_local:
+                print("エラー: --localは複数のプロファイルと同時に指定できません。")
+                sys.exit(1)
+            results = fan_out(profiles, lambda profile, service: google_list_events(service, start_date, end_date))
+            for profile, events in results.items():
+                print_remote_events(events, start_date, end_date, profile=profile)
+            return results
+
+        if from_local:
+            # 開始日時順の索引を二分探索するため、期間外のイベントは走査しない
+            events = EventStore(events_file).query_range(*local_date_range(start_date, end_date))
+            print_local_events(events, start_date, end_date)
+            return events
+
         # Google Calendarから取得
-        service = get_authenticated_service()
+        service = get_authenticated_service(profiles[0] if profiles else None)
         events = google_list_events(service, start_date, end_date)
 
-        # ローカルデータと同期
-        local_events = load_events(events_file)
-        
         # イベントを表示
-        if not events:
-            print("\n📅 該当期間のイベントはありません")
-            if start_date and end_date:
-                print(f"期間: {start_date} から {end_date}")
-            elif start_date:
-                print(f"開始日: {start_date} 以降")
-            elif end_date:
-                print(f"終了日: {end_date} まで")
+        print_remote_events(events, start_date, end_date)
+
+        if prefetch and start_date and end_date and response_cache_enabled():
+            # 表示する期間の傾向はアカウントごとに違うため、履歴もプロファイルごとに持つ
+            history_file = profile_path(profiles[0] if profiles else current_profile(), PREFETCH_HISTORY_FILE)
+            history = record_request(start_date, end_date, history_file=history_file)
+            start_prefetch(lambda start, end: google_list_events(service, start, end),
+                           plan_prefetch(history, prefetch))
+
+        return events
+
+    except HttpError as error:
+        print(f"エラー: Google Calendar APIとの通信に失敗しました（{error.status_code}）")
+        if error.status_code == 401:
+            print("認証に失敗しました。認証情報を確認してください。")
+        elif error.status_code == 403:
+            print("アクセス権限がありません。")
+        sys.exit(1)
+    except Exception as error:
+        print(f"エラー: 予期せぬエラーが発生しました - {str(error)}")
+        sys.exit(1)
+
+def handle_free(start_date: str, end_date: Optional[str] = None, profiles: Optional[List[str]] = None,
+                min_minutes: int = MIN_SLOT_MINUTES, include_weekends: bool = False) -> List[tuple]:
+    """
+    全員の予定が空いている時間を探す
+
+    各プロファイルのfreebusyを並行して問い合わせ、勤務時間（WORK_HOURS）のうち
+    どのアカウントにも予定が入っていない時間を表示する。
+
+    Args:
+        start_date: 開始日 (例: "2024-03-18")
+        end_date: 終了日（この日も含む。省略時は開始日と同じ日）
+        profiles: 対象のプロファイル名のリスト（省略時は現在のプロファイル）
+        min_minutes: これより短い空き時間は表示しない（分）
+        include_weekends: Trueなら土日も対象にする
+
+    Returns:
+        List[tuple]: 空き時間の(開始, 終了)のリスト
+    """
+    try:
+        end_date = end_date or start_date
+        try:
+            range_start = datetime.strptime(start_date, "%Y-%m-%d").replace(tzinfo=JST)
+            range_end = datetime.strptime(end_date, "%Y-%m-%d").replace(tzinfo=JST)
+        except ValueError:
+            print("エラー: 日付の形式が正しくありません。YYYY-MM-DD の形式で入力してください。")
+            sys.exit(1)
+        if range_start > range_end:
+            print("エラー: 開始日は終了日以前である必要があります。")
+            sys.exit(1)
+
+        profiles = profiles or [current_profile()]
+        busy = fan_out(profiles, lambda profile, service: query_busy(service, start_date, end_date))
+        slots = free_slots([period for periods in busy.values() for period in periods],
+                           working_windows(range_start, range_end, weekdays_only=not include_weekends),
+                           min_minutes=min_minutes)
+
+        print(f"\n🕒 空き時間（{', '.join(profiles)}）")
+        print(f"期間: {start_date} から {end_date}（{WORK_HOURS[0]}時〜{WORK_HOURS[1]}時、{min_minutes}分以上）")
+        print("=" * 50)
+        if not slots:
+            print("全員が空いている時間はありません")
+        for slot_start, slot_end in slots:
+            minutes = int((slot_end - slot_start).total_seconds() // 60)
+            print(f"  {slot_start.strftime('%Y年%m月%d日 %H:%M')} - {slot_end.strftime('%H:%M')}（{minutes}分）")
+        return slots
+
+    except HttpError as error:
+        print(f"エラー: Google Calendar APIとの通信に失敗しました（{error.status_code}）")
+        if error.status_code == 401:
+            print("認証に失敗しました。認証情報を確認してください。")
+        elif error.status_code == 403:
+            print("アクセス権限がありません。")
+        sys.exit(1)
+    except Exception as error:
+        print(f"エラー: 予期せぬエラーが発生しました - {str(error)}")
+        sys.exit(1)
+
+def handle_import(ics_file: str, batch_size: int = BATCH_SIZE, restart: bool = False,
+                  events_file: str = "events.yml", deleted_events_file: str = "deletedevents.yml") -> None:
+    """
+    iCalendarファイルからイベントを一括追加
+
+    ファイルは1件ずつ読み込み、batch_size件ごとにバッチリクエストで追加する。
+    バッチごとに進捗を"<ics_file>.progress"に保存するため、中断しても再実行で続きから再開できる。
+    追加に失敗したイベントがあると進捗はその手前までしか進めず、再実行で失敗したイベントから送り直す
+    （どのイベントもUID（ない場合は内容）から決めたIDで追加するため、送り直しても重複しない）。
+
+    Args:
+        ics_file: インポートするiCalendarファイルのパス
+        batch_size: 1回のバッチリクエストで追加するイベント数
+        restart: Trueなら保存済みの進捗を無視して最初からインポート
+        events_file: イベントファイルのパス
+        deleted_events_file: 削除済みイベントファイルのパス
+    """
+    progress_file = f"{ics_file}.progress"
+    try:
+        if not os.path.exists(ics_file):
+            print(f"エラー: ファイルが見つかりません - {ics_file}")
+            sys.exit(1)
+
+        # ファイル全体のハッシュ値は開始時に1回だけ計算し、進捗の保存ごとには読み直さない
+        signature = ics_signature(ics_file)
+        processed = 0 if restart else load_import_progress(progress_file, signature)
+        if processed:
+            print(f"前回の続き（{processed}件目の次）からインポートを再開します")
+
+        store = EventStore(events_file)
+        imported = 0
+        failed = 0
+        unsupported = 0
+        batch = []
+        batch_indexes = []
+        first_failure = None
+        committing = None
+
+        def commit_batch(local_events: List[Dict], processed_at: int) -> None:
+            # Google Calendarに追加できたイベントだけをローカルに書き込み、進捗を保存する
+            stamps = source_stamps(events_file, deleted_events_file)
+            for local_event in local_events:
+                store.add(local_event)
+            store.save()
+            update_index(events_file, deleted_events_file, stamps, upserts=local_events)
+            save_import_progress(progress_file, signature, processed_at)
+
+        def flush_batch() -> None:
+            nonlocal imported, failed, first_failure, committing
+            results = google_add_events_batch(service, batch, calendar_id=calendar_id)
+            added = []
+            for index, ics_event, (created, error) in zip(batch_indexes, batch, results):
+                if error is not None:
+                    failed += 1
+                    if first_failure is None:
+                        first_failure = index
+                    print(f"警告: 「{ics_event['title']}」を追加できませんでした - {error}")
+                    continue
+                imported += 1
+                if created['id'] in known_ids:
+                    # 中断前に追加済み（同じIDでの再送）
+                    continue
+                known_ids.add(created['id'])
+                added.append({
+                    'id': created['id'],
+                    'title': ics_event['title'],
+                    'start_datetime': ics_event['start_datetime'],
+                    'end_datetime': ics_event['end_datetime'],
+                    'detail': ics_event['detail'],
+                    'recurrence': ics_event['recurrence']
+                })
+            # ローカルへの書き込みは次のバッチの送信と並行させる（前のバッチの書き込みが終わってから）
+            if committing is not None:
+                committing.result()
+            # 失敗したイベントがあれば、再実行でそこから送り直せるよう進捗をその手前までにする
+            committing = pipeline.submit(commit_batch, added, processed if first_failure is None else first_failure)
+            batch.clear()
+            batch_indexes.clear()
+
+        with start_pipeline() as pipeline:
+            # 認証とローカルのイベントIDの読み込みを並行させる
+            connecting = pipeline.submit(get_authenticated_service)
+            loading_ids = pipeline.submit(store.ids)
+            service = connecting.result()
+            calendar_id = get_or_create_calendar(service)
+            known_ids = loading_ids.result()
+
+            for index, ics_event in enumerate(iter_ics_events(ics_file)):
+                if index < processed:
+                    continue
+                if ics_event['rrule'] and not ics_event['recurrence']:
+                    unsupported += 1
+                    print(f"警告: 「{ics_event['title']}」の繰り返しルールには対応していないため単発の予定として追加します"
+                          f"（{ics_event['rrule']}）")
+                # UID（ない場合は内容）から決めたIDで追加し、中断後の再送やファイルの再インポートで重複させない
+                if ics_event['uid']:
+                    key = f"ics:{calendar_id}:{ics_event['uid']}"
+                else:
+                    content = [ics_event[field] for field in
+                               ('title', 'start_datetime', 'end_datetime', 'detail', 'recurrence')]
+                    key = f"ics-content:{calendar_id}:{json.dumps(content, ensure_ascii=False)}"
+                batch.append(dict(ics_event, id=event_id_for(key)))
+                batch_indexes.append(index)
+                processed = index + 1
+                if len(batch) >= batch_size:
+                    flush_batch()
+            if batch:
+                flush_batch()
+            if committing is not None:
+                committing.result()
+
+        if first_failure is None and os.path.exists(progress_file):
+            os.remove(progress_file)
+
+        print(f"\n✨ {imported}件のイベントをインポートしました")
+        if failed:
+            print(f"追加に失敗: {failed}件（同じコマンドを再実行すると失敗したイベントから送り直します）")
+        if unsupported:
+            print(f"繰り返しを解除して追加: {unsupported}件")
+
+    except HttpError as error:
+        print(f"エラー: Google Calendar APIとの通信に失敗しました（{error.status_code}）")
+        if error.status_code == 401:
+            print("認証に失敗しました。認証情報を確認してください。")
+        elif error.status_code == 403:
+            print("アクセス権限がありません。")
+        print("同じコマンドを再実行すると中断したところから再開します。")
+        sys.exit(1)
+    except Exception as error:
+        print(f"エラー: 予期せぬエラーが発生しました - {str(error)}")
+        sys.exit(1)
+
+def handle_export(ics_file: str, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                  from_local: bool = False, events_file: str = "events.yml") -> int:
+    """
+    イベントをiCalendarファイルに書き出す
+
+    Google Calendarからはページ単位で取得しながら書き出すため、
+    期間内の全イベントをメモリに載せない。
+
+    Args:
+        ics_file: 書き出し先のiCalendarファイルのパス
+        start_date: 書き出し開始日（オプション）
+        end_date: 書き出し終了日（オプション）
+        from_local: TrueならGoogle Calendarではなくローカルのイベントファイルから書き出す
+        events_file: イベントファイルのパス
+
+    Returns:
+        int: 書き出したイベント数
+    """
+    try:
+        if from_local:
+            events = EventStore(events_file).query_range(*local_date_range(start_date, end_date))
+        else:
+            service = get_authenticated_service()
+
+            def remote_events():
+                for event in google_iter_events(service, start_date, end_date, single_events=False):
+                    if event.get('status') == 'cancelled':
+                        continue
+                    local_event = to_local_event(event)
+                    rules = [rule for rule in event.get('recurrence') or [] if rule.upper().startswith('RRULE:')]
+                    if rules:
+                        local_event['rrule'] = rules[0]
+                    yield local_event
+
+            events = remote_events()
+
+        with open(ics_file, 'w', encoding='utf-8', newline='') as f:
+            count = write_ics(f, events)
+
+        print(f"\n✨ {count}件のイベントを書き出しました")
+        print(f"ファイル: {ics_file}")
+        return count
+
+    except HttpError as error:
+        print(f"エラー: Google Calendar APIとの通信に失敗しました（{error.status_code}）")
+        if error.status_code == 401:
+            print("認証に失敗しました。認証情報を確認してください。")
+        elif error.status_code == 403:
+            print("アクセス権限がありません。")
+        sys.exit(1)
+    except Exception as error:
+        print(f"エラー: 予期せぬエラーが発生しました - {str(error)}")
+        sys.exit(1)
+
+def handle_search(query: str, include_deleted: bool = False, events_file: str = "events.yml",
+                  deleted_events_file: str = "deletedevents.yml") -> List[Dict]:
+    """
+    ローカルの検索インデックスでイベントを検索
+
+    Google Calendar APIは呼び出さない。インデックスがないか古い場合は
+    ローカルのイベントファイルから作り直す。
+
+    Args:
+        query: 検索語（空白区切りでAND検索）
+        include_deleted: Trueなら削除済みイベントも検索対象にする
+        events_file: イベントファイルのパス
+        deleted_events_file: 削除済みイベントファイルのパス
+
+    Returns:
+        List[Dict]: 見つかったイベントのリスト
+    """
+    try:
+        index = load_or_build_index(events_file, deleted_events_file)
+        results = search_events(index, query, include_deleted=include_deleted)
+
+        if not results:
+            print(f"\n🔍 「{query}」に一致するイベントはありません")
         else:
-            print("\n📅 イベント一覧")
-            if start_date and end_date:
-                print(f"期間: {start_date} から {end_date}")
-            elif start_date:
-                print(f"開始日: {start_date} 以降")
-            elif end_date:
-                print(f"終了日: {end_date} まで")
+            print(f"\n🔍 「{query}」の検索結果（{len(results)}件）")
             print("=" * 50)
-            
-            for event in events:
-                start = event['start'].get('dateTime', event['start'].get('date'))
-                end = event['end'].get('dateTime', event['end'].get('date'))
-                print(f"\n🔖 {event['summary']}")
-                print(f"  ID: {event['id']}")
-                print(f"  開始: {format_datetime(start)}")
-                print(f"  終了: {format_datetime(end)}")
-                if 'description' in event and event['description']:
-                    print(f"  詳細: {event['description']}")
+            for result in results:
+                label = "（削除済み）" if result['source'] == 'deleted' else ""
+                print(f"\n🔖 {result['title']}{label}")
+                print(f"  ID: {result['id']}")
+                print(f"  開始: {result['start_datetime']}")
+                print(f"  終了: {result['end_datetime']}")
                 print("-" * 50)
 
-        return events
+        return results
+
+    except Exception as error:
+        print(f"エラー: 予期せぬエラーが発生しました - {str(error)}")
+        sys.exit(1)
+
+def handle_flush(force: bool = False, events_file: str = "events.yml",
+                 deleted_events_file: str = "deletedevents.yml") -> Dict:
+    """
+    送信待ちキューの変更をGoogle Calendarにまとめて送信
+
+    同じイベントへの変更はキューに入れた時点でまとめてあり、残った変更を
+    バッチリクエストで送信する。Google Calendar側で変更されていたイベントは
+    競合として送信せずキューに残す。
+
+    Args:
+        force: Trueなら競合を無視してローカルの変更で上書きする
+        events_file: イベントファイルのパス
+        deleted_events_file: 削除済みイベントファイルのパス
+
+    Returns:
+        Dict: flush_queue()の結果
+    """
+    try:
+        queue_file = queue_path_for(events_file)
+        queue = load_queue(queue_file)
+        if not queue:
+            print("\n📮 送信待ちの変更はありません")
+            return {'sent': [], 'conflicts': [], 'failed': [], 'remaining': []}
+
+        service = get_authenticated_service()
+        calendar_id = get_or_create_calendar(service)
+        result = flush_queue(service, queue, calendar_id, force=force)
+        save_queue(queue_file, result['remaining'])
+
+        print(f"\n📮 送信待ちの変更を{len(result['sent'])}件送信しました")
+        for entry in result['conflicts']:
+            print(f"⚠️ 競合: {entry['id']}（{entry['op']}）- {entry['conflict']}")
+        for entry, error in result['failed']:
+            print(f"⚠️ 失敗: {entry['id']}（{entry['op']}）- {error}")
+        if result['conflicts']:
+            print("競合した変更はキューに残しています。ローカルの変更で上書きするには --force を指定してください。")
+        return result
+
+    except HttpError as error:
+        print(f"エラー: Google Calendar APIとの通信に失敗しました（{error.status_code}）")
+        if error.status_code == 401:
+            print("認証に失敗しました。認証情報を確認してください。")
+        elif error.status_code == 403:
+            print("アクセス権限がありません。")
+        sys.exit(1)
+    except NETWORK_ERRORS as error:
+        print(f"エラー: Google Calendarに接続できません - {str(error)}")
+        print("送信待ちの変更はキューに残っています。")
+        sys.exit(1)
+    except Exception as error:
+        print(f"エラー: 予期せぬエラーが発生しました - {str(error)}")
+        sys.exit(1)
+
+def apply_reconcile_plan(service: any, calendar_id: str, plan: Dict, remote: Dict, state: Dict,
+                         events_file: str = "events.yml", deleted_events_file: str = "deletedevents.yml") -> Dict:
+    """
+    plan_reconcile()の計画をGoogle Calendarとローカルに反映し、同期状態を保存
+
+    Args:
+        service: Google Calendar APIサービスインスタンス
+        calendar_id: カレンダーID
+        plan: plan_reconcile()の計画
+        remote: fetch_remote_changes()の結果
+        state: 計画に使った同期状態
+        events_file: イベントファイルのパス
+        deleted_events_file: 削除済みイベントファイルのパス
+
+    Returns:
+        Dict: apply_remote_plan()の結果
+    """
+    # Google Calendarへの反映
+    remote_result = apply_remote_plan(service, calendar_id, plan)
+
+    # ローカルへの反映（書き込みは1回）。通信の間はロックせず、保存するときに
+    # 最新のイベントファイルへこの差分だけを当て直す
+    stamps = source_stamps(events_file, deleted_events_file)
+    store = EventStore(events_file)
+    removed = set(plan['local_deletes'])
+    archived = [event for event in map(store.delete, removed) if event is not None]
+    upserted = []
+    for event in plan['local_upserts']:
+        event = {key: value for key, value in event.items() if key != 'etag'}
+        if store.update(event['id'], event) is None:
+            store.add(event)
+        upserted.append(event)
+    for old_id, new_id in remote_result['id_map'].items():
+        event = store.delete(old_id)
+        if event is not None:
+            event = dict(event, id=new_id)
+            store.add(event)
+            upserted.append(event)
+    if upserted or removed:
+        store.save()
+        save_deleted_events([event.copy() for event in archived], deleted_events_file)
+        update_index(events_file, deleted_events_file, stamps,
+                     upserts=upserted,
+                     removals=list(removed) + list(remote_result['id_map']),
+                     archived=archived)
+
+    # 同期状態の更新
+    known = dict(state.get('events', {}))
+    for event_id in list(removed) + remote_result['deleted'] + plan['forgotten']:
+        known.pop(event_id, None)
+    for old_id in remote_result['id_map']:
+        known.pop(old_id, None)
+    for event in plan['local_upserts']:
+        known[event['id']] = {'etag': event['etag'], 'hash': content_hash(event)}
+    for event_id, etag in list(plan['in_sync'].items()) + list(remote_result['etags'].items()):
+        local_event = store.get(event_id)
+        if local_event is not None:
+            known[event_id] = {'etag': etag, 'hash': content_hash(local_event)}
+    # 反映に失敗したものは同期状態を更新していないので、次回も差分として扱われる
+    save_sync_state(sync_state_path_for(events_file), {'sync_token': remote['sync_token'], 'events': known})
+    return remote_result
+
+def sync_changes(service: any, calendar_id: str, policy: str = 'remote', events_file: str = "events.yml",
+                 deleted_events_file: str = "deletedevents.yml") -> Tuple[Dict, Dict]:
+    """
+    前回の同期以降の差分を取得して、reconcileと同じようにローカルとGoogle Calendarを揃える
+
+    Args:
+        service: Google Calendar APIサービスインスタンス
+        calendar_id: カレンダーID
+        policy: 競合時に'remote'ならGoogle Calendar、'local'ならローカルの内容を優先
+        events_file: イベントファイルのパス
+        deleted_events_file: 削除済みイベントファイルのパス
+
+    Returns:
+        Tuple[Dict, Dict]: (plan_reconcile()の計画, apply_remote_plan()の結果)
+    """
+    state = load_sync_state(sync_state_path_for(events_file))
+    remote = fetch_remote_changes(service, calendar_id, state)
+    pending_ids = {entry['id'] for entry in load_queue(queue_path_for(events_file))}
+    plan = plan_reconcile(load_events(events_file), remote, state, policy=policy, skip_ids=pending_ids)
+    return plan, apply_reconcile_plan(service, calendar_id, plan, remote, state, events_file, deleted_events_file)
+
+def handle_reconcile(policy: str = 'remote', dry_run: bool = False, events_file: str = "events.yml",
+                     deleted_events_file: str = "deletedevents.yml") -> Dict:
+    """
+    ローカルのイベントとGoogle Calendarの差分を検出して揃える
+
+    前回の同期以降の変更を同期トークン（またはetagの一覧）で取得し、内容のハッシュ値で
+    変更の有無を判定する。片方だけの変更はもう片方に反映し、両方の変更が食い違う場合は
+    policyに従う。送信待ちキューにあるイベントは対象外。
+
+    Args:
+        policy: 競合時に'remote'ならGoogle Calendar、'local'ならローカルの内容を優先
+        dry_run: Trueなら反映せずに差分だけを表示
+        events_file: イベントファイルのパス
+        deleted_events_file: 削除済みイベントファイルのパス
+
+    Returns:
+        Dict: plan_reconcile()の計画
+    """
+    try:
+        state_file = sync_state_path_for(events_file)
+        with start_pipeline() as pipeline:
+            # ローカルのイベントと送信待ちキューの読み込みを、Google Calendarからの取得と並行させる
+            loading = pipeline.submit(load_events, events_file)
+            loading_queue = pipeline.submit(load_queue, queue_path_for(events_file))
+            connecting = pipeline.submit(get_authenticated_service)
+            state = load_sync_state(state_file)
+            service = connecting.result()
+            calendar_id = get_or_create_calendar(service)
+            remote = fetch_remote_changes(service, calendar_id, state)
+            events = loading.result()
+            pending_ids = {entry['id'] for entry in loading_queue.result()}
+        plan = plan_reconcile(events, remote, state, policy=policy, skip_ids=pending_ids)
+
+        print(f"\n🔄 差分（{'全件' if remote['full'] else '前回からの変更分'}を確認）")
+        print(f"ローカルへ反映: 追加・更新 {len(plan['local_upserts'])}件, 削除 {len(plan['local_deletes'])}件")
+        print(f"Google Calendarへ反映: 追加 {len(plan['remote_inserts'])}件, "
+              f"更新 {len(plan['remote_patches'])}件, 削除 {len(plan['remote_deletes'])}件")
+        if plan['conflicts']:
+            print(f"競合: {len(plan['conflicts'])}件（{'Google Calendar' if policy == 'remote' else 'ローカル'}を優先）")
+        if dry_run:
+            for event in plan['local_upserts']:
+                print(f"  ← {event['id']} {event['title']}")
+            for event_id in plan['local_deletes']:
+                print(f"  ← 削除 {event_id}")
+            for event in plan['remote_inserts'] + plan['remote_patches']:
+                print(f"  → {event['id']} {event['title']}")
+            for event_id in plan['remote_deletes']:
+                print(f"  → 削除 {event_id}")
+            return plan
+
+        remote_result = apply_reconcile_plan(service, calendar_id, plan, remote, state,
+                                             events_file, deleted_events_file)
+
+        print("\n✨ ローカルとGoogle Calendarを揃えました")
+        for event_id, error in remote_result['failed']:
+            print(f"⚠️ 失敗: {event_id} - {error}")
+        return plan
 
     except HttpError as error:
         print(f"エラー: Google Calendar APIとの通信に失敗しました（{error.status_code}）")
@@ -285,6 +1460,465 @@ def handle_list(start_date: Optional[str] = None, end_date: Optional[str] = None
         print(f"エラー: 予期せぬエラーが発生しました - {str(error)}")
         sys.exit(1)
 
+def handle_watch(address: str, host: str = RECEIVER_HOST, port: int = RECEIVER_PORT, policy: str = 'remote',
+                 events_file: str = "events.yml", deleted_events_file: str = "deletedevents.yml") -> int:
+    """
+    Google Calendarの変更通知を受け取り、変更があるたびにローカルと揃える（Ctrl+Cで終了）
+
+    events().watchで通知チャネルを登録し、ローカルのHTTPサーバーで通知を受け取る。
+    通知が届くと同期トークンで変更分だけを取得してreconcileと同じように反映する。
+    チャネルは期限の前に張り直す。
+
+    Args:
+        address: 通知の送り先（ローカルのHTTPサーバーへ転送される公開のHTTPSのURL）
+        host: 通知を待ち受けるアドレス
+        port: 通知を待ち受けるポート
+        policy: 競合時に'remote'ならGoogle Calendar、'local'ならローカルの内容を優先
+        events_file: イベントファイルのパス
+        deleted_events_file: 削除済みイベントファイルのパス
+
+    Returns:
+        int: 同期した回数
+    """
+    try:
+        service = get_authenticated_service()
+        calendar_id = get_or_create_calendar(service)
+        synced = 0
+
+        def sync():
+            nonlocal synced
+            try:
+                plan, result = sync_changes(service, calendar_id, policy=policy, events_file=events_file,
+                                            deleted_events_file=deleted_events_file)
+            except HttpError as error:
+                # 同期状態を更新していないので、次の通知で同じ差分を取得し直す
+                print(f"⚠️ 同期に失敗しました（{error.status_code}）。次の通知で再試行します", flush=True)
+                return
+            synced += 1
+            local_count = len(plan['local_upserts']) + len(plan['local_deletes'])
+            remote_count = len(plan['remote_inserts']) + len(plan['remote_patches']) + len(plan['remote_deletes'])
+            if local_count or remote_count:
+                print(f"🔄 {datetime.now().strftime('%H:%M:%S')} ローカルへ反映 {local_count}件, "
+                      f"Google Calendarへ反映 {remote_count}件", flush=True)
+            for event_id, error in result['failed']:
+                print(f"⚠️ 失敗: {event_id} - {error}", flush=True)
+
+        with NotificationReceiver(host, port) as receiver:
+            print(f"\n👀 Google Calendarの変更を監視しています（受信: {receiver.url}, 通知先: {address}）", flush=True)
+            print("Ctrl+Cで終了します", flush=True)
+            try:
+                watch_changes(receiver,
+                              subscribe=lambda: open_channel(service, calendar_id, address, receiver.token),
+                              unsubscribe=lambda channel: close_channel(service, channel),
+                              sync=sync)
+            except KeyboardInterrupt:
+                print("\n監視を終了しました")
+        return synced
+
+    except HttpError as error:
+        print(f"エラー: Google Calendar APIとの通信に失敗しました（{error.status_code}）")
+        if error.status_code == 400:
+            print("通知先のURLを確認してください（公開されたHTTPSのURLが必要です）。")
+        elif error.status_code == 401:
+            print("認証に失敗しました。認証情報を確認してください。")
+        elif error.status_code == 403:
+            print("アクセス権限がありません。")
+        sys.exit(1)
+    except Exception as error:
+        print(f"エラー: 予期せぬエラーが発生しました - {str(error)}")
+        sys.exit(1)
+
+def handle_run(source: str, events_file: str = "events.yml",
+               deleted_events_file: str = "deletedevents.yml") -> List[Dict]:
+    """
+    JSON Linesに書いた複数の操作（add/update/delete/list）を1つのプロセスで実行
+
+    すべての操作を先に検証し、1件でも不正なら何も実行しない。認証とカレンダーの確認は1回だけ行い、
+    変更はバッチリクエストでまとめて送信する（同じイベントへの操作は前の操作の後に送る）。
+    listはそれより前の変更を反映してから実行する。ローカルのファイルへの書き込みは最後に1回。
+    結果は操作ごとに1行のJSONで標準出力に出力する。
+
+    Args:
+        source: 操作を書いたファイルのパス（"-"なら標準入力）
+        events_file: イベントファイルのパス
+        deleted_events_file: 削除済みイベントファイルのパス
+
+    Returns:
+        List[Dict]: 操作の順の結果（line, command, status（ok/queued/error/skipped）と、
+            event_id, event, events, errorのうち該当するもの）
+    """
+    try:
+        if source == '-':
+            lines = sys.stdin.read().splitlines()
+        else:
+            with open(source, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        operations, errors = parse_operations(lines)
+        if errors:
+            for error in errors:
+                print(json.dumps(dict(error, status='invalid'), ensure_ascii=False))
+            print(f"エラー: {len(errors)}件の操作が不正なため、何も実行しませんでした", file=sys.stderr)
+            sys.exit(1)
+
+        for operation in operations:
+            if operation['command'] == 'add':
+                key = operation.get('idempotency_key')
+                operation['event_id'] = event_id_for(key) if key else new_event_id()
+        mutations = [operation for operation in operations if operation['command'] in MUTATIONS]
+        needs_remote = any(
+            not operation.get('local') if operation['command'] == 'list'
+            else not operation.get('defer')
+            for operation in operations
+        )
+
+        def prepare():
+            # 追加するイベントのシャードと、更新・削除するイベントを読み込んでおく
+            store.prefetch([operation for operation in mutations if operation['command'] == 'add'])
+            for operation in mutations:
+                if operation['command'] != 'add':
+                    store.get(operation['event_id'])
+
+        queue_file = queue_path_for(events_file)
+        store = EventStore(events_file)
+        service = calendar_id = None
+        with start_pipeline() as pipeline:
+            # 送信待ちキュー、ローカルのイベント、認証を並行して準備する
+            loading_queue = pipeline.submit(load_queue, queue_file)
+            loading = pipeline.submit(prepare)
+            connecting = pipeline.submit(get_authenticated_service) if needs_remote else None
+            if connecting is not None:
+                try:
+                    service = connecting.result()
+                    calendar_id = get_or_create_calendar(service)
+                except NETWORK_ERRORS as error:
+                    service = None
+                    print(f"⚠️ Google Calendarに接続できません（{error}）", file=sys.stderr)
+            queue = loading_queue.result()
+            loading.result()
+        original_queue = list(queue)
+
+        results = []
+        pending = []
+        archived = []
+        touched_ids = []
+
+        def build_request(operation):
+            events_api = service.events()
+            if operation['command'] == 'add':
+                body = build_event_body(operation['start_datetime'], operation['end_datetime'], operation['title'],
+                                        operation.get('detail'), operation.get('recurrence'))
+                body['id'] = operation['event_id']
+                return events_api.insert(calendarId=calendar_id, body=body)
+            if operation['command'] == 'update':
+                body = build_patch_body(operation.get('title'), operation.get('start_datetime'),
+                                        operation.get('end_datetime'), operation.get('detail'),
+                                        operation.get('recurrence'))
+                return events_api.patch(calendarId=calendar_id, eventId=operation['event_id'], body=body)
+            return events_api.delete(calendarId=calendar_id, eventId=operation['event_id'])
+
+        def apply_locally(operation, queued):
+            nonlocal queue
+            event_id = operation['event_id']
+            touched_ids.append(event_id)
+            if operation['command'] == 'add':
+                local_event = {'id': event_id, 'title': operation['title'],
+                               'start_datetime': operation['start_datetime'],
+                               'end_datetime': operation['end_datetime'],
+                               'detail': operation.get('detail'), 'recurrence': operation.get('recurrence')}
+                if queued:
+                    queue = enqueue(queue, 'add', event_id,
+                                    data={key: value for key, value in local_event.items() if key != 'id'})
+                if store.get(event_id) is None:
+                    store.add(local_event)
+                return local_event
+            if operation['command'] == 'update':
+                new_data = {field: operation[field] for field in UPDATE_FIELDS if operation.get(field)}
+                base = store.get(event_id)
+                if queued:
+                    queue = enqueue(queue, 'update', event_id, data=new_data, base=dict(base) if base else None)
+                return store.update(event_id, new_data)
+            removed = store.delete(event_id)
+            if queued:
+                queue = enqueue(queue, 'delete', event_id, base=dict(removed) if removed else None)
+            if removed:
+                archived.append(removed)
+            return None
+
+        def flush():
+            """溜めた変更をGoogle Calendarに送信し、結果に応じてローカル（メモリ上）に反映"""
+            nonlocal service
+            statuses = {}
+            deferred_ids = set()
+            remote = []
+            for index, operation in enumerate(pending):
+                event_id = operation['event_id']
+                # 送信待ちの変更があるイベントは、送信の順序を保つためキューに追加する
+                if (service is None or operation.get('defer')
+                        or has_pending(queue, event_id) or event_id in deferred_ids):
+                    deferred_ids.add(event_id)
+                    statuses[index] = ('queued', None)
+                else:
+                    remote.append(index)
+
+            failed_ids = set()
+            for round_indexes in schedule_rounds([pending[index] for index in remote]):
+                sending = []
+                for index in (remote[position] for position in round_indexes):
+                    if pending[index]['event_id'] in failed_ids:
+                        statuses[index] = ('skipped', "同じイベントへの前の操作が失敗したため実行しませんでした")
+                    elif service is None:
+                        statuses[index] = ('queued', None)
+                    else:
+                        sending.append(index)
+                if not sending:
+                    continue
+                try:
+                    responses = execute_batch(service, [build_request(pending[index]) for index in sending])
+                    # 同じIDでの再送の409は作成済みなら成功、削除済みのIDならエラーにする
+                    responses = resolve_insert_conflicts(service, calendar_id, [
+                        pending[index]['event_id'] if pending[index]['command'] == 'add' else None
+                        for index in sending
+                    ], responses)
+                except NETWORK_ERRORS as error:
+                    # 追加は同じIDで、削除・部分更新は何度送っても同じ結果になるので、まとめて送信待ちにする
+                    print(f"⚠️ Google Calendarに接続できません（{error}）", file=sys.stderr)
+                    service = None
+                    for index in sending:
+                        statuses[index] = ('queued', None)
+                    continue
+                for index, (response, error) in zip(sending, responses):
+                    command = pending[index]['command']
+                    status = getattr(error, 'status_code', None)
+                    if error is None or (command == 'delete' and status in (404, 410)):
+                        statuses[index] = ('ok', None)
+                    else:
+                        statuses[index] = ('error', str(error))
+                        failed_ids.add(pending[index]['event_id'])
+
+            for index, operation in enumerate(pending):
+                status, error = statuses[index]
+                if status == 'queued' and operation['event_id'] in failed_ids:
+                    status, error = 'skipped', "同じイベントへの前の操作が失敗したため実行しませんでした"
+                result = {'line': operation['line'], 'command': operation['command'], 'status': status,
+                          'event_id': operation['event_id']}
+                if error:
+                    result['error'] = error
+                else:
+                    event = apply_locally(operation, queued=status == 'queued')
+                    if event is not None:
+                        result['event'] = dict(event)
+                results.append(result)
+            pending.clear()
+
+        def run_list(operation):
+            result = {'line': operation['line'], 'command': 'list'}
+            start_date, end_date = operation.get('start'), operation.get('end')
+            if operation.get('local'):
+                events = store.query_range(*local_date_range(start_date, end_date))
+            elif service is None:
+                return dict(result, status='error', error="Google Calendarに接続できません")
+            else:
+                try:
+                    events = [to_local_event(event)
+                              for event in google_list_events(service, start_date, end_date, calendar_id=calendar_id)]
+                except HttpError as error:
+                    return dict(result, status='error', error=str(error))
+            return dict(result, status='ok', events=[dict(event) for event in events])
+
+        for operation in operations:
+            if operation['command'] in MUTATIONS:
+                pending.append(operation)
+            else:
+                flush()
+                results.append(run_list(operation))
+        flush()
+
+        # ローカルへの書き込みは1回（送信待ちキューを先に保存する）
+        if queue != original_queue:
+            save_queue(queue_file, queue)
+        if touched_ids:
+            stamps = source_stamps(events_file, deleted_events_file)
+            store.save()
+            save_deleted_events([event.copy() for event in archived], deleted_events_file)
+            current = {event_id: store.get(event_id) for event_id in dict.fromkeys(touched_ids)}
+            update_index(events_file, deleted_events_file, stamps,
+                         upserts=[event for event in current.values() if event is not None],
+                         removals=[event_id for event_id, event in current.items() if event is None],
+                         archived=archived)
+
+        for result in results:
+            print(json.dumps(result, ensure_ascii=False))
+        if any(result['status'] in ('error', 'skipped') for result in results):
+            sys.exit(1)
+        return results
+
+    except HttpError as error:
+        print(f"エラー: Google Calendar APIとの通信に失敗しました（{error.status_code}）")
+        if error.status_code == 401:
+            print("認証に失敗しました。認証情報を確認してください。")
+        elif error.status_code == 403:
+            print("アクセス権限がありません。")
+        sys.exit(1)
+    except Exception as error:
+        print(f"エラー: 予期せぬエラーが発生しました - {str(error)}")
+        sys.exit(1)
+
+def handle_stats(start_date: Optional[str] = None, end_date: Optional[str] = None,
+                 from_remote: bool = False, as_json: bool = False, events_file: str = "events.yml") -> Dict:
+    """
+    期間内の予定の詰まり具合を集計して表示
+
+    予定の開始・終了をNumPyの配列に読み込み、日・週ごとの予定が入っている時間、
+    曜日×時間帯のヒートマップ、稼働率、予定の間の空き時間をまとめて計算する。
+    ローカルの定期イベントは期間内の予定に展開して集計する。
+
+    Args:
+        start_date: 集計開始日（省略時は今月の1日）
+        end_date: 集計終了日（この日も含む。省略時は今月の末日）
+        from_remote: TrueならローカルではなくGoogle Calendarから期間内の予定を取得して集計
+        as_json: Trueなら表ではなくJSONで出力
+        events_file: イベントファイルのパス
+
+    Returns:
+        Dict: compute_stats()の集計結果に期間と取得元を加えたもの
+    """
+    try:
+        require_numpy()
+        today = datetime.now()
+        if not start_date:
+            start_date = today.strftime("%Y-%m-01")
+        if not end_date:
+            next_month = (today.replace(day=1) + timedelta(days=32)).replace(day=1)
+            end_date = (next_month - timedelta(days=1)).strftime("%Y-%m-%d")
+        range_start, range_end = local_date_range(start_date, end_date)
+        if range_start >= range_end:
+            print("エラー: 集計開始日は集計終了日以前である必要があります。")
+            sys.exit(1)
+        range_start_min, range_end_min = to_minutes([
+            range_start.strftime("%Y-%m-%d %H:%M"), range_end.strftime("%Y-%m-%d %H:%M")])
+
+        if from_remote:
+            # Google Calendar側で定期イベントを展開して返すため、ページごとに開始・終了だけを残す
+            service = get_authenticated_service()
+            starts, ends = [], []
+            for event in google_iter_events(service, start_date, end_date):
+                if event.get('status') == 'cancelled':
+                    continue
+                local_event = to_local_event(event)
+                starts.append(local_event['start_datetime'])
+                ends.append(local_event['end_datetime'])
+            starts, ends = to_minutes(starts), to_minutes(ends)
+        else:
+            # 定期イベントは集計期間より前に始まっていても対象になるため、終了日までを取得する
+            events = [event for event in EventStore(events_file).query_range(datetime.min, range_end)
+                      if event.get('recurrence') not in (None, 'none')
+                      or event['end_datetime'] > range_start.strftime("%Y-%m-%d %H:%M")]
+            starts, ends = collect_occurrences(events, int(range_start_min), int(range_end_min))
+
+        stats = compute_stats(starts, ends, int(range_start_min), int(range_end_min))
+        stats = dict({'start': start_date, 'end': end_date, 'source': 'remote' if from_remote else 'local'}, **stats)
+
+        if as_json:
+            print(json.dumps(stats, ensure_ascii=False, indent=2))
+        else:
+            print(f"\n📊 予定の集計（{'Google Calendar' if from_remote else 'ローカル'}）")
+            print(f"期間: {start_date} から {end_date}")
+            print("=" * 50)
+            for line in format_stats_table(stats):
+                print(line)
+        return stats
+
+    except HttpError as error:
+        print(f"エラー: Google Calendar APIとの通信に失敗しました（{error.status_code}）")
+        if error.status_code == 401:
+            print("認証に失敗しました。認証情報を確認してください。")
+        elif error.status_code == 403:
+            print("アクセス権限がありません。")
+        sys.exit(1)
+    except Exception as error:
+        print(f"エラー: 予期せぬエラーが発生しました - {str(error)}")
+        sys.exit(1)
+
+def handle_agenda(days: int = 1, watch: bool = False, lead_minutes: int = REMINDER_LEAD_MINUTES,
+                  desktop: bool = False, events_file: str = "events.yml") -> List:
+    """
+    ローカルのイベントから直近の予定を表示し、watchなら予定の前に通知し続ける
+
+    Google Calendarには問い合わせない。通知は次の予定の時刻まで眠って待ち、
+    events.ymlの更新時刻が変わったときだけ読み込み直す。
+
+    Args:
+        days: 表示する日数（今から何日後までか）
+        watch: Trueなら予定の前に通知し続ける（Ctrl+Cで終了）
+        lead_minutes: 予定の何分前に通知するか
+        desktop: Trueならデスクトップ通知も表示する（notify-sendまたはosascriptがある場合）
+        events_file: イベントファイルのパス
+
+    Returns:
+        List[Reminder]: 表示した直近の予定
+    """
+    try:
+        now = datetime.now().replace(second=0, microsecond=0)
+        reminders = upcoming(load_events(events_file), now, now + timedelta(days=days))
+        print(f"\n📅 今後{days}日間の予定（ローカル）")
+        print("=" * 50)
+        if not reminders:
+            print("予定はありません")
+        for reminder in reminders:
+            print(f"  {reminder.start.strftime('%Y年%m月%d日 %H:%M')} - {reminder.end.strftime('%H:%M')}  {reminder.title}")
+
+        if watch:
+            def notify(reminder):
+                minutes = max(0, int((reminder.start - datetime.now()).total_seconds() // 60))
+                message = f"{reminder.start.strftime('%H:%M')}から「{reminder.title}」（あと{minutes}分）"
+                print(f"\a🔔 {message}", flush=True)
+                if desktop:
+                    desktop_notify('WithAI Calendar', message)
+
+            print(f"\n予定の{lead_minutes}分前に通知します（Ctrl+Cで終了）", flush=True)
+            try:
+                watch_reminders(events_file, notify, lead=timedelta(minutes=lead_minutes))
+            except KeyboardInterrupt:
+                print("\n通知を終了しました")
+        return reminders
+
+    except Exception as error:
+        print(f"エラー: 予期せぬエラーが発生しました - {str(error)}")
+        sys.exit(1)
+
+def handle_storage(layout: str, events_file: str = "events.yml") -> int:
+    """
+    ローカルのイベントファイルの保存形式を切り替える
+
+    'sharded'では開始日時の月ごとのファイル（events.d/YYYY-MM.yml）に分割し、
+    コマンドが該当する月のファイルだけを読み書きするようにする。
+    'flat'では1つのevents.ymlに戻す。
+
+    Args:
+        layout: 'sharded'（月別に分割）または'flat'（1ファイル）
+        events_file: イベントファイルのパス
+
+    Returns:
+        int: 移行したイベント数
+    """
+    try:
+        if (layout == 'sharded') == is_sharded(events_file):
+            print(f"\n📁 既に{'月別に分割' if layout == 'sharded' else '1つのファイルに保存'}されています")
+            return 0
+
+        if layout == 'sharded':
+            count = migrate_to_shards(events_file)
+            print(f"\n✨ {count}件のイベントを月別のファイルに分割しました")
+            print(f"保存先: {os.path.splitext(events_file)[0]}.d/（元のファイルは{events_file}.bakに残しています）")
+        else:
+            count = migrate_to_flat(events_file)
+            print(f"\n✨ {count}件のイベントを{events_file}にまとめました")
+        return count
+
+    except Exception as error:
+        print(f"エラー: 予期せぬエラーが発生しました - {str(error)}")
+        sys.exit(1)
+
 def main():
     """メイン処理"""
     parser = argparse.ArgumentParser(
@@ -303,25 +1937,97 @@ def main():
 
   イベントの削除:
     python calendar_manager.py delete EVENT_ID
+    python calendar_manager.py delete --start "2024-03-01" --end "2024-03-31" --match "旧プロジェクト" --dry-run
+
+  期間内のイベントをまとめてずらす:
+    python calendar_manager.py shift --start "2024-03-18" --end "2024-03-24" --by 1d
+
+  オフラインでの変更と後からの送信:
+    python calendar_manager.py add "2024-03-20 15:00" "2024-03-20 16:00" "ミーティング" --defer
+    python calendar_manager.py flush
+
+  ローカルとGoogle Calendarの差分の解消:
+    python calendar_manager.py reconcile --dry-run
+    python calendar_manager.py reconcile --policy local
+
+  複数の操作をまとめて実行（1行に1つのJSON、結果も1行に1つのJSON）:
+    python calendar_manager.py run operations.jsonl
+    echo '{"command": "add", "start_datetime": "2024-03-20 15:00", "end_datetime": "2024-03-20 16:00", "title": "会議"}' | python calendar_manager.py run -
+
+  Google Calendarの変更を通知で受け取って揃え続ける:
+    python calendar_manager.py watch --address https://example.com/calendar-notify --port 8765
 
   イベント一覧の表示:
     python calendar_manager.py list
     python calendar_manager.py list --start "2024-03-01" --end "2024-03-31"
+    python calendar_manager.py --cache-ttl 120 list --start "2024-03-01" --end "2024-03-31"
+    python calendar_manager.py list --local --start "2024-03-20" --end "2024-03-20"
+    python calendar_manager.py list --start "2024-03-18" --end "2024-03-24" --prefetch
+
+  iCalendarファイルの取り込み・書き出し:
+    python calendar_manager.py import other_calendar.ics
+    python calendar_manager.py export --start "2024-03-01" --end "2024-03-31" march.ics
+
+  イベントの検索:
+    python calendar_manager.py search "プロダクトキー"
+    python calendar_manager.py search "定例" --include-deleted
+
+  予定の詰まり具合の集計:
+    python calendar_manager.py stats --start "2024-01-01" --end "2024-12-31"
+    python calendar_manager.py stats --remote --json
+
+  ローカルのイベントファイルを月別に分割:
+    python calendar_manager.py storage sharded
+
+  削除したイベントを戻す:
+    python calendar_manager.py restore --deleted-after "2024-03-20" --dry-run
+    python calendar_manager.py restore --title "定例" --deleted-after "2024-03-20 15:00"
+
+  直近の予定の表示と通知:
+    python calendar_manager.py agenda --days 3
+    python calendar_manager.py agenda --watch --lead 5 --desktop
+
+  複数アカウント（プロファイル）の利用:
+    python calendar_manager.py add "2024-03-20 15:00" "2024-03-20 16:00" "面談" --profile sato
+    python calendar_manager.py list --start "2024-03-18" --end "2024-03-22" --profile sato --profile suzuki
+    python calendar_manager.py free --start "2024-03-18" --end "2024-03-22" --profile sato --profile suzuki --min 60
+
+  遅いコマンドの計測（バグ報告に添付できるプロファイルとメモリ確保の要約を書き出す）:
+    python calendar_manager.py --profile-out list-2024.pstats --profile-memory list --start "2024-01-01" --end "2024-12-31"
+    python -m pstats list-2024.pstats
     """
     )
+    parser.add_argument('--cache-ttl', type=float, default=None,
+                        help='一覧・取得結果をキャッシュする秒数（0で無効、環境変数WITHAI_CACHE_TTLでも指定可）')
+    parser.add_argument('--cache-size', type=int, default=CACHE_MAX_ENTRIES,
+                        help=f'キャッシュするエントリ数の上限（デフォルト: {CACHE_MAX_ENTRIES}）')
+    parser.add_argument('--profile-out', metavar='PATH',
+                        help='コマンドをcProfileで計測し、PATH（.pstats）と要約（.json）に書き出す（バグ報告への添付用）')
+    parser.add_argument('--profile-memory', action='store_true',
+                        help='--profile-outと一緒に指定すると、tracemallocでメモリの確保も記録する（実行が遅くなる）')
     subparsers = parser.add_subparsers(dest='command', help='サブコマンド')
 
+    # すべてのサブコマンドで使えるプロファイルの指定
+    profile_parser = argparse.ArgumentParser(add_help=False)
+    profile_parser.add_argument('--profile', action='append',
+                                help=f'使用する認証情報のプロファイル（省略時は環境変数WITHAI_PROFILEまたは{DEFAULT_PROFILE}。'
+                                     'listとfreeは複数指定すると各アカウントに並行して問い合わせる）')
+
     # addコマンド
-    add_parser = subparsers.add_parser('add', help='イベントを追加')
+    add_parser = subparsers.add_parser('add', parents=[profile_parser], help='イベントを追加')
     add_parser.add_argument('start_datetime', help='開始日時 (例: "2024-03-20 15:00")')
     add_parser.add_argument('end_datetime', help='終了日時 (例: "2024-03-20 16:00")')
     add_parser.add_argument('title', help='イベントのタイトル')
     add_parser.add_argument('--detail', help='イベントの詳細')
     add_parser.add_argument('--recurrence', choices=['daily', 'weekly', 'monthly', 'weekday'],
                            help='繰り返しパターン（daily=毎日, weekly=毎週, monthly=毎月, weekday=平日のみ）')
+    add_parser.add_argument('--defer', action='store_true',
+                           help='Google Calendarにはすぐ送信せず送信待ちにする（flushで送信）')
+    add_parser.add_argument('--idempotency-key',
+                           help='イベントIDを決める冪等キー（同じキーで再実行しても重複して追加しない）')
 
     # updateコマンド
-    update_parser = subparsers.add_parser('update', help='イベントを更新')
+    update_parser = subparsers.add_parser('update', parents=[profile_parser], help='イベントを更新')
     update_parser.add_argument('event_id', help='更新対象のイベントID')
     update_parser.add_argument('--title', help='新しいタイトル')
     update_parser.add_argument('--start_datetime', help='新しい開始日時 (例: "2024-03-20 15:00")')
@@ -329,36 +2035,231 @@ def main():
     update_parser.add_argument('--detail', help='新しい詳細')
     update_parser.add_argument('--recurrence', choices=['daily', 'weekly', 'monthly', 'weekday', 'none'],
                              help='新しい繰り返しパターン（none=繰り返しを解除）')
+    update_parser.add_argument('--defer', action='store_true',
+                             help='Google Calendarにはすぐ送信せず送信待ちにする（flushで送信）')
 
     # deleteコマンド
-    delete_parser = subparsers.add_parser('delete', help='イベントを削除')
-    delete_parser.add_argument('event_id', help='削除対象のイベントID')
+    delete_parser = subparsers.add_parser('delete', parents=[profile_parser], help='イベントを削除')
+    delete_parser.add_argument('event_id', nargs='?', help='削除対象のイベントID（--startと--endで期間内をまとめて削除する場合は省略）')
+    delete_parser.add_argument('--defer', action='store_true',
+                             help='Google Calendarにはすぐ送信せず送信待ちにする（flushで送信）')
+    delete_parser.add_argument('--start', help='まとめて削除する期間の開始日 (例: "2024-03-01")')
+    delete_parser.add_argument('--end', help='まとめて削除する期間の終了日 (例: "2024-03-31")')
+    delete_parser.add_argument('--match', help='タイトルにこの文字列を含むイベントだけを削除')
+    delete_parser.add_argument('--dry-run', action='store_true', help='削除せずに対象を表示するだけ')
+
+    # shiftコマンド
+    shift_parser = subparsers.add_parser('shift', parents=[profile_parser], help='期間内のイベントをまとめてずらす')
+    shift_parser.add_argument('--start', required=True, help='期間の開始日 (例: "2024-03-18")')
+    shift_parser.add_argument('--end', required=True, help='期間の終了日 (例: "2024-03-24")')
+    shift_parser.add_argument('--by', required=True, help='ずらす時間 (例: 1d, -2h, 1w, 30m)')
+    shift_parser.add_argument('--match', help='タイトルにこの文字列を含むイベントだけをずらす')
+    shift_parser.add_argument('--dry-run', action='store_true', help='変更せずに対象を表示するだけ')
 
     # listコマンド
-    list_parser = subparsers.add_parser('list', help='イベント一覧を表示')
+    list_parser = subparsers.add_parser('list', parents=[profile_parser], help='イベント一覧を表示')
     list_parser.add_argument('--start', help='取得開始日 (例: "2024-03-01")')
     list_parser.add_argument('--end', help='取得終了日 (例: "2024-03-31")')
+    list_parser.add_argument('--local', action='store_true',
+                             help='Google Calendarに接続せずローカルのイベントから表示する')
+    list_parser.add_argument('--prefetch', type=int, nargs='?', const=PREFETCH_RANGES, default=0,
+                             help=f'表示後に続きの期間をキャッシュに先読みする（期間の数、省略時: {PREFETCH_RANGES}）')
+
+    # freeコマンド
+    free_parser = subparsers.add_parser('free', parents=[profile_parser], help='全員の予定が空いている時間を探す')
+    free_parser.add_argument('--start', required=True, help='開始日 (例: "2024-03-18")')
+    free_parser.add_argument('--end', help='終了日 (例: "2024-03-22"、省略時は開始日と同じ日)')
+    free_parser.add_argument('--min', type=int, default=MIN_SLOT_MINUTES, dest='min_minutes',
+                             help=f'表示する空き時間の最短の長さ（分、デフォルト: {MIN_SLOT_MINUTES}）')
+    free_parser.add_argument('--include-weekends', action='store_true', help='土日も対象にする')
+
+    # importコマンド
+    import_parser = subparsers.add_parser('import', parents=[profile_parser], help='iCalendarファイルからイベントを一括追加')
+    import_parser.add_argument('file', help='取り込むiCalendarファイル (.ics)')
+    import_parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                               help=f'1回のバッチリクエストで追加する件数（デフォルト: {BATCH_SIZE}）')
+    import_parser.add_argument('--restart', action='store_true',
+                               help='前回の進捗を無視して最初から取り込む')
+
+    # exportコマンド
+    export_parser = subparsers.add_parser('export', parents=[profile_parser], help='イベントをiCalendarファイルに書き出す')
+    export_parser.add_argument('file', help='書き出し先のiCalendarファイル (.ics)')
+    export_parser.add_argument('--start', help='書き出し開始日 (例: "2024-03-01")')
+    export_parser.add_argument('--end', help='書き出し終了日 (例: "2024-03-31")')
+    export_parser.add_argument('--local', action='store_true',
+                               help='Google Calendarではなくローカルのevents.ymlから書き出す')
+
+    # searchコマンド
+    search_parser = subparsers.add_parser('search', parents=[profile_parser], help='ローカルのイベントをタイトルと詳細で検索')
+    search_parser.add_argument('query', help='検索語（空白区切りでAND検索）')
+    search_parser.add_argument('--include-deleted', action='store_true',
+                               help='削除済みイベントも検索対象にする')
+
+    # flushコマンド
+    flush_parser = subparsers.add_parser('flush', parents=[profile_parser], help='送信待ちの変更をGoogle Calendarに送信')
+    flush_parser.add_argument('--force', action='store_true',
+                              help='Google Calendar側の変更と競合してもローカルの変更で上書きする')
+
+    # reconcileコマンド
+    reconcile_parser = subparsers.add_parser('reconcile', parents=[profile_parser], help='ローカルとGoogle Calendarの差分を検出して揃える')
+    reconcile_parser.add_argument('--policy', choices=POLICIES, default='remote',
+                                  help='両方で変更されていた場合に優先する側（remote=Google Calendar, local=ローカル）')
+    reconcile_parser.add_argument('--dry-run', action='store_true', help='反映せずに差分だけを表示')
+
+    # runコマンド
+    run_parser = subparsers.add_parser('run', parents=[profile_parser], help='JSON Linesに書いた複数の操作をまとめて実行')
+    run_parser.add_argument('file', help='操作を書いたファイル（1行に1つのJSON、"-"なら標準入力）。'
+                                         'commandにadd/update/delete/listとサブコマンドと同じ名前の引数を書く')
+
+    # watchコマンド
+    watch_parser = subparsers.add_parser('watch', parents=[profile_parser], help='Google Calendarの変更通知を受け取ってローカルと揃え続ける')
+    watch_parser.add_argument('--address', required=True,
+                              help='通知の送り先のHTTPSのURL（ローカルの待ち受けポートへ転送されるもの）')
+    watch_parser.add_argument('--host', default=RECEIVER_HOST, help=f'通知を待ち受けるアドレス（デフォルト: {RECEIVER_HOST}）')
+    watch_parser.add_argument('--port', type=int, default=RECEIVER_PORT, help=f'通知を待ち受けるポート（デフォルト: {RECEIVER_PORT}）')
+    watch_parser.add_argument('--policy', choices=POLICIES, default='remote',
+                              help='両方で変更されていた場合に優先する側（remote=Google Calendar, local=ローカル）')
+
+    # statsコマンド
+    stats_parser = subparsers.add_parser('stats', parents=[profile_parser], help='予定の詰まり具合（時間帯・稼働率・空き時間）を集計')
+    stats_parser.add_argument('--start', help='集計開始日 (例: "2024-03-01"、省略時は今月の1日)')
+    stats_parser.add_argument('--end', help='集計終了日 (例: "2024-03-31"、省略時は今月の末日)')
+    stats_parser.add_argument('--remote', action='store_true',
+                              help='ローカルではなくGoogle Calendarから取得して集計する')
+    stats_parser.add_argument('--json', action='store_true', help='表ではなくJSONで出力する')
+
+    # restoreコマンド
+    restore_parser = subparsers.add_parser('restore', parents=[profile_parser], help='削除済みのイベントを戻す')
+    restore_parser.add_argument('--id', action='append', dest='event_ids', help='戻すイベントのID（複数指定可）')
+    restore_parser.add_argument('--deleted-after', help='この日時以降に削除されたもの (例: "2024-03-20 15:00")')
+    restore_parser.add_argument('--deleted-before', help='この日時より前に削除されたもの（日付だけならその日を含む）')
+    restore_parser.add_argument('--title', help='タイトルにこの文字列を含むもの')
+    restore_parser.add_argument('--dry-run', action='store_true', help='戻さずに対象を表示するだけ')
+
+    # agendaコマンド
+    agenda_parser = subparsers.add_parser('agenda', parents=[profile_parser], help='直近の予定を表示し、予定の前に通知する')
+    agenda_parser.add_argument('--days', type=int, default=1, help='表示する日数（デフォルト: 1）')
+    agenda_parser.add_argument('--watch', action='store_true', help='終了するまで予定の前に通知し続ける')
+    agenda_parser.add_argument('--lead', type=int, default=REMINDER_LEAD_MINUTES,
+                               help=f'予定の何分前に通知するか（デフォルト: {REMINDER_LEAD_MINUTES}）')
+    agenda_parser.add_argument('--desktop', action='store_true', help='デスクトップ通知も表示する')
+
+    # storageコマンド
+    storage_parser = subparsers.add_parser('storage', parents=[profile_parser], help='ローカルのイベントファイルの保存形式を切り替える')
+    storage_parser.add_argument('layout', choices=['sharded', 'flat'],
+                                help='sharded=開始月ごとのファイルに分割, flat=1つのevents.ymlに戻す')
 
     args = parser.parse_args()
+    if args.profile_memory and not args.profile_out:
+        parser.error("--profile-memoryは--profile-outと一緒に指定してください")
+    if args.cache_ttl is None:
+        cache_ttl = os.environ.get('WITHAI_CACHE_TTL', '0')
+        try:
+            args.cache_ttl = float(cache_ttl)
+        except ValueError:
+            parser.error(f"環境変数WITHAI_CACHE_TTLは秒数で指定してください: {cache_ttl!r}")
 
-    if args.command == 'add':
-        handle_add(args.start_datetime, args.end_datetime, args.title, args.detail, args.recurrence)
-    elif args.command == 'update':
-        handle_update(
-            args.event_id,
-            new_title=args.title,
-            new_start_datetime=args.start_datetime,
-            new_end_datetime=args.end_datetime,
-            new_detail=args.detail,
-            new_recurrence=args.recurrence
-        )
-    elif args.command == 'delete':
-        handle_delete(args.event_id)
-    elif args.command == 'list':
-        handle_list(args.start, args.end)
-    else:
-        parser.print_help()
-        sys.exit(1)
+    if args.cache_ttl > 0:
+        enable_response_cache(ttl=args.cache_ttl, max_entries=args.cache_size)
+    elif getattr(args, 'prefetch', 0):
+        # 先読みした結果は次のコマンドでキャッシュから返す
+        enable_response_cache(ttl=CACHE_TTL, max_entries=args.cache_size)
+
+    profiles = getattr(args, 'profile', None) or [os.environ.get('WITHAI_PROFILE', DEFAULT_PROFILE)]
+    if len(profiles) > 1 and args.command not in ('list', 'free'):
+        parser.error("--profileを複数指定できるのはlistとfreeだけです")
+    try:
+        for profile in profiles:
+            validate_profile(profile)
+        use_profile(profiles[0])
+    except ValueError as error:
+        parser.error(str(error))
+
+    # default以外のプロファイルはローカルのファイルもprofiles/<プロファイル名>/に分ける
+    events_file = profile_path(profiles[0], 'events.yml')
+    deleted_events_file = profile_path(profiles[0], 'deletedevents.yml')
+    if os.path.dirname(events_file):
+        os.makedirs(os.path.dirname(events_file), exist_ok=True)
+
+    def run_command():
+        if args.command == 'add':
+            handle_add(args.start_datetime, args.end_datetime, args.title, args.detail, args.recurrence,
+                       events_file=events_file, deleted_events_file=deleted_events_file,
+                       defer=args.defer, idempotency_key=args.idempotency_key)
+        elif args.command == 'update':
+            handle_update(
+                args.event_id,
+                new_title=args.title,
+                new_start_datetime=args.start_datetime,
+                new_end_datetime=args.end_datetime,
+                new_detail=args.detail,
+                new_recurrence=args.recurrence,
+                events_file=events_file,
+                deleted_events_file=deleted_events_file,
+                defer=args.defer
+            )
+        elif args.command == 'delete':
+            if args.event_id and (args.start or args.end or args.match):
+                parser.error("イベントIDと--start/--end/--matchは同時に指定できません")
+            if args.event_id:
+                handle_delete(args.event_id, events_file=events_file, deleted_events_file=deleted_events_file,
+                              defer=args.defer)
+            elif args.start and args.end:
+                handle_bulk_delete(args.start, args.end, match=args.match, dry_run=args.dry_run,
+                                   events_file=events_file, deleted_events_file=deleted_events_file)
+            else:
+                parser.error("イベントID、または--startと--endを指定してください")
+        elif args.command == 'shift':
+            handle_shift(args.start, args.end, args.by, match=args.match, dry_run=args.dry_run,
+                         events_file=events_file, deleted_events_file=deleted_events_file)
+        elif args.command == 'list':
+            handle_list(args.start, args.end, events_file=events_file, from_local=args.local,
+                        prefetch=args.prefetch, profiles=profiles)
+            wait_prefetch()
+        elif args.command == 'free':
+            handle_free(args.start, args.end, profiles=profiles, min_minutes=args.min_minutes,
+                        include_weekends=args.include_weekends)
+        elif args.command == 'import':
+            handle_import(args.file, batch_size=args.batch_size, restart=args.restart,
+                          events_file=events_file, deleted_events_file=deleted_events_file)
+        elif args.command == 'export':
+            handle_export(args.file, args.start, args.end, from_local=args.local, events_file=events_file)
+        elif args.command == 'search':
+            handle_search(args.query, include_deleted=args.include_deleted,
+                          events_file=events_file, deleted_events_file=deleted_events_file)
+        elif args.command == 'flush':
+            handle_flush(force=args.force, events_file=events_file, deleted_events_file=deleted_events_file)
+        elif args.command == 'reconcile':
+            handle_reconcile(policy=args.policy, dry_run=args.dry_run,
+                             events_file=events_file, deleted_events_file=deleted_events_file)
+        elif args.command == 'run':
+            handle_run(args.file, events_file=events_file, deleted_events_file=deleted_events_file)
+        elif args.command == 'watch':
+            handle_watch(args.address, host=args.host, port=args.port, policy=args.policy,
+                         events_file=events_file, deleted_events_file=deleted_events_file)
+        elif args.command == 'stats':
+            handle_stats(args.start, args.end, from_remote=args.remote, as_json=args.json, events_file=events_file)
+        elif args.command == 'restore':
+            handle_restore(args.event_ids, deleted_after=args.deleted_after, deleted_before=args.deleted_before,
+                           title=args.title, dry_run=args.dry_run,
+                           events_file=events_file, deleted_events_file=deleted_events_file)
+        elif args.command == 'agenda':
+            handle_agenda(days=args.days, watch=args.watch, lead_minutes=args.lead, desktop=args.desktop,
+                          events_file=events_file)
+        elif args.command == 'storage':
+            handle_storage(args.layout, events_file=events_file)
+        else:
+            parser.print_help()
+            sys.exit(1)
+
+    if not args.profile_out:
+        run_command()
+        return
+    arguments = {name: value for name, value in vars(args).items()
+                 if name not in ('command', 'profile_out', 'profile_memory')}
+    profile_command(args.profile_out, args.command, arguments, run_command,
+                    files={'events_file': events_file, 'deleted_events_file': deleted_events_file},
+                    trace_memory=args.profile_memory)
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
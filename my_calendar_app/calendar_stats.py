@@ -0,0 +1,249 @@
+from typing import Dict, Iterable, List, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # statsコマンドを使わない場合はNumPyがなくてもよい
+    np = None
+
+from availability import WORK_HOURS
+
+MINUTES_PER_DAY = 24 * 60
+
+# 1970-01-01は木曜日（月曜日を0とした曜日の計算に使う）
+EPOCH_WEEKDAY = 3
+
+WEEKDAY_NAMES = ('月', '火', '水', '木', '金', '土', '日')
+
+# 繰り返しパターンごとの間隔（分）。monthlyとweekdayは別に扱う
+RECURRENCE_STEPS = {'daily': MINUTES_PER_DAY, 'weekly': 7 * MINUTES_PER_DAY}
+
+def require_numpy() -> None:
+    """NumPyが使えない場合に分かりやすいエラーを送出"""
+    if np is None:
+        raise RuntimeError("集計にはNumPyが必要です（pip install numpy）")
+
+def to_minutes(datetime_strs: Iterable[str]):
+    """
+    "YYYY-MM-DD HH:MM"形式の日時をまとめて1970-01-01 00:00からの分数に変換
+
+    Args:
+        datetime_strs: ローカル形式の日時文字列
+
+    Returns:
+        np.ndarray: 分数（int64）の配列
+    """
+    values = [value.replace(' ', 'T') for value in datetime_strs]
+    return np.array(values, dtype='datetime64[m]').astype(np.int64)
+
+def weekday_of(minutes):
+    """分数の配列から曜日（月曜日=0）の配列を返す"""
+    return (minutes // MINUTES_PER_DAY + EPOCH_WEEKDAY) % 7
+
+def expand_recurrence(start: int, duration: int, recurrence: str, range_start: int, range_end: int):
+    """
+    定期イベントの期間内の開始日時をまとめて計算
+
+    Google Calendarと同じく、monthlyは開始日と同じ日付がない月を飛ばす。
+
+    Args:
+        start: 最初の予定の開始（分）
+        duration: 1回の予定の長さ（分）
+        recurrence: 繰り返しパターン（'daily', 'weekly', 'monthly', 'weekday'）
+        range_start: 集計期間の開始（分）
+        range_end: 集計期間の終了（分、含まない）
+
+    Returns:
+        np.ndarray: 集計期間と重なる予定の開始（分）の配列
+    """
+    if recurrence == 'monthly':
+        start_dt = np.datetime64(int(start), 'm')
+        start_month = start_dt.astype('datetime64[M]')
+        day_offset = start_dt.astype('datetime64[D]') - start_month.astype('datetime64[D]')
+        time_offset = int(start) - start_dt.astype('datetime64[D]').astype('datetime64[m]').astype(np.int64)
+        months = np.arange(start_month, np.datetime64(int(range_end), 'm').astype('datetime64[M]') + 1)
+        days = months.astype('datetime64[D]') + day_offset
+        days = days[days.astype('datetime64[M]') == months]
+        starts = days.astype('datetime64[m]').astype(np.int64) + time_offset
+    else:
+        step = RECURRENCE_STEPS.get(recurrence, MINUTES_PER_DAY)
+        # 集計期間より前の繰り返しは飛ばして生成する
+        skip = max(0, (range_start - duration - start) // step)
+        starts = np.arange(start + skip * step, range_end, step, dtype=np.int64)
+        if recurrence == 'weekday':
+            starts = starts[weekday_of(starts) < 5]
+    return starts[(starts < range_end) & (starts + duration > range_start)]
+
+def collect_occurrences(events: Iterable[Dict], range_start: int, range_end: int):
+    """
+    ローカル形式のイベントから集計期間と重なる予定を集める（定期イベントは展開する）
+
+    Args:
+        events: ローカル形式のイベント
+        range_start: 集計期間の開始（分）
+        range_end: 集計期間の終了（分、含まない）
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: 予定の開始（分）と終了（分）の配列
+    """
+    single_starts, single_ends = [], []
+    recurring = []
+    for event in events:
+        if event.get('recurrence') in ('daily', 'weekly', 'monthly', 'weekday'):
+            recurring.append(event)
+        else:
+            single_starts.append(event['start_datetime'])
+            single_ends.append(event['end_datetime'])
+
+    starts = [to_minutes(single_starts)]
+    ends = [to_minutes(single_ends)]
+    if recurring:
+        first_starts = to_minutes([event['start_datetime'] for event in recurring])
+        durations = to_minutes([event['end_datetime'] for event in recurring]) - first_starts
+        for event, start, duration in zip(recurring, first_starts, durations):
+            occurrence_starts = expand_recurrence(int(start), int(duration), event['recurrence'],
+                                                  range_start, range_end)
+            starts.append(occurrence_starts)
+            ends.append(occurrence_starts + duration)
+
+    starts = np.concatenate(starts)
+    ends = np.concatenate(ends)
+    overlapping = (starts < range_end) & (ends > range_start)
+    return starts[overlapping], ends[overlapping]
+
+def compute_stats(starts, ends, range_start: int, range_end: int,
+                  work_hours: Tuple[int, int] = WORK_HOURS) -> Dict:
+    """
+    予定の開始と終了の配列から予定の詰まり具合を集計
+
+    集計期間を1分単位の配列にして、重なっている予定の数を累積和で求める。
+    重なった予定は二重に数えず、終日の予定は集計から除く。
+
+    Args:
+        starts: 予定の開始（分）の配列
+        ends: 予定の終了（分）の配列
+        range_start: 集計期間の開始（分、0時ちょうど）
+        range_end: 集計期間の終了（分、0時ちょうど、含まない）
+        work_hours: 稼働率の計算に使う勤務時間（開始時, 終了時）
+
+    Returns:
+        Dict: 以下のキーを持つ集計結果（JSONに変換できる値のみ）
+            occurrences: 予定の数
+            booked_hours: 予定の長さの合計（時間、重なりも数える）
+            busy_hours: 予定が入っている時間（時間、重なりは1回だけ数える）
+            utilization: 平日の勤務時間のうち予定が入っている割合
+            average_gap_minutes: 同じ日の予定の間の空き時間の平均（分）
+            daily: 日ごとの予定が入っている時間
+            weekly: 週（月曜日始まり）ごとの予定が入っている時間と稼働率
+            heatmap: 曜日×時間帯の予定が入っている時間（7×24）
+            busiest_hours: 予定が多い曜日と時間帯の上位5件
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    all_day = (starts % MINUTES_PER_DAY == 0) & ((ends - starts) % MINUTES_PER_DAY == 0)
+    starts, ends = starts[~all_day], ends[~all_day]
+
+    n_days = (range_end - range_start) // MINUTES_PER_DAY
+    n_minutes = n_days * MINUTES_PER_DAY
+    first = np.clip(starts - range_start, 0, n_minutes)
+    last = np.clip(ends - range_start, 0, n_minutes)
+
+    # 開始で+1、終了で-1した配列の累積和が、各分に重なっている予定の数になる
+    delta = np.bincount(first, minlength=n_minutes + 1) - np.bincount(last, minlength=n_minutes + 1)
+    busy = np.cumsum(delta[:n_minutes]) > 0
+    busy_by_day = busy.reshape(n_days, MINUTES_PER_DAY)
+
+    day_numbers = range_start // MINUTES_PER_DAY + np.arange(n_days)
+    weekdays = (day_numbers + EPOCH_WEEKDAY) % 7
+    minute_of_day = np.arange(MINUTES_PER_DAY)
+    work_minutes = (minute_of_day >= work_hours[0] * 60) & (minute_of_day < work_hours[1] * 60)
+    work_mask = (weekdays < 5)[:, None] & work_minutes[None, :]
+
+    daily_busy = busy_by_day.sum(axis=1)
+    daily_work_busy = (busy_by_day & work_mask).sum(axis=1)
+    daily_work = work_mask.sum(axis=1)
+
+    # 週ごとの集計（月曜日の日付でまとめる）
+    week_index = (day_numbers - weekdays - (day_numbers[0] - weekdays[0])) // 7
+    weekly_busy = np.bincount(week_index, weights=daily_busy)
+    weekly_work_busy = np.bincount(week_index, weights=daily_work_busy)
+    weekly_work = np.bincount(week_index, weights=daily_work)
+    week_starts = day_numbers[0] - weekdays[0] + 7 * np.arange(len(weekly_busy))
+
+    # 曜日×時間帯のヒートマップ
+    hourly = busy_by_day.reshape(n_days, 24, 60).sum(axis=2)
+    heatmap = np.zeros((7, 24))
+    np.add.at(heatmap, weekdays, hourly)
+    order = np.argsort(-heatmap, axis=None, kind='stable')[:5]
+
+    # 予定のまとまりの間の空き時間（日をまたぐものは除く）
+    edges = np.diff(np.concatenate(([0], busy.astype(np.int8), [0])))
+    block_starts = np.flatnonzero(edges == 1)
+    block_ends = np.flatnonzero(edges == -1)
+    gaps = block_starts[1:] - block_ends[:-1]
+    same_day = block_starts[1:] // MINUTES_PER_DAY == (block_ends[:-1] - 1) // MINUTES_PER_DAY
+    gaps = gaps[same_day]
+
+    total_work = int(work_mask.sum())
+    return {
+        'occurrences': int(len(starts)),
+        'booked_hours': round(float((last - first).sum()) / 60, 2),
+        'busy_hours': round(float(daily_busy.sum()) / 60, 2),
+        'utilization': round(float(daily_work_busy.sum()) / total_work, 4) if total_work else None,
+        'average_gap_minutes': round(float(gaps.mean()), 1) if len(gaps) else None,
+        'daily': [
+            {'date': str(np.datetime64(int(day), 'D')), 'busy_hours': round(float(minutes) / 60, 2)}
+            for day, minutes in zip(day_numbers, daily_busy)
+        ],
+        'weekly': [
+            {
+                'week_start': str(np.datetime64(int(day), 'D')),
+                'busy_hours': round(float(minutes) / 60, 2),
+                'utilization': round(float(work_busy) / float(work), 4) if work else None
+            }
+            for day, minutes, work_busy, work in zip(week_starts, weekly_busy, weekly_work_busy, weekly_work)
+        ],
+        'heatmap': [[round(float(minutes) / 60, 2) for minutes in row] for row in heatmap],
+        'busiest_hours': [
+            {'weekday': WEEKDAY_NAMES[index // 24], 'hour': int(index % 24),
+             'busy_hours': round(float(heatmap.flat[index]) / 60, 2)}
+            for index in order if heatmap.flat[index] > 0
+        ]
+    }
+
+def format_stats_table(stats: Dict) -> List[str]:
+    """
+    集計結果を表示用の行に整形
+
+    Args:
+        stats: compute_stats()の集計結果
+
+    Returns:
+        List[str]: 表示する行のリスト
+    """
+    lines = [
+        f"予定の数: {stats['occurrences']}件",
+        f"予定の長さの合計: {stats['booked_hours']:.1f}時間",
+        f"予定が入っている時間: {stats['busy_hours']:.1f}時間",
+    ]
+    if stats['utilization'] is not None:
+        lines.append(f"稼働率（平日{WORK_HOURS[0]}時〜{WORK_HOURS[1]}時）: {stats['utilization']:.1%}")
+    if stats['average_gap_minutes'] is not None:
+        lines.append(f"予定の間の空き時間の平均: {stats['average_gap_minutes']:.0f}分")
+
+    lines += ["", "週ごとの予定", "-" * 50, "週の始まり        時間   稼働率"]
+    for week in stats['weekly']:
+        utilization = f"{week['utilization']:.0%}" if week['utilization'] is not None else "-"
+        lines.append(f"{week['week_start']:<14}  {week['busy_hours']:>6.1f}  {utilization:>7}")
+
+    # 曜日×時間帯のヒートマップ（濃いほど予定が多い）
+    shades = ' ░▒▓█'
+    peak = max(max(row) for row in stats['heatmap']) or 1
+    lines += ["", "曜日×時間帯（0〜23時）", "-" * 50, "    " + "".join(f"{hour:<3}" for hour in range(0, 24, 3))]
+    for name, row in zip(WEEKDAY_NAMES, stats['heatmap']):
+        cells = "".join(shades[min(len(shades) - 1, int(value / peak * (len(shades) - 1) + 0.999))] for value in row)
+        lines.append(f"{name}  |{cells}|")
+    if stats['busiest_hours']:
+        lines += ["", "予定が多い時間帯:"]
+        for bucket in stats['busiest_hours']:
+            lines.append(f"  {bucket['weekday']}曜 {bucket['hour']:02d}時台: {bucket['busy_hours']:.1f}時間")
+    return lines
@@ -0,0 +1,181 @@
+import os
+import sys
+import json
+import time
+import cProfile
+import pstats
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterator, Optional
+import httplib2
+
+from local_data_manager import shard_dir_for
+
+# プロファイルの拡張子と、一緒に書き出す要約の拡張子
+PSTATS_SUFFIX = '.pstats'
+SUMMARY_SUFFIX = '.json'
+
+# 要約に含めるメモリ確保の箇所と関数の数、tracemallocで記録する呼び出し元の深さ
+TOP_ALLOCATIONS = 20
+TOP_FUNCTIONS = 20
+TRACEMALLOC_FRAMES = 10
+
+def profile_paths(path: str) -> Dict[str, str]:
+    """
+    プロファイルと要約の書き出し先
+
+    Args:
+        path: --profile-outで指定されたパス（.pstatsがなければ付ける）
+
+    Returns:
+        Dict[str, str]: 'pstats'と'summary'のパス
+    """
+    stem = path[:-len(PSTATS_SUFFIX)] if path.endswith(PSTATS_SUFFIX) else path
+    return {'pstats': stem + PSTATS_SUFFIX, 'summary': stem + SUMMARY_SUFFIX}
+
+@contextmanager
+def count_api_calls() -> Iterator[Dict[str, int]]:
+    """
+    Google Calendar APIへのHTTPリクエストの回数を数える
+
+    バッチリクエストは1回と数える（サーバーとの往復の回数）。並行して問い合わせる
+    スレッドの分も数える。
+
+    Yields:
+        Dict[str, int]: 'api_calls'に回数が入る辞書（終了まで増え続ける）
+    """
+    counter = {'api_calls': 0}
+    lock = threading.Lock()
+    original = httplib2.Http.request
+
+    def request(self, *args, **kwargs):
+        with lock:
+            counter['api_calls'] += 1
+        return original(self, *args, **kwargs)
+
+    httplib2.Http.request = request
+    try:
+        yield counter
+    finally:
+        httplib2.Http.request = original
+
+def _path_size(path: str) -> Optional[int]:
+    """ファイル（分割保存ならシャードのディレクトリ全体）のバイト数。存在しなければNone"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    directory = path if os.path.isdir(path) else shard_dir_for(path)
+    if not os.path.isdir(directory):
+        return None
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(directory) for name in names)
+
+def argument_sizes(arguments: Dict) -> Dict[str, any]:
+    """
+    コマンドの引数を、内容を含まない大きさに置き換える（バグ報告に添付しても予定の内容が漏れない）
+
+    文字列は文字数、リストは要素数、数値と真偽値はそのまま。存在するファイルを指す
+    文字列はバイト数も記録する。
+
+    Args:
+        arguments: 引数名から値への辞書
+
+    Returns:
+        Dict[str, any]: 引数名から大きさへの辞書（Noneの引数は含めない）
+    """
+    sizes = {}
+    for name, value in arguments.items():
+        if value is None:
+            continue
+        if isinstance(value, (bool, int, float)):
+            sizes[name] = value
+        elif isinstance(value, str):
+            sizes[name] = {'chars': len(value)}
+            if os.path.isfile(value):
+                sizes[name]['bytes'] = os.path.getsize(value)
+        elif isinstance(value, (list, tuple)):
+            sizes[name] = {'items': len(value)}
+    return sizes
+
+def _top_functions(profiler: cProfile.Profile, limit: int) -> list:
+    """累積時間の長い関数"""
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (file_name, line, function), (_, calls, own, cumulative, _) in stats.stats.items():
+        rows.append({'function': f"{file_name}:{line}({function})", 'calls': calls,
+                     'own_seconds': round(own, 6), 'cumulative_seconds': round(cumulative, 6)})
+    rows.sort(key=lambda row: row['cumulative_seconds'], reverse=True)
+    return rows[:limit]
+
+def _top_allocations(snapshot: tracemalloc.Snapshot, limit: int) -> list:
+    """確保したままのメモリが多い箇所（呼び出し元付き）"""
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+    rows = []
+    for statistic in snapshot.statistics('traceback')[:limit]:
+        rows.append({'bytes': statistic.size, 'blocks': statistic.count,
+                     'traceback': [f"{frame.filename}:{frame.lineno}" for frame in statistic.traceback]})
+    return rows
+
+def profile_command(path: str, command: str, arguments: Dict, run: Callable[[], any],
+                    files: Optional[Dict[str, str]] = None, trace_memory: bool = False,
+                    top: int = TOP_ALLOCATIONS) -> Dict:
+    """
+    コマンドをcProfile（とtracemalloc）の下で実行し、プロファイルと要約を書き出す
+
+    コマンドがsys.exit()やCtrl+Cで終わった場合も書き出してから例外を送り直す。
+    要約（JSON）にはコマンド名、引数とローカルのファイルの大きさ、APIの呼び出し回数、
+    経過時間、累積時間の長い関数、trace_memoryならメモリのピークと確保の多い箇所を書く。
+
+    Args:
+        path: 書き出し先（profile_paths()を参照）
+        command: サブコマンド名
+        arguments: サブコマンドの引数（argument_sizes()で大きさに置き換えて記録する）
+        run: コマンドを実行する関数
+        files: 大きさを記録するローカルのファイル（名前からパス）
+        trace_memory: tracemallocでメモリの確保も記録するか（実行が遅くなる）
+        top: 要約に含めるメモリ確保の箇所の数
+
+    Returns:
+        Dict: 書き出した要約
+    """
+    paths = profile_paths(path)
+    summary = {'command': command, 'started_at': datetime.now().isoformat(timespec='seconds'),
+               'python': sys.version.split()[0], 'arguments': argument_sizes(arguments),
+               'files': {name: _path_size(file_path) for name, file_path in (files or {}).items()}}
+    profiler = cProfile.Profile()
+    if trace_memory:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    started = time.perf_counter()
+    try:
+        with count_api_calls() as counter:
+            profiler.enable()
+            try:
+                run()
+                summary['exit_status'] = 0
+            except SystemExit as error:
+                summary['exit_status'] = error.code if isinstance(error.code, int) else int(error.code is not None)
+                raise
+            except KeyboardInterrupt:
+                summary['exit_status'] = 'interrupted'
+                raise
+            except Exception as error:
+                # メッセージには予定の内容が含まれうるため、例外の種類だけを記録する
+                summary['exit_status'] = type(error).__name__
+                raise
+            finally:
+                profiler.disable()
+    finally:
+        summary['seconds'] = round(time.perf_counter() - started, 6)
+        summary['api_calls'] = counter['api_calls']
+        if trace_memory:
+            summary['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+            summary['top_allocations'] = _top_allocations(tracemalloc.take_snapshot(), top)
+            tracemalloc.stop()
+        summary['top_functions'] = _top_functions(profiler, TOP_FUNCTIONS)
+
+        profiler.dump_stats(paths['pstats'])
+        with open(paths['summary'], 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"プロファイルを{paths['pstats']}に、要約を{paths['summary']}に書き出しました", file=sys.stderr)
+    return summary
@@ -1,11 +1,22 @@
 import os
-from typing import List, Dict, Optional
-from datetime import datetime
+import re
+import time
+import uuid
+import base64
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Iterator, Tuple
+from datetime import datetime, timedelta, timezone
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 import json
+from urllib.parse import unquote
+
+from local_data_manager import file_lock
 
 # 必要なスコープを定義
 SCOPES = ['https://www.googleapis.com/auth/calendar']
@@ -19,6 +30,175 @@ RECURRENCE_PATTERNS = {
     'weekday': 'RRULE:FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR'
 }
 
+# バッチリクエスト1回あたりの最大件数（Calendar APIの推奨値）
+BATCH_SIZE = 50
+
+# イベント一覧取得時の1ページあたりの件数
+PAGE_SIZE = 250
+
+JST = timezone(timedelta(hours=9))
+
+# レスポンスキャッシュの既定値
+CACHE_FILE = '.calendar_cache.json'
+CACHE_TTL = 60
+CACHE_MAX_ENTRIES = 256
+
+# 認証情報のプロファイル（default以外はprofiles/<プロファイル名>/にtoken.jsonなどを置く）
+DEFAULT_PROFILE = 'default'
+PROFILES_DIR = 'profiles'
+PROFILE_NAME_PATTERN = re.compile(r'[A-Za-z0-9_.-]+')
+
+# enable_response_cache()で有効にしたときの設定（Noneなら無効）
+_cache_settings: Optional[Dict] = None
+
+# 先読みのスレッドと同時にキャッシュファイルを読み書きしないためのロック
+_cache_lock = threading.RLock()
+
+@contextmanager
+def _locked_cache():
+    """キャッシュファイルの読み込みから書き込みまでを、他のスレッドと別々に起動したCLIのプロセスから守る"""
+    with _cache_lock, file_lock(_cache_settings['file']):
+        yield
+
+def enable_response_cache(cache_file: str = CACHE_FILE, ttl: float = CACHE_TTL,
+                          max_entries: int = CACHE_MAX_ENTRIES, namespace: str = 'default') -> None:
+    """
+    読み取り結果のキャッシュを有効にする
+
+    キャッシュはファイルに保存するため、別々に起動したCLIのプロセス間でも共有される。
+    add_event/update_event/delete_eventなどの変更では、影響するエントリだけを無効にする。
+
+    Args:
+        cache_file: キャッシュファイルのパス
+        ttl: キャッシュの有効期間（秒）
+        max_entries: 保持するエントリ数の上限（超えたら最後に使われたのが古いものから捨てる）
+        namespace: キャッシュを分ける名前（アカウントごとに分ける場合など）
+    """
+    global _cache_settings
+    # hitsはキャッシュから取り出した時刻（次に書き込むときにファイルに反映する）
+    _cache_settings = {'file': cache_file, 'ttl': ttl, 'max_entries': max_entries, 'namespace': namespace,
+                       'hits': {}}
+
+def response_cache_enabled() -> bool:
+    """読み取り結果のキャッシュが有効かどうか"""
+    return _cache_settings is not None
+
+def disable_response_cache() -> None:
+    """読み取り結果のキャッシュを無効にする"""
+    global _cache_settings
+    _cache_settings = None
+
+def _cache_key(kind: str, *params) -> str:
+    """キャッシュのキーを作成"""
+    return json.dumps([kind, _cache_settings['namespace'], *params], ensure_ascii=False)
+
+def _read_cache() -> Dict[str, Dict]:
+    """有効期限内のキャッシュのエントリを読み込む"""
+    try:
+        with open(_cache_settings['file'], 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    expires_before = time.time() - _cache_settings['ttl']
+    return {key: entry for key, entry in entries.items() if entry['stored_at'] >= expires_before}
+
+def _write_cache(entries: Dict[str, Dict]) -> None:
+    """キャッシュのエントリを保存（上限を超えた分は最後に使われたのが古いものから捨てる）"""
+    hits = _cache_settings['hits']
+    for key, used_at in hits.items():
+        if key in entries:
+            entries[key]['used_at'] = max(used_at, entries[key].get('used_at', 0))
+    hits.clear()
+    overflow = len(entries) - _cache_settings['max_entries']
+    if overflow > 0:
+        by_use = sorted(entries, key=lambda key: entries[key].get('used_at', entries[key]['stored_at']))
+        for key in by_use[:overflow]:
+            del entries[key]
+    tmp_file = f"{_cache_settings['file']}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(entries, f, ensure_ascii=False)
+    os.replace(tmp_file, _cache_settings['file'])
+
+def _cache_get(key: str) -> Optional[any]:
+    """
+    キャッシュから値を取り出す（見つからないか期限切れならNone）
+
+    取り出した時刻はメモリに記録し、次にキャッシュを書き込むときにまとめて保存する
+    （取り出すたびにファイル全体を書き直さない）。
+    """
+    with _locked_cache():
+        entry = _read_cache().get(key)
+        if entry is None:
+            return None
+        _cache_settings['hits'][key] = time.time()
+        return entry['value']
+
+def _cache_put(key: str, value: any, **meta) -> None:
+    """
+    キャッシュに値を保存
+
+    Args:
+        key: キャッシュのキー
+        value: 保存する値
+        **meta: 無効化の判定に使う情報（calendar_id, event_id, ids, time_min, time_max）
+    """
+    with _locked_cache():
+        entries = _read_cache()
+        now = time.time()
+        _cache_settings['hits'].pop(key, None)
+        entries[key] = dict(meta, stored_at=now, used_at=now, value=value)
+        _write_cache(entries)
+
+def _parse_event_time(value: Optional[Dict]) -> Optional[datetime]:
+    """イベントのstart/endをタイムゾーン付きの日時に変換"""
+    if not value:
+        return None
+    if 'dateTime' in value:
+        return datetime.fromisoformat(value['dateTime'].replace('Z', '+00:00'))
+    return datetime.strptime(value['date'], "%Y-%m-%d").replace(tzinfo=JST)
+
+def invalidate_cache(calendar_id: str, event_id: Optional[str] = None, event: Optional[Dict] = None) -> None:
+    """
+    イベントの変更で結果が変わるキャッシュのエントリだけを無効にする
+
+    無効にするのは、そのイベントの取得結果、そのイベント（定期イベントの個々の予定を含む）を
+    含んでいた一覧、変更後のイベントの期間と重なる一覧。定期イベントは開始以降のすべての一覧と重なるとみなす。
+
+    Args:
+        calendar_id: カレンダーID
+        event_id: 変更したイベントのID
+        event: 変更後のイベント（Google Calendar API形式、削除の場合は省略）
+    """
+    if _cache_settings is None:
+        return
+    if event_id is None and event is not None:
+        event_id = event.get('id')
+
+    start = end = None
+    if event is not None:
+        start = _parse_event_time(event.get('start'))
+        end = None if event.get('recurrence') else _parse_event_time(event.get('end'))
+
+    def affected(entry: Dict) -> bool:
+        if entry.get('calendar_id') != calendar_id:
+            return False
+        if event_id and entry.get('event_id') == event_id:
+            return True
+        if event_id and any(cached_id == event_id or cached_id.startswith(f"{event_id}_")
+                            for cached_id in entry.get('ids', [])):
+            return True
+        if start is not None and 'ids' in entry:
+            time_min = datetime.fromisoformat(entry['time_min']) if entry.get('time_min') else None
+            time_max = datetime.fromisoformat(entry['time_max']) if entry.get('time_max') else None
+            return (time_max is None or start <= time_max) and (end is None or time_min is None or end >= time_min)
+        return False
+
+    with _locked_cache():
+        entries = _read_cache()
+        remaining = {key: entry for key, entry in entries.items() if not affected(entry)}
+        if len(remaining) != len(entries):
+            _write_cache(remaining)
+
 def get_or_create_calendar(service) -> str:
     """
     'WithAI'カレンダーを取得または作成する
@@ -26,12 +206,20 @@ def get_or_create_calendar(service) -> str:
     Returns:
         str: カレンダーID
     """
+    # カレンダーIDはアカウントごとに異なるため、キャッシュのキーにプロファイル名を含める
+    if _cache_settings is not None:
+        cached_id = _cache_get(_cache_key('calendar', profile_of(service), CALENDAR_NAME))
+        if cached_id is not None:
+            return cached_id
+
     # 既存のカレンダーリストを取得
     calendar_list = service.calendarList().list().execute()
     
     # WithAIカレンダーを探す
     for calendar_list_entry in calendar_list['items']:
         if calendar_list_entry['summary'] == CALENDAR_NAME:
+            if _cache_settings is not None:
+                _cache_put(_cache_key('calendar', profile_of(service), CALENDAR_NAME), calendar_list_entry['id'])
             return calendar_list_entry['id']
     
     # なければ新規作成
@@ -42,56 +230,200 @@ def get_or_create_calendar(service) -> str:
     created_calendar = service.calendars().insert(body=calendar).execute()
     return created_calendar['id']
 
-def get_authenticated_service() -> any:
+def validate_profile(profile: str) -> str:
     """
-    Google Calendar APIの認証済みサービスを取得
+    プロファイル名を検証
+
+    Raises:
+        ValueError: ファイル名として使えない名前の場合
+    """
+    if not PROFILE_NAME_PATTERN.fullmatch(profile) or profile in ('.', '..'):
+        raise ValueError(f"プロファイル名に使えるのは英数字と . _ - だけです: {profile}")
+    return profile
+
+def profile_path(profile: str, filename: str) -> str:
+    """
+    プロファイルごとのファイルのパスを返す
+
+    defaultプロファイルは従来どおり作業ディレクトリのファイル、それ以外は
+    profiles/<プロファイル名>/のファイルを使う。
+
+    Args:
+        profile: プロファイル名
+        filename: ファイル名（例: "token.json", "events.yml"）
+
+    Returns:
+        str: ファイルのパス
+    """
+    if profile == DEFAULT_PROFILE:
+        return filename
+    return os.path.join(PROFILES_DIR, validate_profile(profile), filename)
+
+def list_profiles() -> List[str]:
+    """認証情報のあるプロファイルの一覧を返す（defaultが先頭、以降は名前順）"""
+    profiles = []
+    if os.path.exists('token.json') or os.path.exists('credentials.json'):
+        profiles.append(DEFAULT_PROFILE)
+    if os.path.isdir(PROFILES_DIR):
+        profiles += sorted(name for name in os.listdir(PROFILES_DIR)
+                           if os.path.isdir(os.path.join(PROFILES_DIR, name)) and PROFILE_NAME_PATTERN.fullmatch(name))
+    return profiles
+
+def authorize_profile(profile: str = DEFAULT_PROFILE) -> any:
+    """
+    プロファイルの認証情報でGoogle Calendar APIのサービスを作成
+
+    プロファイルにcredentials.jsonがなければ作業ディレクトリのcredentials.json
+    （複数のアカウントで共通のOAuthクライアント）を使う。
+
+    Args:
+        profile: プロファイル名
 
     Returns:
         service: 認証済みのGoogle Calendar APIサービスインスタンス
     """
+    token_file = profile_path(profile, 'token.json')
     creds = None
     # token.jsonが存在する場合は、それを使用
-    if os.path.exists('token.json'):
-        creds = Credentials.from_authorized_user_file('token.json', SCOPES)
+    if os.path.exists(token_file):
+        creds = Credentials.from_authorized_user_file(token_file, SCOPES)
 
     # 有効な認証情報がない場合は、取得する
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
             creds.refresh(Request())
         else:
+            credentials_file = profile_path(profile, 'credentials.json')
+            if not os.path.exists(credentials_file):
+                credentials_file = 'credentials.json'
             flow = InstalledAppFlow.from_client_secrets_file(
-                'credentials.json', SCOPES)
+                credentials_file, SCOPES)
             creds = flow.run_local_server(port=0)
         
         # 認証情報をtoken.jsonに保存
-        with open('token.json', 'w') as token:
+        if os.path.dirname(token_file):
+            os.makedirs(os.path.dirname(token_file), exist_ok=True)
+        with open(token_file, 'w') as token:
             token.write(creds.to_json())
 
     # Google Calendar APIのサービスを構築
     service = build('calendar', 'v3', credentials=creds)
     return service
 
-def add_event(service: any, start_datetime_str: str, end_datetime_str: str, title: str, 
-              detail: Optional[str] = None, calendar_id: Optional[str] = None,
-              recurrence: Optional[str] = None) -> Dict:
+# サービスとプロファイル名の対応（カレンダーIDのキャッシュをアカウントごとに分けるため）
+_service_profiles: Dict[int, str] = {}
+
+class ServicePool:
+    """
+    プロファイルごとに1つの認証済みサービスを保持するプール
+
+    サービスは最初に使うときに作成し、同じプロセスの中では使い回す。
+    プロファイルごとにロックを分けているため、別々のプロファイルの認証は並行して行える。
+    Google APIクライアントのサービスはスレッド間で同時に使えないため、
+    1つのプロファイルのサービスを複数のスレッドで同時に使わないこと。
     """
-    Google Calendarに新しいイベントを追加
+
+    def __init__(self, factory=authorize_profile):
+        self._factory = factory
+        self._services: Dict[str, any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get(self, profile: str = DEFAULT_PROFILE) -> any:
+        """プロファイルのサービスを返す（なければ作成する）"""
+        with self._lock:
+            if profile in self._services:
+                return self._services[profile]
+            lock = self._locks.setdefault(profile, threading.Lock())
+        with lock:
+            with self._lock:
+                if profile in self._services:
+                    return self._services[profile]
+            service = self._factory(profile)
+            with self._lock:
+                self._services[profile] = service
+                _service_profiles[id(service)] = profile
+            return service
+
+    def profiles(self) -> List[str]:
+        """作成済みのサービスのプロファイル名"""
+        with self._lock:
+            return list(self._services)
+
+    def clear(self) -> None:
+        """作成済みのサービスを破棄する（次に使うときに作り直す）"""
+        with self._lock:
+            for service in self._services.values():
+                _service_profiles.pop(id(service), None)
+            self._services.clear()
+
+# プロセス内で共有するサービスのプールと、プロファイルを省略したときに使うプロファイル
+service_pool = ServicePool()
+_current_profile = DEFAULT_PROFILE
+
+def use_profile(profile: str) -> None:
+    """プロファイルを省略したget_authenticated_service()で使うプロファイルを設定"""
+    global _current_profile
+    _current_profile = validate_profile(profile)
+
+def current_profile() -> str:
+    """プロファイルを省略したときに使うプロファイル名"""
+    return _current_profile
+
+def profile_of(service: any) -> str:
+    """サービスのプロファイル名（プール以外で作成したサービスはdefault）"""
+    return _service_profiles.get(id(service), DEFAULT_PROFILE)
+
+def get_authenticated_service(profile: Optional[str] = None) -> any:
+    """
+    Google Calendar APIの認証済みサービスを取得
+
+    プロファイルごとにプールしたサービスを返すため、同じプロセスで何度呼び出しても
+    認証は1回だけ行われる。
+
+    Args:
+        profile: プロファイル名（省略時はuse_profile()で設定したプロファイル）
+
+    Returns:
+        service: 認証済みのGoogle Calendar APIサービスインスタンス
+    """
+    return service_pool.get(profile or _current_profile)
+
+def event_id_for(idempotency_key: str) -> str:
+    """
+    冪等キーから決定的にイベントIDを生成
+
+    Calendar APIのイベントIDの規則（base32hexの小文字0-9a-v、5〜1024文字）に従う。
+    同じキーからは常に同じIDになるため、再送しても重複したイベントは作られない。
+
+    Args:
+        idempotency_key: 冪等キー
+
+    Returns:
+        str: イベントID（52文字）
+    """
+    digest = hashlib.sha256(idempotency_key.encode('utf-8')).digest()
+    return base64.b32hexencode(digest).decode('ascii').rstrip('=').lower()
+
+def new_event_id() -> str:
+    """送信前に決めておく新しいイベントIDを生成"""
+    return event_id_for(uuid.uuid4().hex)
+
+def build_event_body(start_datetime_str: str, end_datetime_str: str, title: str,
+                     detail: Optional[str] = None, recurrence: Optional[str] = None) -> Dict:
+    """
+    Google Calendar API形式のイベント本体を作成
 
     Args:
-        service: Google Calendar APIサービスインスタンス
         start_datetime_str: 開始日時 (例: "2024-03-20 15:00")
         end_datetime_str: 終了日時 (例: "2024-03-20 16:00")
         title: イベントのタイトル
         detail: イベントの詳細説明（オプション）
-        calendar_id: カレンダーID（オプション）
         recurrence: 定期イベントのパターン（'daily', 'weekly', 'monthly', 'weekday'）
 
     Returns:
-        Dict: 作成されたイベントの情報
+        Dict: events().insert()に渡すイベント本体
     """
-    if calendar_id is None:
-        calendar_id = get_or_create_calendar(service)
-
     # 日時文字列をGoogle Calendar API形式に変換
     start_datetime = datetime.strptime(start_datetime_str, "%Y-%m-%d %H:%M")
     end_datetime = datetime.strptime(end_datetime_str, "%Y-%m-%d %H:%M")
@@ -113,7 +445,87 @@ def add_event(service: any, start_datetime_str: str, end_datetime_str: str, titl
     if recurrence and recurrence in RECURRENCE_PATTERNS:
         event['recurrence'] = [RECURRENCE_PATTERNS[recurrence]]
 
-    event = service.events().insert(calendarId=calendar_id, body=event).execute()
+    return event
+
+def build_patch_body(new_title: Optional[str] = None, new_start_datetime: Optional[str] = None,
+                     new_end_datetime: Optional[str] = None, new_detail: Optional[str] = None,
+                     new_recurrence: Optional[str] = None) -> Dict:
+    """
+    events().patch()に渡す、変更する項目だけを持つイベント本体を作成
+
+    Args:
+        new_title: 新しいタイトル（オプション）
+        new_start_datetime: 新しい開始日時（オプション）
+        new_end_datetime: 新しい終了日時（オプション）
+        new_detail: 新しい詳細説明（オプション）
+        new_recurrence: 新しい定期イベントのパターン（オプション、'none'で繰り返しを解除）
+
+    Returns:
+        Dict: 変更する項目だけを持つイベント本体
+    """
+    body = {}
+    if new_title:
+        body['summary'] = new_title
+    if new_detail:
+        body['description'] = new_detail
+    if new_start_datetime:
+        start_datetime = datetime.strptime(new_start_datetime, "%Y-%m-%d %H:%M")
+        body['start'] = {
+            'dateTime': start_datetime.strftime("%Y-%m-%dT%H:%M:00+09:00"),
+            'timeZone': 'Asia/Tokyo',
+        }
+    if new_end_datetime:
+        end_datetime = datetime.strptime(new_end_datetime, "%Y-%m-%d %H:%M")
+        body['end'] = {
+            'dateTime': end_datetime.strftime("%Y-%m-%dT%H:%M:00+09:00"),
+            'timeZone': 'Asia/Tokyo',
+        }
+    if new_recurrence:
+        if new_recurrence in RECURRENCE_PATTERNS:
+            body['recurrence'] = [RECURRENCE_PATTERNS[new_recurrence]]
+        elif new_recurrence == 'none':
+            body['recurrence'] = []
+    return body
+
+def add_event(service: any, start_datetime_str: str, end_datetime_str: str, title: str, 
+              detail: Optional[str] = None, calendar_id: Optional[str] = None,
+              recurrence: Optional[str] = None, event_id: Optional[str] = None) -> Dict:
+    """
+    Google Calendarに新しいイベントを追加
+
+    event_idを指定した場合は、そのIDで作成する。既に同じIDのイベントがある場合
+    （409 Conflict、タイムアウト後の再送など）は作成済みとして既存のイベントを返す。
+
+    Args:
+        service: Google Calendar APIサービスインスタンス
+        start_datetime_str: 開始日時 (例: "2024-03-20 15:00")
+        end_datetime_str: 終了日時 (例: "2024-03-20 16:00")
+        title: イベントのタイトル
+        detail: イベントの詳細説明（オプション）
+        calendar_id: カレンダーID（オプション）
+        recurrence: 定期イベントのパターン（'daily', 'weekly', 'monthly', 'weekday'）
+        event_id: クライアントで決めたイベントID（オプション、event_id_for()で生成）
+
+    Returns:
+        Dict: 作成されたイベントの情報
+    """
+    if calendar_id is None:
+        calendar_id = get_or_create_calendar(service)
+
+    event = build_event_body(start_datetime_str, end_datetime_str, title, detail, recurrence)
+    if event_id:
+        event['id'] = event_id
+    try:
+        event = service.events().insert(calendarId=calendar_id, body=event).execute()
+    except HttpError as error:
+        if not event_id or error.status_code != 409:
+            raise
+        # 前回の送信で作成済み。削除済みのIDの場合は再利用できないのでエラーのままにする
+        existing = service.events().get(calendarId=calendar_id, eventId=event_id).execute()
+        if existing.get('status') == 'cancelled':
+            raise
+        event = existing
+    invalidate_cache(calendar_id, event=event)
     return event
 
 def update_event(service: any, event_id: str, new_title: Optional[str] = None,
@@ -165,6 +577,7 @@ def update_event(service: any, event_id: str, new_title: Optional[str] = None,
         eventId=event_id,
         body=event
     ).execute()
+    invalidate_cache(calendar_id, event_id=event_id, event=updated_event)
 
     return updated_event
 
@@ -181,6 +594,33 @@ def delete_event(service: any, event_id: str, calendar_id: Optional[str] = None)
         calendar_id = get_or_create_calendar(service)
 
     service.events().delete(calendarId=calendar_id, eventId=event_id).execute()
+    invalidate_cache(calendar_id, event_id=event_id)
+
+def get_event(service: any, event_id: str, calendar_id: Optional[str] = None) -> Dict:
+    """
+    イベントを1件取得
+
+    Args:
+        service: Google Calendar APIサービスインスタンス
+        event_id: イベントID
+        calendar_id: カレンダーID（オプション）
+
+    Returns:
+        Dict: イベントの情報
+    """
+    if calendar_id is None:
+        calendar_id = get_or_create_calendar(service)
+
+    if _cache_settings is not None:
+        key = _cache_key('get', calendar_id, event_id)
+        cached = _cache_get(key)
+        if cached is not None:
+            return cached
+
+    event = service.events().get(calendarId=calendar_id, eventId=event_id).execute()
+    if _cache_settings is not None:
+        _cache_put(key, event, calendar_id=calendar_id, event_id=event_id)
+    return event
 
 def list_events(service: any, start_date: Optional[str] = None, end_date: Optional[str] = None, calendar_id: Optional[str] = None) -> List[Dict]:
     """
@@ -210,6 +650,363 @@ def list_events(service: any, start_date: Optional[str] = None, end_date: Option
     if end_date:
         params['timeMax'] = f"{end_date}T23:59:59+09:00"
 
+    if _cache_settings is not None:
+        key = _cache_key('list', calendar_id, start_date, end_date)
+        cached = _cache_get(key)
+        if cached is not None:
+            return cached
+
     # イベントを取得
     events_result = service.events().list(**params).execute()
-    return events_result.get('items', []) 
\ No newline at end of file
+    items = events_result.get('items', [])
+    if _cache_settings is not None:
+        _cache_put(key, items, calendar_id=calendar_id, ids=[item['id'] for item in items],
+                   time_min=params.get('timeMin'), time_max=params.get('timeMax'))
+    return items
+
+def iter_events(service: any, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                calendar_id: Optional[str] = None, single_events: bool = True) -> Iterator[Dict]:
+    """
+    イベントをページ単位で取得しながら1件ずつ返す
+
+    list_events()と異なりnextPageTokenをたどるため、件数の多い期間でも
+    全件をメモリに載せずに処理できる。
+
+    Args:
+        service: Google Calendar APIサービスインスタンス
+        start_date: 取得開始日（例: "2024-03-01"）
+        end_date: 取得終了日（例: "2024-03-31"）
+        calendar_id: カレンダーID（オプション）
+        single_events: Trueなら定期イベントを個々の予定に展開して開始時刻順に返す。
+            Falseなら定期イベントは繰り返しルール付きの1件として返す
+
+    Yields:
+        Dict: イベント
+    """
+    if calendar_id is None:
+        calendar_id = get_or_create_calendar(service)
+
+    params = {
+        'calendarId': calendar_id,
+        'maxResults': PAGE_SIZE,
+        'singleEvents': single_events,
+    }
+    if single_events:
+        params['orderBy'] = 'startTime'
+    if start_date:
+        params['timeMin'] = f"{start_date}T00:00:00+09:00"
+    if end_date:
+        params['timeMax'] = f"{end_date}T23:59:59+09:00"
+
+    while True:
+        events_result = service.events().list(**params).execute()
+        for event in events_result.get('items', []):
+            yield event
+        page_token = events_result.get('nextPageToken')
+        if not page_token:
+            break
+        params['pageToken'] = page_token
+
+def query_busy(service: any, start_date: str, end_date: str,
+               calendar_ids: Optional[List[str]] = None) -> List[Tuple[datetime, datetime]]:
+    """
+    freebusy APIで期間内の予定が入っている時間帯を取得
+
+    Args:
+        service: Google Calendar APIサービスインスタンス
+        start_date: 開始日（例: "2024-03-18"）
+        end_date: 終了日（例: "2024-03-22"、この日を含む）
+        calendar_ids: 対象のカレンダーID（省略時はWithAIカレンダーとアカウントのメインカレンダー）
+
+    Returns:
+        List[Tuple[datetime, datetime]]: 予定が入っている時間帯（日本時間、開始順、重なりはまとめない）
+    """
+    if calendar_ids is None:
+        calendar_ids = [get_or_create_calendar(service), 'primary']
+    body = {
+        'timeMin': f"{start_date}T00:00:00+09:00",
+        'timeMax': f"{end_date}T23:59:59+09:00",
+        'timeZone': 'Asia/Tokyo',
+        'items': [{'id': calendar_id} for calendar_id in calendar_ids]
+    }
+    result = service.freebusy().query(body=body).execute()
+    busy = []
+    for calendar in result.get('calendars', {}).values():
+        for period in calendar.get('busy', []):
+            busy.append((_parse_event_time({'dateTime': period['start']}).astimezone(JST),
+                         _parse_event_time({'dateTime': period['end']}).astimezone(JST)))
+    return sorted(busy)
+
+def execute_batch(service: any, requests: List[any]) -> List[Tuple[Optional[Dict], Optional[Exception]]]:
+    """
+    複数のAPIリクエストをバッチリクエストとしてまとめて実行
+
+    BATCH_SIZE件ごとに1回のHTTP往復で送信する。個々のリクエストの失敗は
+    例外を送出せず、結果のタプルに格納して返す。
+
+    Args:
+        service: Google Calendar APIサービスインスタンス
+        requests: 実行するリクエスト（service.events().insert(...)など）のリスト
+
+    Returns:
+        List[Tuple[Optional[Dict], Optional[Exception]]]: リクエストと同じ順序の(レスポンス, 例外)のリスト
+    """
+    results: List[Tuple[Optional[Dict], Optional[Exception]]] = [(None, None)] * len(requests)
+
+    def callback(request_id, response, exception):
+        results[int(request_id)] = (response, exception)
+
+    for offset in range(0, len(requests), BATCH_SIZE):
+        batch = service.new_batch_http_request(callback=callback)
+        for index, request in enumerate(requests[offset:offset + BATCH_SIZE], start=offset):
+            batch.add(request, request_id=str(index))
+        batch.execute()
+
+    if _cache_settings is not None:
+        # 変更系のリクエストで影響を受けるキャッシュを無効にする
+        for request, (response, exception) in zip(requests, results):
+            if exception is not None or getattr(request, 'method', 'GET') == 'GET':
+                continue
+            match = re.search(r'/calendars/([^/]+)/events(?:/([^/?]+))?', getattr(request, 'uri', '') or '')
+            if match:
+                calendar_id = unquote(match.group(1))
+                event_id = unquote(match.group(2)) if match.group(2) else None
+                invalidate_cache(calendar_id, event_id=event_id, event=response or None)
+
+    return results
+
+def resolve_insert_conflicts(service: any, calendar_id: str, event_ids: List[Optional[str]],
+                             results: List[Tuple[Optional[Dict], Optional[Exception]]]
+                             ) -> List[Tuple[Optional[Dict], Optional[Exception]]]:
+    """
+    クライアントで決めたIDでの追加が409 Conflictになった結果を、既存のイベントで置き換える
+
+    add_event()と同じく、前回の送信で作成済みなら(既存のイベント, None)にする。削除済み（cancelled）の
+    IDは再利用できないため、409のエラーのままにする。既存のイベントはバッチリクエストでまとめて取得する。
+
+    Args:
+        service: Google Calendar APIサービスインスタンス
+        calendar_id: カレンダーID
+        event_ids: 結果と同じ順序の、クライアントで決めたイベントID（追加以外やIDを決めていない場合はNone）
+        results: execute_batch()の結果
+
+    Returns:
+        List[Tuple[Optional[Dict], Optional[Exception]]]: 置き換えた結果
+    """
+    conflicts = [index for index, (event_id, (_, error)) in enumerate(zip(event_ids, results))
+                 if event_id and getattr(error, 'status_code', None) == 409]
+    if not conflicts:
+        return results
+    events_api = service.events()
+    existing = execute_batch(service, [events_api.get(calendarId=calendar_id, eventId=event_ids[index])
+                                       for index in conflicts])
+    resolved = list(results)
+    for index, (event, error) in zip(conflicts, existing):
+        # 取得できない場合は作成済みか確かめられないので、409のエラーのままにする
+        if error is None and event.get('status') != 'cancelled':
+            resolved[index] = (event, None)
+    return resolved
+
+def add_events_batch(service: any, events: List[Dict],
+                     calendar_id: Optional[str] = None) -> List[Tuple[Optional[Dict], Optional[Exception]]]:
+    """
+    ローカル形式のイベントをバッチリクエストでまとめて追加
+
+    イベントに'id'があればそのIDで作成する。同じIDで再送した場合の409 Conflictは
+    作成済みとして扱い、(既存のイベント, None)を返す（削除済みのIDの場合はエラーのまま）。
+
+    Args:
+        service: Google Calendar APIサービスインスタンス
+        events: 追加するイベント（title, start_datetime, end_datetime, detail, recurrence、
+            任意でidを持つ辞書）のリスト
+        calendar_id: カレンダーID（オプション）
+
+    Returns:
+        List[Tuple[Optional[Dict], Optional[Exception]]]: イベントと同じ順序の(作成されたイベント, 例外)のリスト
+    """
+    if calendar_id is None:
+        calendar_id = get_or_create_calendar(service)
+
+    bodies = []
+    for event in events:
+        body = build_event_body(event['start_datetime'], event['end_datetime'], event['title'],
+                                event.get('detail'), event.get('recurrence'))
+        if event.get('id'):
+            body['id'] = event['id']
+        bodies.append(body)
+    results = execute_batch(service, [
+        service.events().insert(calendarId=calendar_id, body=body) for body in bodies
+    ])
+    return resolve_insert_conflicts(service, calendar_id, [body.get('id') for body in bodies], results)
+
+def delete_events_batch(service: any, event_ids: List[str],
+                        calendar_id: Optional[str] = None) -> List[Tuple[Optional[Dict], Optional[Exception]]]:
+    """
+    イベントをバッチリクエストでまとめて削除
+
+    既に削除されていた場合（404/410）は削除できたものとして扱う。
+
+    Args:
+        service: Google Calendar APIサービスインスタンス
+        event_ids: 削除するイベントIDのリスト
+        calendar_id: カレンダーID（オプション）
+
+    Returns:
+        List[Tuple[Optional[Dict], Optional[Exception]]]: event_idsと同じ順序の(レスポンス, 例外)のリスト
+    """
+    if calendar_id is None:
+        calendar_id = get_or_create_calendar(service)
+    results = execute_batch(service, [
+        service.events().delete(calendarId=calendar_id, eventId=event_id) for event_id in event_ids
+    ])
+    return [
+        (response, None) if getattr(error, 'status_code', None) in (404, 410) else (response, error)
+        for response, error in results
+    ]
+
+def patch_events_batch(service: any, patches: List[Tuple[str, Dict]],
+                       calendar_id: Optional[str] = None) -> List[Tuple[Optional[Dict], Optional[Exception]]]:
+    """
+    イベントの一部の項目をバッチリクエストでまとめて変更
+
+    Args:
+        service: Google Calendar APIサービスインスタンス
+        patches: (イベントID, 変更する項目だけを持つイベント本体)のリスト
+        calendar_id: カレンダーID（オプション）
+
+    Returns:
+        List[Tuple[Optional[Dict], Optional[Exception]]]: patchesと同じ順序の(変更後のイベント, 例外)のリスト
+    """
+    if calendar_id is None:
+        calendar_id = get_or_create_calendar(service)
+    return execute_batch(service, [
+        service.events().patch(calendarId=calendar_id, eventId=event_id, body=body) for event_id, body in patches
+    ])
+
+def shift_event_body(event: Dict, delta: timedelta) -> Optional[Dict]:
+    """
+    イベントの開始・終了をずらすpatch用のイベント本体を作成
+
+    Args:
+        event: Google Calendar API形式のイベント
+        delta: ずらす時間
+
+    Returns:
+        Optional[Dict]: start/endを持つイベント本体。終日の予定を日単位でない時間だけずらす場合はNone
+    """
+    body = {}
+    for field in ('start', 'end'):
+        value = event[field]
+        if 'dateTime' in value:
+            moved = datetime.fromisoformat(value['dateTime'].replace('Z', '+00:00')) + delta
+            body[field] = {'dateTime': moved.isoformat(), 'timeZone': value.get('timeZone', 'Asia/Tokyo')}
+        else:
+            if delta % timedelta(days=1):
+                return None
+            moved = datetime.strptime(value['date'], "%Y-%m-%d") + delta
+            body[field] = {'date': moved.strftime("%Y-%m-%d")}
+    return body
+
+def recurrence_until(recurrence: List[str]) -> Optional[datetime]:
+    """
+    定期イベントの繰り返しが終わる日時（日本時間、タイムゾーンなし）
+
+    すべてのRRULEにUNTILがある場合だけ、その最も遅い日時を返す。UNTILが日付だけの場合は
+    その日の0時を返す（その日の予定はこの日時以降に始まる）。COUNTで回数を決めたもの、
+    RDATEで日付を足したもの、終わりのないものは終わりが分からないためNoneを返す。
+
+    Args:
+        recurrence: Google Calendar APIのrecurrence（"RRULE:FREQ=DAILY;UNTIL=20240324T145959Z"など）
+
+    Returns:
+        Optional[datetime]: 繰り返しが終わる日時。分からない場合はNone
+    """
+    until = None
+    for line in recurrence:
+        name, _, value = line.partition(':')
+        name = name.split(';')[0].upper()
+        if name == 'RDATE':
+            return None
+        if name != 'RRULE':
+            continue
+        parts = dict(part.partition('=')[::2] for part in value.upper().split(';'))
+        if 'UNTIL' not in parts:
+            return None
+        try:
+            if parts['UNTIL'].endswith('Z'):
+                end = (datetime.strptime(parts['UNTIL'], "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc)
+                       .astimezone(JST).replace(tzinfo=None))
+            elif 'T' in parts['UNTIL']:
+                end = datetime.strptime(parts['UNTIL'], "%Y%m%dT%H%M%S")
+            else:
+                end = datetime.strptime(parts['UNTIL'], "%Y%m%d")
+        except ValueError:
+            return None
+        until = end if until is None else max(until, end)
+    return until
+
+def rrule_to_recurrence(rule: str) -> Optional[str]:
+    """
+    RRULE文字列を定期イベントのパターン名に変換
+
+    パラメータの順序や"RRULE:"接頭辞の有無は問わない。RECURRENCE_PATTERNSで
+    表現できないルール（INTERVAL, COUNT, UNTILなどを含むもの）はNoneを返す。
+
+    Args:
+        rule: RRULE文字列 (例: "RRULE:FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR")
+
+    Returns:
+        Optional[str]: パターン名（'daily', 'weekly', 'monthly', 'weekday'）またはNone
+    """
+    def parse(value: str) -> Dict[str, str]:
+        if value.upper().startswith('RRULE:'):
+            value = value[len('RRULE:'):]
+        parts = {}
+        for part in value.strip().split(';'):
+            if '=' in part:
+                key, _, val = part.partition('=')
+                parts[key.strip().upper()] = val.strip().upper()
+        # 既定値と同じWKSTは意味を持たないので比較から除外
+        if parts.get('WKST') == 'MO':
+            del parts['WKST']
+        return parts
+
+    parsed = parse(rule)
+    for name, pattern in RECURRENCE_PATTERNS.items():
+        if parse(pattern) == parsed:
+            return name
+    return None
+
+def to_local_event(event: Dict) -> Dict:
+    """
+    Google Calendar API形式のイベントをローカル形式（events.ymlの形式）に変換
+
+    Args:
+        event: Google Calendar API形式のイベント
+
+    Returns:
+        Dict: id, title, start_datetime, end_datetime, detail, recurrenceを持つイベント
+    """
+    def local_datetime(value: Dict) -> str:
+        if 'dateTime' in value:
+            dt = datetime.fromisoformat(value['dateTime'].replace('Z', '+00:00'))
+            if dt.tzinfo is not None:
+                dt = dt.astimezone(JST)
+            return dt.strftime("%Y-%m-%d %H:%M")
+        # 終日イベントは日付の0時として扱う
+        return f"{value['date']} 00:00"
+
+    recurrence = None
+    for rule in event.get('recurrence') or []:
+        if rule.upper().startswith('RRULE:'):
+            recurrence = rrule_to_recurrence(rule)
+            break
+
+    return {
+        'id': event['id'],
+        'title': event.get('summary', ''),
+        'start_datetime': local_datetime(event['start']),
+        'end_datetime': local_datetime(event['end']),
+        'detail': event.get('description') or None,
+        'recurrence': recurrence
+    }
@@ -0,0 +1,374 @@
+import os
+import json
+import hashlib
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+from datetime import datetime, timedelta, timezone
+
+from google_calendar_service import RECURRENCE_PATTERNS, rrule_to_recurrence
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python 3.8以前
+    ZoneInfo = None
+
+JST = timezone(timedelta(hours=9))
+LOCAL_DATETIME_FORMAT = "%Y-%m-%d %H:%M"
+
+# RFC 5545の1行あたりの最大オクテット数（改行を除く）
+MAX_LINE_OCTETS = 75
+
+def unfold_lines(f: TextIO) -> Iterator[str]:
+    """
+    折り返された行を1行に戻しながらiCalendarの内容行を返す
+
+    Args:
+        f: iCalendarファイルのファイルオブジェクト
+
+    Yields:
+        str: 折り返しを解除した内容行
+    """
+    current = None
+    for raw_line in f:
+        line = raw_line.rstrip('\r\n')
+        if line[:1] in (' ', '\t'):
+            # 先頭が空白の行は直前の行の続き
+            if current is not None:
+                current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current is not None and current != '':
+        yield current
+
+def parse_content_line(line: str) -> Tuple[str, Dict[str, str], str]:
+    """
+    内容行を名前・パラメータ・値に分解
+
+    Args:
+        line: 内容行 (例: "DTSTART;TZID=Asia/Tokyo:20240320T150000")
+
+    Returns:
+        Tuple[str, Dict[str, str], str]: (大文字の名前, パラメータ, 値)
+    """
+    # 値の区切りは引用符の外にある最初のコロン
+    in_quotes = False
+    split_at = len(line)
+    for index, char in enumerate(line):
+        if char == '"':
+            in_quotes = not in_quotes
+        elif char == ':' and not in_quotes:
+            split_at = index
+            break
+    head, value = line[:split_at], line[split_at + 1:]
+
+    name, *raw_params = head.split(';')
+    params = {}
+    for raw_param in raw_params:
+        key, _, param_value = raw_param.partition('=')
+        params[key.upper()] = param_value.strip('"')
+    return name.upper(), params, value
+
+def unescape_text(value: str) -> str:
+    """TEXT型の値のエスケープを解除"""
+    result = []
+    chars = iter(value)
+    for char in chars:
+        if char == '\\':
+            escaped = next(chars, '')
+            result.append('\n' if escaped in ('n', 'N') else escaped)
+        else:
+            result.append(char)
+    return ''.join(result)
+
+def escape_text(value: str) -> str:
+    """TEXT型の値をエスケープ"""
+    return (value.replace('\\', '\\\\')
+                 .replace(';', '\\;')
+                 .replace(',', '\\,')
+                 .replace('\r\n', '\\n')
+                 .replace('\n', '\\n'))
+
+def parse_ics_datetime(value: str, params: Dict[str, str]) -> Tuple[datetime, bool]:
+    """
+    DTSTART/DTENDの値を日本時間の日時に変換
+
+    Args:
+        value: 値 (例: "20240320T150000", "20240320T060000Z", "20240320")
+        params: 内容行のパラメータ（TZID, VALUEなど）
+
+    Returns:
+        Tuple[datetime, bool]: (タイムゾーンなしの日本時間の日時, 終日イベントかどうか)
+    """
+    value = value.strip()
+    if params.get('VALUE') == 'DATE' or len(value) == 8:
+        return datetime.strptime(value[:8], "%Y%m%d"), True
+
+    is_utc = value.endswith('Z')
+    dt = datetime.strptime(value.rstrip('Z')[:15], "%Y%m%dT%H%M%S")
+    if is_utc:
+        dt = dt.replace(tzinfo=timezone.utc)
+    elif 'TZID' in params and ZoneInfo is not None:
+        try:
+            dt = dt.replace(tzinfo=ZoneInfo(params['TZID']))
+        except Exception:
+            # 解決できないTZIDは日本時間として扱う
+            pass
+
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(JST).replace(tzinfo=None)
+    return dt, False
+
+def parse_duration(value: str) -> timedelta:
+    """
+    DURATIONの値をtimedeltaに変換
+
+    Args:
+        value: 値 (例: "PT1H30M", "P1D", "-PT15M")
+
+    Returns:
+        timedelta: 期間
+    """
+    sign = -1 if value.startswith('-') else 1
+    value = value.lstrip('+-').lstrip('P')
+    units = {'W': 'weeks', 'D': 'days', 'H': 'hours', 'M': 'minutes', 'S': 'seconds'}
+    kwargs = {}
+    number = ''
+    for char in value:
+        if char == 'T':
+            continue
+        if char.isdigit():
+            number += char
+        elif char in units and number:
+            kwargs[units[char]] = int(number)
+            number = ''
+    return sign * timedelta(**kwargs)
+
+def vevent_to_local_event(properties: Dict[str, Tuple[Dict[str, str], str]]) -> Dict:
+    """
+    VEVENTのプロパティをローカル形式のイベントに変換
+
+    Args:
+        properties: プロパティ名から(パラメータ, 値)への辞書
+
+    Returns:
+        Dict: uid, title, start_datetime, end_datetime, detail, recurrence, rruleを持つイベント。
+            rruleはRRULEの元の文字列（なければNone）
+    """
+    start_params, start_value = properties['DTSTART']
+    start, all_day = parse_ics_datetime(start_value, start_params)
+
+    if 'DTEND' in properties:
+        end_params, end_value = properties['DTEND']
+        end, _ = parse_ics_datetime(end_value, end_params)
+    elif 'DURATION' in properties:
+        end = start + parse_duration(properties['DURATION'][1])
+    else:
+        # DTENDもDURATIONもない場合、終日イベントは1日、それ以外は開始時刻と同じ
+        end = start + timedelta(days=1) if all_day else start
+
+    rrule = properties['RRULE'][1] if 'RRULE' in properties else None
+    summary = properties.get('SUMMARY', ({}, ''))[1]
+    description = properties.get('DESCRIPTION', ({}, ''))[1]
+
+    return {
+        'uid': properties.get('UID', ({}, None))[1],
+        'title': unescape_text(summary),
+        'start_datetime': start.strftime(LOCAL_DATETIME_FORMAT),
+        'end_datetime': end.strftime(LOCAL_DATETIME_FORMAT),
+        'detail': unescape_text(description) or None,
+        'recurrence': rrule_to_recurrence(rrule) if rrule else None,
+        'rrule': rrule
+    }
+
+def iter_ics_events(file_path: str) -> Iterator[Dict]:
+    """
+    iCalendarファイルからイベントを1件ずつ読み込む
+
+    ファイル全体をメモリに読み込まず、1行ずつ解析する。キャンセル済みの予定と
+    定期イベントの例外（RECURRENCE-IDを持つVEVENT）は読み飛ばす。
+
+    Args:
+        file_path: iCalendarファイルのパス
+
+    Yields:
+        Dict: vevent_to_local_event()の形式のイベント
+    """
+    with open(file_path, 'r', encoding='utf-8-sig') as f:
+        properties = None
+        depth = 0
+        for line in unfold_lines(f):
+            name, params, value = parse_content_line(line)
+            if name == 'BEGIN':
+                if value.upper() == 'VEVENT' and properties is None:
+                    properties = {}
+                elif properties is not None:
+                    # VEVENT内のVALARMなどのサブコンポーネント
+                    depth += 1
+                continue
+            if name == 'END':
+                if properties is None:
+                    continue
+                if depth > 0:
+                    depth -= 1
+                    continue
+                if value.upper() == 'VEVENT':
+                    skip = ('RECURRENCE-ID' in properties
+                            or properties.get('STATUS', ({}, ''))[1].upper() == 'CANCELLED'
+                            or 'DTSTART' not in properties)
+                    if not skip:
+                        yield vevent_to_local_event(properties)
+                    properties = None
+                continue
+            if properties is not None and depth == 0 and name not in properties:
+                properties[name] = (params, value)
+
+def fold_line(line: str) -> str:
+    """
+    1行が75オクテットを超えないように折り返す
+
+    UTF-8のマルチバイト文字の途中では折り返さない。
+
+    Args:
+        line: 内容行
+
+    Returns:
+        str: CRLFで終わる折り返し済みの内容行
+    """
+    chunks = []
+    current = ''
+    current_octets = 0
+    limit = MAX_LINE_OCTETS
+    for char in line:
+        octets = len(char.encode('utf-8'))
+        if current_octets + octets > limit:
+            chunks.append(current)
+            current = ''
+            current_octets = 0
+            # 継続行は先頭の空白1オクテットを含めて75オクテット
+            limit = MAX_LINE_OCTETS - 1
+        current += char
+        current_octets += octets
+    chunks.append(current)
+    return '\r\n '.join(chunks) + '\r\n'
+
+def local_event_to_vevent(event: Dict, dtstamp: Optional[str] = None) -> List[str]:
+    """
+    ローカル形式のイベントをVEVENTの内容行に変換
+
+    Args:
+        event: ローカル形式のイベント。rruleキーがあれば繰り返しパターンより優先する
+        dtstamp: DTSTAMPの値（オプション、省略時は現在時刻）
+
+    Returns:
+        List[str]: 折り返し前の内容行のリスト
+    """
+    if dtstamp is None:
+        dtstamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    start = datetime.strptime(event['start_datetime'], LOCAL_DATETIME_FORMAT)
+    end = datetime.strptime(event['end_datetime'], LOCAL_DATETIME_FORMAT)
+
+    lines = [
+        'BEGIN:VEVENT',
+        f"UID:{event['id']}",
+        f"DTSTAMP:{dtstamp}",
+        f"DTSTART;TZID=Asia/Tokyo:{start.strftime('%Y%m%dT%H%M%S')}",
+        f"DTEND;TZID=Asia/Tokyo:{end.strftime('%Y%m%dT%H%M%S')}",
+        f"SUMMARY:{escape_text(event.get('title') or '')}",
+    ]
+    if event.get('detail'):
+        lines.append(f"DESCRIPTION:{escape_text(event['detail'])}")
+
+    rrule = event.get('rrule')
+    if not rrule and event.get('recurrence') in RECURRENCE_PATTERNS:
+        rrule = RECURRENCE_PATTERNS[event['recurrence']]
+    if rrule:
+        lines.append(rrule if rrule.upper().startswith('RRULE:') else f"RRULE:{rrule}")
+
+    lines.append('END:VEVENT')
+    return lines
+
+def write_ics(f: TextIO, events: Iterator[Dict]) -> int:
+    """
+    イベントをiCalendar形式で1件ずつ書き出す
+
+    Args:
+        f: 書き込み先のファイルオブジェクト（newline=''で開くこと）
+        events: ローカル形式のイベントのイテレータ
+
+    Returns:
+        int: 書き出したイベント数
+    """
+    dtstamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    header = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//WithAI Calendar CLI//JA',
+        'CALSCALE:GREGORIAN',
+    ]
+    for line in header:
+        f.write(fold_line(line))
+
+    count = 0
+    for event in events:
+        for line in local_event_to_vevent(event, dtstamp):
+            f.write(fold_line(line))
+        count += 1
+
+    f.write(fold_line('END:VCALENDAR'))
+    return count
+
+def ics_signature(ics_file: str) -> Dict:
+    """
+    iCalendarファイルの更新時刻・大きさ・ハッシュ値（インポートの開始時に1回だけ計算する）
+
+    同じ大きさのまま書き換えられた場合も別のファイルとみなせるよう、内容全体のハッシュ値を含める。
+
+    Args:
+        ics_file: iCalendarファイルのパス
+
+    Returns:
+        Dict: load_import_progress()とsave_import_progress()に渡す値
+    """
+    digest = hashlib.sha1()
+    with open(ics_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    stat = os.stat(ics_file)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha1': digest.hexdigest()}
+
+def load_import_progress(progress_file: str, signature: Dict) -> int:
+    """
+    中断したインポートの進捗を読み込む
+
+    Args:
+        progress_file: 進捗ファイルのパス
+        signature: インポートするファイルのics_signature()
+
+    Returns:
+        int: 処理済みのイベント数。進捗がない、読み込めない、または別のファイル
+            （書き換えられた場合を含む）の進捗の場合は0
+    """
+    try:
+        with open(progress_file, 'r', encoding='utf-8') as f:
+            progress = json.load(f)
+    except (OSError, ValueError):
+        return 0
+    if not isinstance(progress, dict) or any(progress.get(name) != value for name, value in signature.items()):
+        return 0
+    processed = progress.get('processed', 0)
+    return processed if isinstance(processed, int) and processed > 0 else 0
+
+def save_import_progress(progress_file: str, signature: Dict, processed: int) -> None:
+    """
+    インポートの進捗を保存（一時ファイルに書いてから置き換え、途中で止まっても壊さない）
+
+    Args:
+        progress_file: 進捗ファイルのパス
+        signature: インポートするファイルのics_signature()
+        processed: 処理済みのイベント数
+    """
+    tmp_file = f"{progress_file}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(dict(signature, processed=processed), f)
+    os.replace(tmp_file, progress_file)
@@ -1,29 +1,308 @@
 import os
+import json
 import yaml
-from typing import List, Dict, Optional
-from datetime import datetime
+import marshal
+import hashlib
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Iterator, Tuple, Set
+from datetime import datetime, timedelta
 
-def load_events(file_path: str = "events.yml") -> List[Dict]:
+try:
+    import fcntl
+except ImportError:  # Windowsではfcntlが使えないため、ロックせずに読み書きする
+    fcntl = None
+
+# 同期に使う項目（content_hash()の対象）
+SYNCED_FIELDS = ('title', 'start_datetime', 'end_datetime', 'detail', 'recurrence')
+
+# 月別シャードのディレクトリに置く、イベントIDからシャードへの対応表
+SHARD_MANIFEST = 'manifest.json'
+
+# 開始日時のないイベントを入れるシャード
+UNDATED_SHARD = 'undated'
+
+# YAMLを読み込んだ結果のスナップショット（"<ファイル>.snapshot"）と、その検証に使う
+# 元のファイルの先頭のバイト数。YAMLが正本で、スナップショットは消してもよい。
+# 読み込んでもコードが実行されないmarshal形式で、本人だけが読み書きできるように作る
+SNAPSHOT_SUFFIX = '.snapshot'
+SNAPSHOT_VERSION = 2
+SNAPSHOT_MODE = 0o600
+SNAPSHOT_HASH_BYTES = 4096
+
+# 読み込み・マージ・書き込みの間だけ取る排他ロックのファイル（"<ファイル>.lock"）
+LOCK_SUFFIX = '.lock'
+
+# スレッドごとに保持中のロック（同じスレッドの中での入れ子を許すため）
+_held_locks = threading.local()
+
+@contextmanager
+def file_lock(file_path: str):
+    """
+    ファイルを読み込んでマージして書き込む間、他のプロセス・スレッドを待たせる
+
+    "<file_path>.lock"に対するfcntlのアドバイザリロックを使う。Google Calendarとの通信の間は
+    取らず、書き込みの直前の短い間だけ取ること。fcntlのない環境（Windows）では何もしない。
+    同じスレッドの中では入れ子にできる。
+
+    Args:
+        file_path: ロックするファイルのパス
+    """
+    lock_path = os.path.abspath(file_path) + LOCK_SUFFIX
+    held = _held_locks.__dict__.setdefault('paths', set())
+    if fcntl is None or lock_path in held:
+        yield
+        return
+    with open(lock_path, 'a') as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        held.add(lock_path)
+        try:
+            yield
+        finally:
+            held.discard(lock_path)
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+def shard_dir_for(file_path: str) -> str:
+    """
+    イベントファイルに対応する月別シャードのディレクトリを返す
+
+    Args:
+        file_path: イベントファイルのパス (例: "events.yml")
+
+    Returns:
+        str: シャードのディレクトリ (例: "events.d")
+    """
+    return f"{os.path.splitext(file_path)[0]}.d"
+
+def is_sharded(file_path: str) -> bool:
+    """イベントファイルが月別シャードに分割されているかどうか"""
+    return os.path.isdir(shard_dir_for(file_path))
+
+def shard_key(event: Dict) -> str:
+    """
+    イベントを保存するシャードのキーを返す
+
+    Args:
+        event: ローカル形式のイベント
+
+    Returns:
+        str: 開始日時の年月 (例: "2024-03")。開始日時がなければUNDATED_SHARD
+    """
+    start = event.get('start_datetime') or ''
+    return start[:7] if len(start) >= 7 else UNDATED_SHARD
+
+def _shard_path(shard_dir: str, key: str) -> str:
+    """シャードのファイルパスを返す"""
+    return os.path.join(shard_dir, f"{key}.yml")
+
+def list_shard_keys(shard_dir: str) -> List[str]:
+    """
+    ディレクトリにあるシャードのキーを古い順に返す
+
+    Args:
+        shard_dir: シャードのディレクトリ
+
+    Returns:
+        List[str]: シャードのキーのリスト（UNDATED_SHARDは最後）
+    """
+    if not os.path.isdir(shard_dir):
+        return []
+    keys = [name[:-len('.yml')] for name in os.listdir(shard_dir) if name.endswith('.yml')]
+    return sorted(keys, key=lambda key: (key == UNDATED_SHARD, key))
+
+def _source_signature(path: str) -> Optional[Dict]:
+    """YAMLファイルの更新時刻・大きさ・先頭のハッシュ値（存在しない場合はNone）"""
+    try:
+        stat = os.stat(path)
+        with open(path, 'rb') as f:
+            head = f.read(SNAPSHOT_HASH_BYTES)
+    except FileNotFoundError:
+        return None
+    return {'version': SNAPSHOT_VERSION, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+            'head': hashlib.sha1(head).hexdigest()}
+
+def _write_snapshot(path: str, signature: Optional[Dict], events: List[Dict]) -> None:
+    """スナップショットを保存（書き込めない場合や、marshalで保存できない値を含む場合は何もしない）"""
+    if signature is None:
+        return
+    snapshot_path = path + SNAPSHOT_SUFFIX
+    tmp_file = f"{snapshot_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with os.fdopen(os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, SNAPSHOT_MODE), 'wb') as f:
+            marshal.dump(signature, f)
+            marshal.dump(events, f)
+        os.replace(tmp_file, snapshot_path)
+    except (OSError, ValueError):
+        # 手で書かれた日付（YAMLのdate型）などはmarshalで保存できない
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+def _remove_snapshot(path: str) -> None:
+    """スナップショットを削除"""
+    if os.path.exists(path + SNAPSHOT_SUFFIX):
+        os.remove(path + SNAPSHOT_SUFFIX)
+
+def load_yaml_list(path: str, snapshot: bool = True) -> List[Dict]:
+    """
+    イベントのリストのYAMLファイルを読み込む（スナップショットが新しければYAMLを解析しない）
+
+    スナップショットは元のファイルの更新時刻・大きさ・先頭のハッシュ値が一致する場合だけ使い、
+    手で編集された場合などは読み込み直して作り直す。
+
+    Args:
+        path: YAMLファイルのパス
+        snapshot: スナップショットを使うか（削除済みイベントファイルなどはFalse）
+
+    Returns:
+        List[Dict]: イベントのリスト。ファイルが存在しない場合は空リスト
+    """
+    if not snapshot:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return yaml.safe_load(f) or []
+        except FileNotFoundError:
+            return []
+
+    # 解析する前の状態を記録する（読み込み中に書き換えられても次回は作り直される）
+    signature = _source_signature(path)
+    if signature is None:
+        return []
+    try:
+        with open(path + SNAPSHOT_SUFFIX, 'rb') as f:
+            if marshal.load(f) == signature:
+                events = marshal.load(f)
+                if isinstance(events, list):
+                    return events
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+
+    with open(path, 'r', encoding='utf-8') as f:
+        events = yaml.safe_load(f) or []
+    _write_snapshot(path, signature, events)
+    return events
+
+def dump_yaml_list(path: str, events: List[Dict], snapshot: bool = True) -> None:
+    """
+    イベントのリストをYAMLファイルに保存し、スナップショットも作り直す
+
+    Args:
+        path: YAMLファイルのパス
+        events: 保存するイベントのリスト
+        snapshot: スナップショットを作り直すか
+    """
+    tmp_file = f"{path}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        yaml.dump(events, f, allow_unicode=True, sort_keys=False)
+    os.replace(tmp_file, path)
+    if snapshot:
+        _write_snapshot(path, _source_signature(path), events)
+
+def _read_shard(shard_dir: str, key: str) -> List[Dict]:
+    """シャードのイベントを読み込む（存在しない場合は空リスト）"""
+    return load_yaml_list(_shard_path(shard_dir, key))
+
+def _write_shard(shard_dir: str, key: str, events: List[Dict]) -> None:
+    """シャードを保存（空になった場合はファイルを削除）"""
+    path = _shard_path(shard_dir, key)
+    if not events:
+        if os.path.exists(path):
+            os.remove(path)
+        _remove_snapshot(path)
+        return
+    dump_yaml_list(path, events)
+
+def load_manifest(shard_dir: str) -> Dict[str, str]:
+    """
+    イベントIDからシャードのキーへの対応表を読み込む
+
+    対応表がない場合はすべてのシャードを読んで作り直す。
+
+    Args:
+        shard_dir: シャードのディレクトリ
+
+    Returns:
+        Dict[str, str]: イベントIDからシャードのキーへの辞書
+    """
+    path = os.path.join(shard_dir, SHARD_MANIFEST)
+    if not os.path.exists(path):
+        return rebuild_manifest(shard_dir)
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_manifest(shard_dir: str, manifest: Dict[str, str]) -> None:
+    """
+    イベントIDからシャードのキーへの対応表を保存
+
+    Args:
+        shard_dir: シャードのディレクトリ
+        manifest: イベントIDからシャードのキーへの辞書
+    """
+    path = os.path.join(shard_dir, SHARD_MANIFEST)
+    tmp_file = f"{path}.tmp"
+    # json.dump()はPythonで1要素ずつ書き出すため、Cの実装で文字列にしてから一度に書く
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(manifest, ensure_ascii=False))
+    os.replace(tmp_file, path)
+
+def rebuild_manifest(shard_dir: str) -> Dict[str, str]:
+    """
+    すべてのシャードを読んで対応表を作り直す
+
+    Args:
+        shard_dir: シャードのディレクトリ
+
+    Returns:
+        Dict[str, str]: イベントIDからシャードのキーへの辞書
+    """
+    manifest = {}
+    for key in list_shard_keys(shard_dir):
+        for event in _read_shard(shard_dir, key):
+            manifest[event['id']] = key
+    if os.path.isdir(shard_dir):
+        save_manifest(shard_dir, manifest)
+    return manifest
+
+def _save_sharded(shard_dir: str, events_data: List[Dict]) -> None:
+    """イベントをシャードに振り分け、内容が変わったシャードだけを書き込む"""
+    groups = {}
+    for event in events_data:
+        groups.setdefault(shard_key(event), []).append(event)
+    for key in set(groups) | set(list_shard_keys(shard_dir)):
+        events = sorted(groups.get(key, []), key=start_key)
+        if _read_shard(shard_dir, key) != events:
+            _write_shard(shard_dir, key, events)
+    save_manifest(shard_dir, {event['id']: shard_key(event) for event in events_data})
+
+def load_events(file_path: str = "events.yml", snapshot: bool = True) -> List[Dict]:
     """
     YAMLファイルからイベントデータを読み込む
 
+    解析した結果はスナップショット（"<ファイル>.snapshot"）に残し、YAMLが変わっていなければ
+    次回からはスナップショットを読み込む。
+
     Args:
         file_path (str): 読み込むYAMLファイルのパス。デフォルトは"events.yml"
+        snapshot (bool): スナップショットを使うか（イベントファイル以外はFalse）
 
     Returns:
         List[Dict]: イベントのリスト。ファイルが存在しない場合は空リスト
     """
-    if not os.path.exists(file_path):
-        return []
-    
-    with open(file_path, 'r', encoding='utf-8') as f:
-        data = yaml.safe_load(f)
-        return data if data is not None else []
+    if is_sharded(file_path):
+        shard_dir = shard_dir_for(file_path)
+        events = []
+        for key in list_shard_keys(shard_dir):
+            events.extend(_read_shard(shard_dir, key))
+        return events
+
+    return load_yaml_list(file_path, snapshot=snapshot)
 
 def save_events(file_path: str, events_data: List[Dict]) -> None:
     """
     イベントデータをYAMLファイルに保存
 
+    月別シャードに分割されている場合は、内容が変わったシャードだけを書き込む。
+
     Args:
         file_path (str): 保存先のYAMLファイルパス
         events_data (List[Dict]): 保存するイベントのリスト
@@ -31,8 +310,405 @@ def save_events(file_path: str, events_data: List[Dict]) -> None:
     Returns:
         None
     """
-    with open(file_path, 'w', encoding='utf-8') as f:
-        yaml.dump(events_data, f, allow_unicode=True, sort_keys=False)
+    with file_lock(file_path):
+        if is_sharded(file_path):
+            _save_sharded(shard_dir_for(file_path), events_data)
+            return
+        dump_yaml_list(file_path, events_data)
+
+def storage_stamp(file_path: str) -> Optional[List[int]]:
+    """
+    イベントファイル（またはシャード全体）の更新時刻と大きさを返す
+
+    Args:
+        file_path: イベントファイルのパス
+
+    Returns:
+        Optional[List[int]]: [更新時刻(ns), 大きさ]。シャードの場合は最も新しい更新時刻と合計の大きさ。
+            存在しない場合はNone
+    """
+    if is_sharded(file_path):
+        shard_dir = shard_dir_for(file_path)
+        stats = [os.stat(os.path.join(shard_dir, name)) for name in os.listdir(shard_dir)
+                 if name.endswith('.yml')]
+        if not stats:
+            return [os.stat(shard_dir).st_mtime_ns, 0]
+        return [max(stat.st_mtime_ns for stat in stats), sum(stat.st_size for stat in stats)]
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+def migrate_to_shards(file_path: str = "events.yml") -> int:
+    """
+    イベントファイルを月別シャードに分割
+
+    元のファイルは"<file_path>.bak"として残す。
+
+    Args:
+        file_path: イベントファイルのパス
+
+    Returns:
+        int: 移行したイベント数
+    """
+    events = load_events(file_path)
+    shard_dir = shard_dir_for(file_path)
+    os.makedirs(shard_dir, exist_ok=True)
+    _save_sharded(shard_dir, events)
+    if os.path.exists(file_path):
+        os.replace(file_path, f"{file_path}.bak")
+    _remove_snapshot(file_path)
+    return len(events)
+
+def migrate_to_flat(file_path: str = "events.yml") -> int:
+    """
+    月別シャードを1つのイベントファイルに戻す
+
+    Args:
+        file_path: イベントファイルのパス
+
+    Returns:
+        int: 移行したイベント数
+    """
+    shard_dir = shard_dir_for(file_path)
+    events = load_events(file_path)
+    dump_yaml_list(file_path, events)
+    for name in os.listdir(shard_dir):
+        os.remove(os.path.join(shard_dir, name))
+    os.rmdir(shard_dir)
+    return len(events)
+
+def content_hash(event: Dict) -> str:
+    """
+    同期対象の項目からイベントの内容のハッシュ値を計算
+
+    Args:
+        event: ローカル形式のイベント
+
+    Returns:
+        str: SHA-256のハッシュ値（16進数）
+    """
+    values = {field: event.get(field) or None for field in SYNCED_FIELDS}
+    # update --recurrence none はローカルに'none'として保存される
+    if values['recurrence'] == 'none':
+        values['recurrence'] = None
+    payload = json.dumps(values, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def start_key(event: Dict) -> datetime:
+    """
+    イベントを並べる基準になる開始日時を返す
+
+    Args:
+        event: ローカル形式のイベント
+
+    Returns:
+        datetime: 開始日時。開始日時がないか解釈できない場合はdatetime.max（末尾に並べる）
+    """
+    try:
+        return datetime.strptime(event.get('start_datetime') or '', "%Y-%m-%d %H:%M")
+    except ValueError:
+        return datetime.max
+
+class EventStore:
+    """
+    イベントファイルを必要な分だけ読み書きするストア
+
+    月別シャードに分割されている場合は、対応表でイベントIDからシャードを引き、
+    触れたシャードだけを読み込んで変更したシャードだけを書き込む。
+    分割されていない場合は従来通り1つのファイルを読み書きする。
+
+    読み込んだイベントは開始日時順に並べて保持し、追加・更新のときも順序を保って
+    挿入する。query_range()は二分探索で期間内のイベントを取り出す。
+
+    追加・更新・削除は操作として記録しておき、save()ではファイルをロックしてから、
+    読み込んだ後に別のプロセスが書き込んでいれば最新の内容を読み直して操作を当て直す。
+    そのため並行して実行したコマンドの変更を互いに消さない。
+    """
+
+    def __init__(self, file_path: str = "events.yml"):
+        """
+        Args:
+            file_path: イベントファイルのパス
+        """
+        self.file_path = file_path
+        self.sharded = is_sharded(file_path)
+        self.shard_dir = shard_dir_for(file_path)
+        # シャードのキー（分割されていない場合はNone）から開始日時順のイベントと開始日時のリストへの辞書
+        self._buckets = {}
+        self._keys = {}
+        self._manifest = None
+        self._dirty = set()
+        self._manifest_dirty = False
+        # 保存していない操作と、最初に読み込む前のファイルの状態
+        self._operations = []
+        self._loaded_stamp = None
+        self._stamped = False
+
+    @property
+    def loaded_shards(self) -> List[str]:
+        """読み込み済みのシャードのキー"""
+        return sorted(key for key in self._buckets if key is not None)
+
+    def _manifest_map(self) -> Dict[str, str]:
+        """イベントIDからシャードのキーへの対応表"""
+        if not self._stamped:
+            self._loaded_stamp = storage_stamp(self.file_path)
+            self._stamped = True
+        if self._manifest is None:
+            self._manifest = load_manifest(self.shard_dir)
+        return self._manifest
+
+    def _bucket(self, key: Optional[str]) -> List[Dict]:
+        """シャード（分割されていなければファイル全体）の内容を開始日時順に返す（初めて触れたときに読み込む）"""
+        if not self._stamped:
+            # 読み込む前の状態を記録する（読み込み中に書き込まれても当て直しの対象になる）
+            self._loaded_stamp = storage_stamp(self.file_path)
+            self._stamped = True
+        if key not in self._buckets:
+            events = _read_shard(self.shard_dir, key) if self.sharded else load_events(self.file_path)
+            events.sort(key=start_key)
+            self._buckets[key] = events
+            self._keys[key] = [start_key(event) for event in events]
+        return self._buckets[key]
+
+    def _bucket_key(self, event: Dict) -> Optional[str]:
+        """イベントを入れるシャードのキー（分割されていなければNone）"""
+        return shard_key(event) if self.sharded else None
+
+    def _insert(self, key: Optional[str], event: Dict) -> None:
+        """開始日時の順序を保ってイベントを挿入"""
+        events = self._bucket(key)
+        event_start = start_key(event)
+        index = bisect.bisect_right(self._keys[key], event_start)
+        events.insert(index, event)
+        self._keys[key].insert(index, event_start)
+        self._dirty.add(key)
+
+    def _pop(self, key: Optional[str], index: int) -> Dict:
+        """指定された位置のイベントを取り除く"""
+        del self._keys[key][index]
+        self._dirty.add(key)
+        return self._bucket(key).pop(index)
+
+    def _locate(self, event_id: str) -> Optional[str]:
+        """イベントのあるシャードのキーを返す（対応表が古ければ作り直す）"""
+        key = self._manifest_map().get(event_id)
+        if key is None or any(event['id'] == event_id for event in self._bucket(key)):
+            return key
+        # 手作業でシャードを編集した場合など、対応表が実際の内容とずれている
+        manifest = {event_id: key for event_id, key in rebuild_manifest(self.shard_dir).items()
+                    if key not in self._buckets}
+        for loaded_key, events in self._buckets.items():
+            manifest.update((event['id'], loaded_key) for event in events)
+        self._manifest = manifest
+        self._manifest_dirty = True
+        return manifest.get(event_id)
+
+    def _find(self, event_id: str):
+        """イベントのあるシャードのキーと位置を返す（存在しない場合の位置はNone）"""
+        key = self._locate(event_id) if self.sharded else None
+        if self.sharded and key is None:
+            return None, None
+        index = next((i for i, event in enumerate(self._bucket(key)) if event['id'] == event_id), None)
+        return key, index
+
+    def prefetch(self, events: List[Dict]) -> None:
+        """
+        イベントの追加・更新で触れるシャード（分割されていなければファイル全体）を先に読み込む
+
+        Google Calendarへの送信を待つ間に別スレッドで呼び出し、読み込みを通信と並行させるためのもの。
+
+        Args:
+            events: これから追加・更新するイベント
+        """
+        if self.sharded:
+            self._manifest_map()
+        for event in events:
+            self._bucket(self._bucket_key(event))
+
+    def ids(self) -> set:
+        """すべてのイベントIDの集合（シャードの場合は対応表から返し、シャードは読み込まない）"""
+        if self.sharded:
+            return set(self._manifest_map())
+        return {event['id'] for event in self._bucket(None)}
+
+    def get(self, event_id: str) -> Optional[Dict]:
+        """
+        指定されたIDのイベントを返す
+
+        Args:
+            event_id: イベントID
+
+        Returns:
+            Optional[Dict]: イベント。存在しない場合はNone
+        """
+        key, index = self._find(event_id)
+        return self._bucket(key)[index] if index is not None else None
+
+    def all(self) -> List[Dict]:
+        """
+        すべてのイベントを開始日時順に返す
+
+        Returns:
+            List[Dict]: イベントのリスト
+        """
+        if not self.sharded:
+            return list(self._bucket(None))
+        events = []
+        for key in sorted(set(list_shard_keys(self.shard_dir)) | set(self._buckets),
+                          key=lambda key: (key == UNDATED_SHARD, key)):
+            events.extend(self._bucket(key))
+        return events
+
+    def query_range(self, start: datetime, end: datetime) -> List[Dict]:
+        """
+        開始日時がstart以上end未満のイベントを開始日時順に返す
+
+        月別シャードに分割されている場合は期間に含まれる月のシャードだけを読み込む。
+
+        Args:
+            start: 期間の開始
+            end: 期間の終了（この日時は含まない）
+
+        Returns:
+            List[Dict]: 期間内に開始するイベントのリスト
+        """
+        if start >= end:
+            return []
+        if self.sharded:
+            # シャードのキーは"YYYY-MM"なので文字列比較で期間に含まれる月を選べる
+            first = f"{start.year:04d}-{start.month:02d}"
+            last_day = end - timedelta(microseconds=1)
+            last = f"{last_day.year:04d}-{last_day.month:02d}"
+            keys = sorted(key for key in set(list_shard_keys(self.shard_dir)) | set(self._buckets)
+                          if key != UNDATED_SHARD and first <= key <= last)
+        else:
+            keys = [None]
+        events = []
+        for key in keys:
+            bucket = self._bucket(key)
+            lo = bisect.bisect_left(self._keys[key], start)
+            hi = bisect.bisect_left(self._keys[key], end, lo)
+            events.extend(bucket[lo:hi])
+        return events
+
+    def add(self, event: Dict) -> None:
+        """
+        イベントを開始日時の順序を保って追加
+
+        Args:
+            event: 追加するイベント
+        """
+        self._operations.append(('add', event))
+        self._add(event)
+
+    def update(self, event_id: str, new_data: Dict) -> Optional[Dict]:
+        """
+        指定されたIDのイベントを更新（開始日時が変わった場合は並び順やシャードを移す）
+
+        Args:
+            event_id: 更新対象のイベントID
+            new_data: 更新するデータ（部分的な更新可能）
+
+        Returns:
+            Optional[Dict]: 更新後のイベント。存在しない場合はNone
+        """
+        self._operations.append(('update', event_id, dict(new_data)))
+        return self._update(event_id, new_data)
+
+    def delete(self, event_id: str) -> Optional[Dict]:
+        """
+        指定されたIDのイベントを取り除く
+
+        Args:
+            event_id: 削除対象のイベントID
+
+        Returns:
+            Optional[Dict]: 取り除いたイベント。存在しない場合はNone
+        """
+        self._operations.append(('delete', event_id))
+        return self._delete(event_id)
+
+    def _add(self, event: Dict) -> None:
+        """イベントを追加（同じIDがあれば置き換える）"""
+        if self._find(event['id'])[1] is not None:
+            self._delete(event['id'])
+        key = self._bucket_key(event)
+        self._insert(key, event)
+        if self.sharded:
+            self._manifest_map()[event['id']] = key
+            self._manifest_dirty = True
+
+    def _update(self, event_id: str, new_data: Dict) -> Optional[Dict]:
+        """イベントを更新（存在しない場合はNone）"""
+        old_key, index = self._find(event_id)
+        if index is None:
+            return None
+        updated_event = self._bucket(old_key)[index].copy()
+        updated_event.update(new_data)
+        if start_key(updated_event) == self._keys[old_key][index]:
+            self._bucket(old_key)[index] = updated_event
+            self._dirty.add(old_key)
+            return updated_event
+        self._pop(old_key, index)
+        new_key = self._bucket_key(updated_event)
+        self._insert(new_key, updated_event)
+        if new_key != old_key:
+            self._manifest_map()[event_id] = new_key
+            self._manifest_dirty = True
+        return updated_event
+
+    def _delete(self, event_id: str) -> Optional[Dict]:
+        """イベントを取り除く（存在しない場合はNone）"""
+        key, index = self._find(event_id)
+        if index is None:
+            return None
+        removed = self._pop(key, index)
+        if self.sharded:
+            self._manifest_map().pop(event_id, None)
+            self._manifest_dirty = True
+        return removed
+
+    def _rebase(self) -> None:
+        """読み込んだ内容を捨てて最新のファイルを読み直し、記録した操作を順に当て直す"""
+        self.sharded = is_sharded(self.file_path)
+        self._buckets = {}
+        self._keys = {}
+        self._manifest = None
+        self._dirty = set()
+        self._manifest_dirty = False
+        for operation in self._operations:
+            if operation[0] == 'add':
+                self._add(operation[1])
+            elif operation[0] == 'update':
+                # 別のプロセスが削除したイベントの更新は捨てる
+                self._update(operation[1], operation[2])
+            else:
+                self._delete(operation[1])
+
+    def save(self) -> None:
+        """
+        変更したシャード（分割されていなければイベントファイル）だけを書き込む
+
+        書き込みの間はファイルをロックし、読み込んだ後に別のプロセスが書き込んでいた場合は
+        最新の内容にこのストアの操作を当て直してから書き込む。
+        """
+        with file_lock(self.file_path):
+            if self._operations and storage_stamp(self.file_path) != self._loaded_stamp:
+                self._rebase()
+            for key in self._dirty:
+                if self.sharded:
+                    _write_shard(self.shard_dir, key, self._buckets[key])
+                else:
+                    save_events(self.file_path, self._buckets[key])
+            if self._manifest_dirty:
+                save_manifest(self.shard_dir, self._manifest_map())
+            self._loaded_stamp = storage_stamp(self.file_path)
+        self._dirty.clear()
+        self._manifest_dirty = False
+        self._operations = []
 
 def add_local_event(events_data: List[Dict], event_data: Dict) -> List[Dict]:
     """
@@ -78,22 +754,57 @@ def save_deleted_event(event: Dict, deleted_events_file: str = "deletedevents.ym
         event (Dict): 削除されたイベント情報
         deleted_events_file (str): 削除済みイベントファイルのパス
     """
-    # 既存の削除済みイベントを読み込む
-    try:
-        with open(deleted_events_file, 'r', encoding='utf-8') as f:
-            deleted_events = yaml.safe_load(f) or []
-    except FileNotFoundError:
-        deleted_events = []
+    with file_lock(deleted_events_file):
+        # 既存の削除済みイベントを読み込む
+        try:
+            with open(deleted_events_file, 'r', encoding='utf-8') as f:
+                deleted_events = yaml.safe_load(f) or []
+        except FileNotFoundError:
+            deleted_events = []
 
-    # 削除日時を追加
-    event['deleted_at'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    # 削除済みイベントリストに追加
-    deleted_events.append(event)
+        # 削除日時を追加
+        event['deleted_at'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        
+        # 削除済みイベントリストに追加
+        deleted_events.append(event)
 
-    # 保存
-    with open(deleted_events_file, 'w', encoding='utf-8') as f:
-        yaml.dump(deleted_events, f, allow_unicode=True)
+        # 保存
+        with open(deleted_events_file, 'w', encoding='utf-8') as f:
+            yaml.dump(deleted_events, f, allow_unicode=True)
+
+def save_deleted_events(events: List[Dict], deleted_events_file: str = "deletedevents.yml") -> None:
+    """
+    削除された複数のイベントをまとめて保存（1回の書き込み）
+
+    削除済みイベントファイルが"- "で始まるリストなら末尾に追記し、既存のイベントは読み込まない。
+
+    Args:
+        events: 削除されたイベント情報（deleted_atを追加する）
+        deleted_events_file: 削除済みイベントファイルのパス
+    """
+    if not events:
+        return
+    deleted_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for event in events:
+        event['deleted_at'] = deleted_at
+
+    with file_lock(deleted_events_file):
+        try:
+            with open(deleted_events_file, 'rb') as f:
+                appendable = f.read(2) == b'- '
+                if appendable:
+                    f.seek(-1, os.SEEK_END)
+                    appendable = f.read(1) == b'\n'
+        except FileNotFoundError:
+            appendable = False
+
+        if appendable:
+            with open(deleted_events_file, 'a', encoding='utf-8') as f:
+                yaml.dump(events, f, allow_unicode=True)
+        else:
+            deleted_events = load_events(deleted_events_file, snapshot=False) + events
+            with open(deleted_events_file, 'w', encoding='utf-8') as f:
+                yaml.dump(deleted_events, f, allow_unicode=True)
 
 def delete_local_event(events_data: List[Dict], event_id: str, deleted_events_file: str = "deletedevents.yml") -> List[Dict]:
     """
@@ -114,4 +825,73 @@ def delete_local_event(events_data: List[Dict], event_id: str, deleted_events_fi
         save_deleted_event(deleted_event.copy(), deleted_events_file)
 
     # イベントリストから削除
-    return [event for event in events_data if event['id'] != event_id] 
\ No newline at end of file
+    return [event for event in events_data if event['id'] != event_id]
+
+def _archive_chunks(deleted_events_file: str) -> Iterator[Tuple[str, List[Dict]]]:
+    """
+    削除済みイベントファイルを先頭から1件ずつ読み込む
+
+    yaml.dump()が書き出すトップレベルのリストは各要素が行頭の"- "で始まるため、
+    その位置で区切って要素ごとに読み込む（ファイル全体をメモリに載せない）。
+
+    Yields:
+        Tuple[str, List[Dict]]: (元のテキスト, そのテキストに含まれるイベント)
+    """
+    try:
+        f = open(deleted_events_file, 'r', encoding='utf-8')
+    except FileNotFoundError:
+        return
+    with f:
+        lines = []
+        for line in f:
+            if lines and line.startswith('-') and line[1:2] in (' ', '\n', ''):
+                text = ''.join(lines)
+                yield text, yaml.safe_load(text) or []
+                lines = []
+            lines.append(line)
+        if lines:
+            text = ''.join(lines)
+            yield text, yaml.safe_load(text) or []
+
+def iter_deleted_events(deleted_events_file: str = "deletedevents.yml") -> Iterator[Dict]:
+    """
+    削除済みイベントを1件ずつ読み込む
+
+    Args:
+        deleted_events_file: 削除済みイベントファイルのパス
+
+    Yields:
+        Dict: 削除済みイベント（deleted_atを含む）
+    """
+    for _, events in _archive_chunks(deleted_events_file):
+        yield from events
+
+def remove_deleted_events(deleted_events_file: str, keys: Set[Tuple[str, str]]) -> int:
+    """
+    削除済みイベントファイルから指定したイベントを取り除く（1回の書き込み）
+
+    残すイベントは元のテキストのまま一時ファイルに書き写し、最後に置き換える。
+
+    Args:
+        deleted_events_file: 削除済みイベントファイルのパス
+        keys: 取り除くイベントの(ID, deleted_at)
+
+    Returns:
+        int: 取り除いたイベント数
+    """
+    removed = 0
+    tmp_file = f"{deleted_events_file}.tmp"
+    with file_lock(deleted_events_file):
+        with open(tmp_file, 'w', encoding='utf-8') as out:
+            for text, events in _archive_chunks(deleted_events_file):
+                kept = [event for event in events if (event.get('id'), event.get('deleted_at')) not in keys]
+                removed += len(events) - len(kept)
+                if len(kept) == len(events):
+                    out.write(text)
+                elif kept:
+                    yaml.dump(kept, out, allow_unicode=True)
+        if removed:
+            os.replace(tmp_file, deleted_events_file)
+        else:
+            os.remove(tmp_file)
+    return removed
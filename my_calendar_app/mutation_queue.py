@@ -0,0 +1,205 @@
+import os
+import yaml
+from typing import Dict, List, Optional
+from datetime import datetime
+
+from google_calendar_service import (
+    build_event_body,
+    build_patch_body,
+    execute_batch,
+    resolve_insert_conflicts,
+    to_local_event
+)
+
+# 競合の判定に使う項目
+COMPARED_FIELDS = ('title', 'start_datetime', 'end_datetime', 'detail', 'recurrence')
+
+def queue_path_for(events_file: str) -> str:
+    """
+    イベントファイルに対応する送信待ちキューのパスを返す
+
+    Args:
+        events_file: イベントファイルのパス (例: "events.yml")
+
+    Returns:
+        str: キューファイルのパス (例: "events.queue.yml")
+    """
+    return f"{os.path.splitext(events_file)[0]}.queue.yml"
+
+def load_queue(queue_file: str) -> List[Dict]:
+    """
+    送信待ちキューを読み込む
+
+    Args:
+        queue_file: キューファイルのパス
+
+    Returns:
+        List[Dict]: 送信待ちの変更のリスト。ファイルが存在しない場合は空リスト
+    """
+    if not os.path.exists(queue_file):
+        return []
+    with open(queue_file, 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f) or []
+
+def save_queue(queue_file: str, queue: List[Dict]) -> None:
+    """
+    送信待ちキューを保存（空になった場合はファイルを削除）
+
+    Args:
+        queue_file: キューファイルのパス
+        queue: 送信待ちの変更のリスト
+    """
+    if not queue:
+        if os.path.exists(queue_file):
+            os.remove(queue_file)
+        return
+    tmp_file = f"{queue_file}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        yaml.dump(queue, f, allow_unicode=True, sort_keys=False)
+    os.replace(tmp_file, queue_file)
+
+def has_pending(queue: List[Dict], event_id: str) -> bool:
+    """指定されたIDのイベントに送信待ちの変更があるかどうか"""
+    return any(entry['id'] == event_id for entry in queue)
+
+def enqueue(queue: List[Dict], op: str, event_id: str, data: Optional[Dict] = None,
+            base: Optional[Dict] = None) -> List[Dict]:
+    """
+    変更をキューに追加し、同じイベントへの変更とまとめる
+
+    まとめ方:
+        add → update: 変更を反映したaddにする
+        add → delete: 何も送信しない（キューから取り除く）
+        update → update: 変更を1つのパッチにまとめる
+        update → delete: deleteにする
+        delete → add: 削除前の状態を基準にしたupdateにする
+
+    Args:
+        queue: 送信待ちの変更のリスト
+        op: 'add', 'update', 'delete'のいずれか
+        event_id: イベントID
+        data: addではイベント全体、updateでは変更する項目（ローカル形式）
+        base: update/deleteで、変更前のローカルのイベント（競合の判定に使う）
+
+    Returns:
+        List[Dict]: 更新後のキュー
+    """
+    existing = next((entry for entry in queue if entry['id'] == event_id), None)
+    others = [entry for entry in queue if entry['id'] != event_id]
+    queued_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    if existing is None:
+        entry = {'op': op, 'id': event_id, 'data': dict(data or {}), 'base': base, 'queued_at': queued_at}
+        return queue + [entry]
+
+    entry = dict(existing, data=dict(existing['data']), queued_at=queued_at)
+    if op == 'delete':
+        if existing['op'] == 'add':
+            return others
+        entry.update(op='delete', data={})
+    elif op == 'update':
+        # addへの変更はaddのまま、updateへの変更はパッチを重ねる
+        entry['data'].update(data or {})
+    elif op == 'add':
+        if existing['op'] == 'delete':
+            entry.update(op='update', data=dict(data or {}))
+        else:
+            entry['data'] = dict(data or {})
+    return others + [entry]
+
+def _same_content(local_event: Dict, other: Dict) -> bool:
+    """競合判定の対象の項目が一致するかどうか"""
+    return all((local_event.get(field) or None) == (other.get(field) or None) for field in COMPARED_FIELDS)
+
+def _status_code(error: Exception) -> Optional[int]:
+    """バッチの結果の例外からHTTPステータスコードを取り出す"""
+    status = getattr(error, 'status_code', None)
+    if status is None and getattr(error, 'resp', None) is not None:
+        status = getattr(error.resp, 'status', None)
+    return int(status) if status is not None else None
+
+def flush_queue(service: any, queue: List[Dict], calendar_id: str, force: bool = False) -> Dict:
+    """
+    送信待ちの変更をバッチリクエストでGoogle Calendarに送信
+
+    update/deleteは送信前にGoogle Calendar上のイベントを取得し、キューに入れたときの
+    ローカルの状態（base）から変わっていれば競合として送信しない。
+
+    Args:
+        service: Google Calendar APIサービスインスタンス
+        queue: 送信待ちの変更のリスト
+        calendar_id: カレンダーID
+        force: Trueなら競合を無視してローカルの変更で上書きする
+
+    Returns:
+        Dict: 以下のキーを持つ結果
+            sent: 送信できた変更のリスト
+            conflicts: 競合のため送信しなかった変更のリスト
+            failed: (変更, 例外)のリスト
+            remaining: 送信できずキューに残す変更のリスト
+    """
+    result = {'sent': [], 'conflicts': [], 'failed': [], 'remaining': []}
+    events_api = service.events()
+
+    # 競合の確認（Google Calendar上の現在の状態を取得）
+    to_check = []
+    ready = []
+    for entry in queue:
+        entry = {key: value for key, value in entry.items() if key != 'conflict'}
+        if entry['op'] != 'add' and entry.get('base') and not force:
+            to_check.append(entry)
+        else:
+            ready.append(entry)
+    remote_states = execute_batch(service, [
+        events_api.get(calendarId=calendar_id, eventId=entry['id']) for entry in to_check
+    ])
+    for entry, (remote, error) in zip(to_check, remote_states):
+        status = _status_code(error) if error is not None else None
+        gone = status in (404, 410) or (remote is not None and remote.get('status') == 'cancelled')
+        if gone:
+            if entry['op'] == 'delete':
+                # 既に削除されている
+                result['sent'].append(entry)
+            else:
+                result['conflicts'].append(dict(entry, conflict='Google Calendar上で削除されています'))
+            continue
+        if error is not None:
+            result['failed'].append((entry, error))
+            continue
+        if not _same_content(to_local_event(remote), entry['base']):
+            result['conflicts'].append(dict(entry, conflict='Google Calendar上で変更されています'))
+            continue
+        ready.append(entry)
+
+    # 変更の送信
+    requests = []
+    for entry in ready:
+        data = entry['data']
+        if entry['op'] == 'add':
+            body = build_event_body(data['start_datetime'], data['end_datetime'], data['title'],
+                                    data.get('detail'), data.get('recurrence'))
+            body['id'] = entry['id']
+            requests.append(events_api.insert(calendarId=calendar_id, body=body))
+        elif entry['op'] == 'update':
+            body = build_patch_body(data.get('title'), data.get('start_datetime'), data.get('end_datetime'),
+                                    data.get('detail'), data.get('recurrence'))
+            requests.append(events_api.patch(calendarId=calendar_id, eventId=entry['id'], body=body))
+        else:
+            requests.append(events_api.delete(calendarId=calendar_id, eventId=entry['id']))
+
+    # 同じIDでの再送の409は、前回の送信で作成済みなら成功として扱う（削除済みのIDはエラーのまま）
+    results = resolve_insert_conflicts(service, calendar_id, [
+        entry['id'] if entry['op'] == 'add' else None for entry in ready
+    ], execute_batch(service, requests))
+    for entry, (response, error) in zip(ready, results):
+        if error is not None:
+            status = _status_code(error)
+            if entry['op'] == 'delete' and status in (404, 410):
+                result['sent'].append(entry)
+            else:
+                result['failed'].append((entry, error))
+            continue
+        result['sent'].append(entry)
+
+    result['remaining'] = result['conflicts'] + [entry for entry, _ in result['failed']]
+    return result
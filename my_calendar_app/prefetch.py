@@ -0,0 +1,192 @@
+import os
+import json
+import time
+import calendar
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+# 一覧を表示した期間の履歴（先読みする間隔の学習に使う）
+PREFETCH_HISTORY_FILE = '.calendar_prefetch.json'
+PREFETCH_HISTORY_SIZE = 10
+
+# 1回の一覧表示のあとに先読みする期間の数と、先読みに使う時間の上限（秒）
+PREFETCH_RANGES = 2
+PREFETCH_TIME_BUDGET = 10.0
+
+# CLIの終了前に先読みを待つ時間の上限（秒）。過ぎたら残りは捨てて終了する
+# （キャッシュは一時ファイルからの置き換えで保存するため、途中で終了しても壊れない）
+PREFETCH_EXIT_WAIT = 1.0
+
+DATE_FORMAT = "%Y-%m-%d"
+
+# 実行中の先読みのスレッド（wait_prefetch()で終了を待つ）
+_threads: List[threading.Thread] = []
+
+def _parse(date_str: str) -> datetime:
+    """"YYYY-MM-DD"形式の日付を変換"""
+    return datetime.strptime(date_str, DATE_FORMAT)
+
+def is_whole_month(start_date: str, end_date: str) -> bool:
+    """期間がちょうど1か月（1日から末日まで）かどうか"""
+    start, end = _parse(start_date), _parse(end_date)
+    return (start.day == 1 and (start.year, start.month) == (end.year, end.month)
+            and end.day == calendar.monthrange(end.year, end.month)[1])
+
+def shift_range(start_date: str, end_date: str, stride: Tuple[str, int]) -> Tuple[str, str]:
+    """
+    期間を指定した間隔だけずらす
+
+    Args:
+        start_date: 開始日 (例: "2024-03-01")
+        end_date: 終了日 (例: "2024-03-31")
+        stride: ('days', 日数)または('months', 月数)
+
+    Returns:
+        Tuple[str, str]: ずらした期間の開始日と終了日
+    """
+    unit, amount = stride
+    start, end = _parse(start_date), _parse(end_date)
+    if unit == 'months':
+        months = start.year * 12 + start.month - 1 + amount
+        year, month = divmod(months, 12)
+        new_start = datetime(year, month + 1, 1)
+        new_end = new_start.replace(day=calendar.monthrange(year, month + 1)[1])
+    else:
+        new_start = start + timedelta(days=amount)
+        new_end = end + timedelta(days=amount)
+    return new_start.strftime(DATE_FORMAT), new_end.strftime(DATE_FORMAT)
+
+def load_history(history_file: str = PREFETCH_HISTORY_FILE) -> List[Dict]:
+    """一覧を表示した期間の履歴を読み込む"""
+    try:
+        with open(history_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return []
+
+def record_request(start_date: str, end_date: str, history_file: str = PREFETCH_HISTORY_FILE) -> List[Dict]:
+    """
+    一覧を表示した期間を履歴に追加
+
+    Args:
+        start_date: 開始日
+        end_date: 終了日
+        history_file: 履歴ファイルのパス
+
+    Returns:
+        List[Dict]: 追加後の履歴（古い順、最大PREFETCH_HISTORY_SIZE件）
+    """
+    history = load_history(history_file)
+    history.append({'start': start_date, 'end': end_date})
+    history = history[-PREFETCH_HISTORY_SIZE:]
+    tmp_file = f"{history_file}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(history, f)
+    os.replace(tmp_file, history_file)
+    return history
+
+def learn_stride(history: List[Dict]) -> Tuple[str, int]:
+    """
+    直近の一覧表示の期間から、次に表示されそうな期間への間隔を学習
+
+    最後の期間と同じ種類（1か月単位か日数単位か、同じ日数か）の連続した表示の
+    ずれのうち最も多いものを採用する。履歴がなければ期間の長さだけ先に進む。
+
+    Args:
+        history: record_request()の履歴（最後が今回の期間）
+
+    Returns:
+        Tuple[str, int]: ('days', 日数)または('months', 月数)。負の値は過去に向かう
+    """
+    current = history[-1]
+    monthly = is_whole_month(current['start'], current['end'])
+    span = (_parse(current['end']) - _parse(current['start'])).days
+    deltas = []
+    for previous, following in zip(history, history[1:]):
+        if monthly:
+            if not (is_whole_month(previous['start'], previous['end'])
+                    and is_whole_month(following['start'], following['end'])):
+                continue
+            a, b = _parse(previous['start']), _parse(following['start'])
+            delta = (b.year - a.year) * 12 + b.month - a.month
+        else:
+            if any((_parse(entry['end']) - _parse(entry['start'])).days != span for entry in (previous, following)):
+                continue
+            delta = (_parse(following['start']) - _parse(previous['start'])).days
+        if delta:
+            deltas.append(delta)
+
+    unit = 'months' if monthly else 'days'
+    if not deltas:
+        return unit, 1 if monthly else span + 1
+    counts = Counter(deltas)
+    best = max(counts.values())
+    # 同数の場合は最近のものを優先する
+    return unit, next(delta for delta in reversed(deltas) if counts[delta] == best)
+
+def plan_prefetch(history: List[Dict], budget: int = PREFETCH_RANGES) -> List[Tuple[str, str]]:
+    """
+    先読みする期間を決める
+
+    学習した間隔で最後の期間から順にbudget件先の期間を返す。
+
+    Args:
+        history: record_request()の履歴
+        budget: 先読みする期間の数
+
+    Returns:
+        List[Tuple[str, str]]: (開始日, 終了日)のリスト（近い順）
+    """
+    if not history or budget <= 0:
+        return []
+    unit, amount = learn_stride(history)
+    current = history[-1]
+    return [shift_range(current['start'], current['end'], (unit, amount * step)) for step in range(1, budget + 1)]
+
+def start_prefetch(fetch: Callable[[str, str], any], ranges: List[Tuple[str, str]],
+                   time_budget: float = PREFETCH_TIME_BUDGET) -> threading.Thread:
+    """
+    期間の一覧をバックグラウンドで順に取得する（結果はfetch側でキャッシュに保存される）
+
+    Google APIクライアントのサービスはスレッド間で同時に使えないため、1つのスレッドで順に取得する。
+    時間の上限を過ぎたら残りの期間は取得しない。失敗は無視する（先読みは表示に影響させない）。
+
+    Args:
+        fetch: (開始日, 終了日)を受け取って一覧を取得する関数
+        ranges: 先読みする期間のリスト
+        time_budget: 先読みに使う時間の上限（秒）
+
+    Returns:
+        threading.Thread: 先読みのスレッド（デーモンスレッドなので終了を待たなくてもよい）
+    """
+    deadline = time.monotonic() + time_budget
+
+    def run() -> None:
+        for start_date, end_date in ranges:
+            if time.monotonic() >= deadline:
+                return
+            try:
+                fetch(start_date, end_date)
+            except Exception:
+                return
+
+    thread = threading.Thread(target=run, name='calendar-prefetch', daemon=True)
+    thread.start()
+    _threads.append(thread)
+    return thread
+
+def wait_prefetch(time_budget: float = PREFETCH_EXIT_WAIT) -> None:
+    """
+    実行中の先読みが終わるか時間の上限になるまで待つ
+
+    CLIは表示を終えてから終了前にこれを呼び出し、短い時間で終わった先読みの結果を
+    キャッシュに残す。終わらなかった先読みはデーモンスレッドのまま終了とともに捨てる。
+
+    Args:
+        time_budget: 待つ時間の上限（秒）
+    """
+    deadline = time.monotonic() + time_budget
+    while _threads:
+        _threads.pop().join(max(0.0, deadline - time.monotonic()))
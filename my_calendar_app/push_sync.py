@@ -0,0 +1,201 @@
+import time
+import uuid
+import queue
+import secrets
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+from googleapiclient.errors import HttpError
+
+# 通知チャネルの有効期間（秒）と、期限の何秒前に張り直すか
+CHANNEL_TTL_SECONDS = 24 * 60 * 60
+RENEW_MARGIN_SECONDS = 10 * 60
+
+# 通知を受け取るローカルのHTTPサーバーの既定の待ち受けアドレスとポート
+RECEIVER_HOST = '127.0.0.1'
+RECEIVER_PORT = 8765
+
+# 通知が続けて届いたときに、まとめて1回の取得にするため待つ時間（秒）
+NOTIFICATION_SETTLE_SECONDS = 1.0
+
+def open_channel(service: any, calendar_id: str, address: str, token: str,
+                 ttl: int = CHANNEL_TTL_SECONDS) -> Dict:
+    """
+    カレンダーの変更を通知するチャネルを登録（events().watch）
+
+    Args:
+        service: Google Calendar APIサービスインスタンス
+        calendar_id: カレンダーID
+        address: 通知の送り先（Google Calendarから届くHTTPSのURL）
+        token: 通知に付けて送り返される合言葉（受信側で本物の通知か確かめる）
+        ttl: チャネルの有効期間（秒）
+
+    Returns:
+        Dict: 登録したチャネル（id, resourceId, expiration（ミリ秒）など）
+    """
+    body = {'id': str(uuid.uuid4()), 'type': 'web_hook', 'address': address, 'token': token,
+            'params': {'ttl': str(int(ttl))}}
+    return service.events().watch(calendarId=calendar_id, body=body).execute()
+
+def close_channel(service: any, channel: Dict) -> None:
+    """
+    チャネルの通知を止める（既に期限切れの場合は何もしない）
+
+    Args:
+        service: Google Calendar APIサービスインスタンス
+        channel: open_channel()で登録したチャネル
+    """
+    try:
+        service.channels().stop(body={'id': channel['id'], 'resourceId': channel['resourceId']}).execute()
+    except HttpError as error:
+        if error.status_code != 404:
+            raise
+
+def channel_expiration(channel: Dict, now: float) -> float:
+    """チャネルの期限（UNIX時刻、秒）。期限が返されなかった場合は有効期間から計算する"""
+    expiration = channel.get('expiration')
+    return int(expiration) / 1000 if expiration else now + CHANNEL_TTL_SECONDS
+
+class _NotificationHandler(BaseHTTPRequestHandler):
+    """通知のPOSTを受け取り、NotificationReceiverに渡す"""
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        accepted = self.server.receiver.accept(self.headers)
+        # 知らないチャネルの通知を拒否すると、Google Calendarはそのチャネルの通知を止める
+        self.send_response(200 if accepted else 403)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+class NotificationReceiver:
+    """
+    Google Calendarからの変更通知を受け取るローカルのHTTPサーバー
+
+    登録中のチャネルIDと合言葉が一致する通知だけをnotificationsに入れる。
+    Google Calendarが送るのと同じヘッダーでPOSTすれば、公開のURLがなくても試せる。
+    """
+
+    def __init__(self, host: str = RECEIVER_HOST, port: int = RECEIVER_PORT, token: Optional[str] = None):
+        self.token = token or secrets.token_urlsafe(24)
+        self.notifications: "queue.Queue[Dict]" = queue.Queue()
+        self._channels = set()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _NotificationHandler)
+        self._server.receiver = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """待ち受けているURL"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def allow(self, channel_id: str) -> None:
+        """チャネルの通知を受け付ける"""
+        with self._lock:
+            self._channels.add(channel_id)
+
+    def revoke(self, channel_id: str) -> None:
+        """チャネルの通知を受け付けない"""
+        with self._lock:
+            self._channels.discard(channel_id)
+
+    def accept(self, headers) -> bool:
+        """
+        通知のヘッダーを確かめて受け付ける
+
+        Args:
+            headers: X-Goog-Channel-ID, X-Goog-Channel-Token, X-Goog-Resource-Stateなどのヘッダー
+
+        Returns:
+            bool: 受け付けたかどうか
+        """
+        channel_id = headers.get('X-Goog-Channel-ID')
+        with self._lock:
+            known = channel_id in self._channels
+        if not known or headers.get('X-Goog-Channel-Token') != self.token:
+            return False
+        self.notifications.put({'channel_id': channel_id,
+                                'state': headers.get('X-Goog-Resource-State'),
+                                'number': headers.get('X-Goog-Message-Number')})
+        return True
+
+    def start(self) -> 'NotificationReceiver':
+        """バックグラウンドのスレッドで待ち受けを始める"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name='calendar-notifications', daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        """待ち受けを終える"""
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+    def __enter__(self) -> 'NotificationReceiver':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+def watch_changes(receiver: NotificationReceiver, subscribe: Callable[[], Dict],
+                  unsubscribe: Callable[[Dict], None], sync: Callable[[], any],
+                  renew_margin: float = RENEW_MARGIN_SECONDS,
+                  settle: float = NOTIFICATION_SETTLE_SECONDS,
+                  clock: Callable[[], float] = time.time) -> None:
+    """
+    通知チャネルを張り、変更の通知が届くたびにsync()を呼び出す（Ctrl+Cで終了）
+
+    チャネルを張った直後に一度sync()を呼び出し、張る前の変更も取りこぼさない。
+    続けて届いた通知はsettle秒待ってまとめて1回のsync()にする。チャネルは期限の
+    renew_margin秒前に新しいものを張ってから古いものを止める（張り替えの間の通知も受け付ける）。
+
+    Args:
+        receiver: 待ち受け中のNotificationReceiver
+        subscribe: チャネルを登録して返す関数（open_channel()）
+        unsubscribe: チャネルの通知を止める関数（close_channel()）
+        sync: 変更分を取得してローカルに反映する関数
+        renew_margin: 期限の何秒前にチャネルを張り直すか
+        settle: 通知をまとめるため待つ時間（秒）
+        clock: 現在のUNIX時刻（秒）を返す関数
+    """
+    channel = subscribe()
+    receiver.allow(channel['id'])
+    expires_at = channel_expiration(channel, clock())
+    try:
+        sync()
+        while True:
+            remaining = expires_at - renew_margin - clock()
+            if remaining <= 0:
+                renewed = subscribe()
+                receiver.allow(renewed['id'])
+                receiver.revoke(channel['id'])
+                unsubscribe(channel)
+                channel = renewed
+                expires_at = channel_expiration(channel, clock())
+                continue
+
+            try:
+                notification = receiver.notifications.get(timeout=remaining)
+            except queue.Empty:
+                continue
+            if notification['state'] == 'sync':
+                # チャネルを張った直後に届く確認の通知
+                continue
+            time.sleep(settle)
+            while True:
+                try:
+                    receiver.notifications.get_nowait()
+                except queue.Empty:
+                    break
+            sync()
+    finally:
+        receiver.revoke(channel['id'])
+        unsubscribe(channel)
@@ -0,0 +1,286 @@
+import heapq
+import time
+import shutil
+import calendar
+import subprocess
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional
+
+from local_data_manager import content_hash, load_events, storage_stamp
+
+# 予定の何分前に通知するか
+REMINDER_LEAD_MINUTES = 10
+
+# events.ymlの変更を確認する間隔（秒）。通知はこの間隔によらず通知時刻に起きて行う
+WATCH_POLL_SECONDS = 60.0
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M"
+
+class Reminder(NamedTuple):
+    """通知する予定（定期イベントは個々の予定）"""
+    remind_at: datetime
+    start: datetime
+    end: datetime
+    event_id: str
+    title: str
+
+def iter_occurrences(event: Dict, after: datetime) -> Iterator[datetime]:
+    """
+    イベントのafterより後に始まる予定の開始日時を順に返す
+
+    定期イベントは必要になった分だけ計算するため、終わりのない繰り返しでも使える。
+    monthlyは開始日と同じ日付がない月を飛ばす（Google Calendarと同じ）。
+
+    Args:
+        event: ローカル形式のイベント
+        after: この日時より後（含まない）に始まる予定だけを返す
+
+    Yields:
+        datetime: 予定の開始日時
+    """
+    try:
+        start = datetime.strptime(event['start_datetime'], DATETIME_FORMAT)
+    except (KeyError, TypeError, ValueError):
+        return
+    recurrence = event.get('recurrence')
+
+    if recurrence in ('daily', 'weekly', 'weekday'):
+        step = timedelta(days=7 if recurrence == 'weekly' else 1)
+        # afterより前の繰り返しは計算せずに飛ばす
+        skip = max(0, (after - start) // step)
+        occurrence = start + skip * step
+        while True:
+            if occurrence > after and (recurrence != 'weekday' or occurrence.weekday() < 5):
+                yield occurrence
+            occurrence += step
+    elif recurrence == 'monthly':
+        months = max(0, (after.year - start.year) * 12 + after.month - start.month)
+        while True:
+            year, month = divmod(start.month - 1 + months, 12)
+            year += start.year
+            if start.day <= calendar.monthrange(year, month + 1)[1]:
+                occurrence = start.replace(year=year, month=month + 1)
+                if occurrence > after:
+                    yield occurrence
+            months += 1
+    elif start > after:
+        yield start
+
+class ReminderScheduler:
+    """
+    次に通知する予定を最小ヒープで管理するスケジューラ
+
+    ヒープにはイベントごとに次の予定を1件だけ入れ、通知したら同じイベントの次の予定を
+    入れ直す。変更・削除されたイベントの古いエントリはヒープから探して消さず、
+    取り出したときに版数を見て捨てる。
+    """
+
+    def __init__(self, lead: timedelta = timedelta(minutes=REMINDER_LEAD_MINUTES)):
+        self.lead = lead
+        self._heap: List[tuple] = []
+        self._iterators: Dict[str, Iterator[datetime]] = {}
+        self._events: Dict[str, Dict] = {}
+        self._hashes: Dict[str, str] = {}
+        self._versions: Dict[str, int] = {}
+        self._notified: Dict[str, datetime] = {}
+        self._sequence = 0
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def _entry(self, event_id: str, now: datetime, floor: Optional[datetime] = None) -> Optional[tuple]:
+        """イベントの次の予定のヒープのエントリを作成（次の予定がなければNone。通知時刻はfloor（省略時はnow）以降にする）"""
+        iterator = self._iterators.get(event_id)
+        if iterator is None:
+            # 通知時刻を過ぎていても、まだ始まっていない予定は通知する。
+            # 変更されたイベントでも、通知済みの予定は通知し直さない
+            after = max(now, self._notified.get(event_id, now))
+            iterator = self._iterators[event_id] = iter_occurrences(self._events[event_id], after)
+        start = next(iterator, None)
+        if start is None:
+            return None
+        self._sequence += 1
+        return (max(start - self.lead, now if floor is None else floor), self._sequence, self._versions[event_id], event_id, start)
+
+    def load(self, events: List[Dict], now: datetime) -> None:
+        """
+        イベントの一覧からヒープを作り直す
+
+        Args:
+            events: ローカル形式のイベント
+            now: 現在の日時
+        """
+        self._heap = []
+        self._iterators = {}
+        self._events = {event['id']: event for event in events if event.get('id')}
+        self._hashes = {event_id: content_hash(event) for event_id, event in self._events.items()}
+        self._versions = {event_id: self._versions.get(event_id, 0) + 1 for event_id in self._events}
+        for event_id in self._events:
+            entry = self._entry(event_id, now)
+            if entry is not None:
+                self._heap.append(entry)
+        heapq.heapify(self._heap)
+
+    def update(self, events: List[Dict], now: datetime) -> Dict[str, int]:
+        """
+        変更後のイベントの一覧と比べて、追加・変更・削除されたイベントの分だけヒープを更新
+
+        Args:
+            events: 変更後のローカル形式のイベント
+            now: 現在の日時
+
+        Returns:
+            Dict[str, int]: 追加・変更・削除したイベントの数（'added', 'changed', 'removed'）
+        """
+        latest = {event['id']: event for event in events if event.get('id')}
+        counts = {'added': 0, 'changed': 0, 'removed': 0}
+        for event_id in list(self._events):
+            if event_id not in latest:
+                del self._events[event_id], self._hashes[event_id]
+                self._iterators.pop(event_id, None)
+                self._notified.pop(event_id, None)
+                self._versions[event_id] += 1
+                counts['removed'] += 1
+
+        for event_id, event in latest.items():
+            digest = content_hash(event)
+            if self._hashes.get(event_id) == digest:
+                continue
+            counts['changed' if event_id in self._events else 'added'] += 1
+            self._events[event_id] = event
+            self._hashes[event_id] = digest
+            self._versions[event_id] = self._versions.get(event_id, 0) + 1
+            self._iterators.pop(event_id, None)
+            entry = self._entry(event_id, now)
+            if entry is not None:
+                heapq.heappush(self._heap, entry)
+
+        # 古いエントリが増えすぎたら作り直す
+        if len(self._heap) > 2 * len(self._events) + 64:
+            self._heap = [entry for entry in self._heap if self._is_current(entry)]
+            heapq.heapify(self._heap)
+        return counts
+
+    def _is_current(self, entry: tuple) -> bool:
+        """エントリが変更・削除前のイベントのものでないか"""
+        return self._versions.get(entry[3]) == entry[2] and entry[3] in self._events
+
+    def next_due(self) -> Optional[datetime]:
+        """次に通知する日時（通知する予定がなければNone）"""
+        while self._heap and not self._is_current(self._heap[0]):
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime, floor: Optional[datetime] = None) -> List[Reminder]:
+        """
+        通知時刻になった予定を取り出し、同じイベントの次の予定をヒープに入れる
+
+        Args:
+            now: 現在の日時
+            floor: 入れ直す予定の通知時刻の下限（省略時はnow。過ぎた通知をすぐ出すため。
+                先の期間をまとめて取り出すときは期間の開始を渡し、開始日時の順を保つ）
+
+        Returns:
+            List[Reminder]: 通知する予定（通知時刻順）
+        """
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            if not self._is_current(entry):
+                continue
+            remind_at, _, _, event_id, start = entry
+            event = self._events[event_id]
+            duration = self._duration(event)
+            due.append(Reminder(remind_at, start, start + duration, event_id, event.get('title', '')))
+            self._notified[event_id] = start
+            following = self._entry(event_id, now, floor)
+            if following is not None:
+                heapq.heappush(self._heap, following)
+        return due
+
+    @staticmethod
+    def _duration(event: Dict) -> timedelta:
+        """予定の長さ"""
+        try:
+            return (datetime.strptime(event['end_datetime'], DATETIME_FORMAT)
+                    - datetime.strptime(event['start_datetime'], DATETIME_FORMAT))
+        except (KeyError, TypeError, ValueError):
+            return timedelta(0)
+
+def upcoming(events: List[Dict], start: datetime, end: datetime) -> List[Reminder]:
+    """
+    期間内に始まる予定を開始日時順に返す（定期イベントは期間内の分だけ展開する）
+
+    Args:
+        events: ローカル形式のイベント
+        start: 期間の開始（含まない）
+        end: 期間の終了（含まない）
+
+    Returns:
+        List[Reminder]: 予定（remind_atは開始日時と同じ）
+    """
+    scheduler = ReminderScheduler(lead=timedelta(0))
+    scheduler.load(events, start)
+    return scheduler.pop_due(end - timedelta(microseconds=1), floor=start)
+
+def desktop_notify(title: str, message: str) -> bool:
+    """
+    デスクトップ通知を表示（notify-sendまたはosascriptがある場合のみ）
+
+    Returns:
+        bool: 通知できたかどうか
+    """
+    if shutil.which('notify-send'):
+        command = ['notify-send', title, message]
+    elif shutil.which('osascript'):
+        command = ['osascript', '-e', f'display notification {message!r} with title {title!r}']
+    else:
+        return False
+    try:
+        subprocess.run(command, check=False, timeout=5)
+        return True
+    except (OSError, subprocess.SubprocessError):
+        return False
+
+def watch_reminders(events_file: str, notify: Callable[[Reminder], None],
+                    lead: timedelta = timedelta(minutes=REMINDER_LEAD_MINUTES),
+                    poll_seconds: float = WATCH_POLL_SECONDS,
+                    clock: Callable[[], datetime] = datetime.now,
+                    sleep: Callable[[float], None] = time.sleep) -> None:
+    """
+    次の通知時刻まで眠り、予定の通知を続ける（Ctrl+Cで終了）
+
+    events.yml（分割保存の場合はシャード全体）の更新時刻と大きさはpoll_secondsごとに
+    確認し、変わったときだけ読み込み直して、変わったイベントの分だけヒープを更新する。
+    眠るのは次の通知時刻か次の確認時刻の早い方まで。
+
+    Args:
+        events_file: イベントファイルのパス
+        notify: 通知する予定を受け取る関数
+        lead: 予定の何分前に通知するか
+        poll_seconds: events.ymlの変更を確認する間隔（秒）
+        clock: 現在の日時を返す関数
+        sleep: 指定した秒数だけ待つ関数
+    """
+    scheduler = ReminderScheduler(lead)
+    stamp = storage_stamp(events_file)
+    now = clock()
+    scheduler.load(load_events(events_file), now)
+    next_check = now + timedelta(seconds=poll_seconds)
+
+    while True:
+        now = clock()
+        for reminder in scheduler.pop_due(now):
+            notify(reminder)
+
+        if now >= next_check:
+            next_check = now + timedelta(seconds=poll_seconds)
+            latest_stamp = storage_stamp(events_file)
+            if latest_stamp != stamp:
+                stamp = latest_stamp
+                scheduler.update(load_events(events_file), now)
+                continue
+
+        next_due = scheduler.next_due()
+        wake_at = next_check if next_due is None else min(next_due, next_check)
+        sleep(max(0.0, (wake_at - now).total_seconds()))
@@ -0,0 +1,146 @@
+import json
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from google_calendar_service import RECURRENCE_PATTERNS
+
+# runコマンドで使えるコマンドと、Google Calendarを変更するコマンド
+COMMANDS = ('add', 'update', 'delete', 'list')
+MUTATIONS = ('add', 'update', 'delete')
+
+# コマンドごとの必須の引数と省略できる引数（サブコマンドの引数と同じ名前）
+REQUIRED_ARGUMENTS = {
+    'add': ('start_datetime', 'end_datetime', 'title'),
+    'update': ('event_id',),
+    'delete': ('event_id',),
+    'list': (),
+}
+OPTIONAL_ARGUMENTS = {
+    'add': ('detail', 'recurrence', 'defer', 'idempotency_key'),
+    'update': ('title', 'start_datetime', 'end_datetime', 'detail', 'recurrence', 'defer'),
+    'delete': ('defer',),
+    'list': ('start', 'end', 'local'),
+}
+FLAG_ARGUMENTS = ('defer', 'local')
+
+# updateで変更できる項目
+UPDATE_FIELDS = ('title', 'start_datetime', 'end_datetime', 'detail', 'recurrence')
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M"
+DATE_FORMAT = "%Y-%m-%d"
+
+def _parse(value: str, date_format: str) -> Optional[datetime]:
+    """日時文字列を変換（形式が不正ならNone）"""
+    try:
+        return datetime.strptime(value, date_format)
+    except ValueError:
+        return None
+
+def validate_operation(operation: Dict) -> Optional[str]:
+    """
+    1件の操作の引数を検証
+
+    Args:
+        operation: commandと引数を持つ操作（引数名の"-"は"_"に置き換え済み）
+
+    Returns:
+        Optional[str]: エラーメッセージ。問題がなければNone
+    """
+    command = operation.get('command')
+    if command not in COMMANDS:
+        return f"不明なコマンドです: {command}（{', '.join(COMMANDS)}のいずれか）"
+
+    arguments = set(operation) - {'command'}
+    unknown = sorted(arguments - set(REQUIRED_ARGUMENTS[command]) - set(OPTIONAL_ARGUMENTS[command]))
+    if unknown:
+        return f"{command}では使えない引数です: {', '.join(unknown)}"
+    missing = [name for name in REQUIRED_ARGUMENTS[command] if operation.get(name) in (None, '')]
+    if missing:
+        return f"必須の引数がありません: {', '.join(missing)}"
+    for name in arguments:
+        value = operation[name]
+        if name in FLAG_ARGUMENTS:
+            if not isinstance(value, bool):
+                return f"{name}はtrueまたはfalseで指定してください"
+        elif value is not None and not isinstance(value, str):
+            return f"{name}は文字列で指定してください"
+
+    if command == 'list':
+        for name in ('start', 'end'):
+            if operation.get(name) and _parse(operation[name], DATE_FORMAT) is None:
+                return f"{name}の形式が不正です。'YYYY-MM-DD'の形式で指定してください"
+        return None
+    if command == 'delete':
+        return None
+
+    for name in ('start_datetime', 'end_datetime'):
+        if operation.get(name) and _parse(operation[name], DATETIME_FORMAT) is None:
+            return f"{name}の形式が不正です。'YYYY-MM-DD HH:MM'の形式で指定してください"
+    if operation.get('start_datetime') and operation.get('end_datetime'):
+        if _parse(operation['start_datetime'], DATETIME_FORMAT) >= _parse(operation['end_datetime'], DATETIME_FORMAT):
+            return "開始時刻は終了時刻より前である必要があります"
+    recurrences = list(RECURRENCE_PATTERNS) + (['none'] if command == 'update' else [])
+    if operation.get('recurrence') and operation['recurrence'] not in recurrences:
+        return f"recurrenceは{', '.join(recurrences)}のいずれかで指定してください"
+    if command == 'update' and not any(operation.get(field) for field in UPDATE_FIELDS):
+        return "更新する項目がありません"
+    return None
+
+def parse_operations(lines: Iterable[str]) -> Tuple[List[Dict], List[Dict]]:
+    """
+    JSON Lines形式の操作を読み込んで、すべて検証する
+
+    1行に1つ、{"command": "add", "start_datetime": ..., "end_datetime": ..., "title": ...}のように
+    サブコマンドと同じ名前の引数を持つオブジェクトを書く。空行と#で始まる行は読み飛ばす。
+    引数名の"-"は"_"と同じに扱う（"idempotency-key"など）。
+
+    Args:
+        lines: 操作の行
+
+    Returns:
+        Tuple[List[Dict], List[Dict]]: (行番号'line'を付けた操作のリスト, {'line', 'error'}のエラーのリスト)
+    """
+    operations, errors = [], []
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as error:
+            errors.append({'line': number, 'error': f"JSONとして読み込めません: {error}"})
+            continue
+        if not isinstance(data, dict):
+            errors.append({'line': number, 'error': "JSONのオブジェクトで指定してください"})
+            continue
+        operation = {name.replace('-', '_'): value for name, value in data.items()}
+        error = validate_operation(operation)
+        if error:
+            errors.append({'line': number, 'command': operation.get('command'), 'error': error})
+            continue
+        operation['line'] = number
+        operations.append(operation)
+    return operations, errors
+
+def schedule_rounds(operations: List[Dict]) -> List[List[int]]:
+    """
+    変更の操作を、まとめて1回のバッチリクエストで送信できる組に分ける
+
+    バッチリクエストの中のリクエストは順に実行されるとは限らないため、同じイベントへの
+    操作は前の操作より後の組に入れる。互いに関係しない操作はすべて最初の組に入る。
+
+    Args:
+        operations: event_idを持つ変更の操作（スクリプトの順）
+
+    Returns:
+        List[List[int]]: 組ごとの操作のインデックス（送信する順）
+    """
+    rounds: List[List[int]] = []
+    last_round: Dict[str, int] = {}
+    for index, operation in enumerate(operations):
+        round_index = last_round.get(operation['event_id'], -1) + 1
+        last_round[operation['event_id']] = round_index
+        if round_index == len(rounds):
+            rounds.append([])
+        rounds[round_index].append(index)
+    return rounds
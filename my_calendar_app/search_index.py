@@ -0,0 +1,285 @@
+import os
+import json
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Set
+
+from local_data_manager import load_events, storage_stamp
+
+# 日本語は単語の区切りがないため、文字2-gramで索引を作る
+NGRAM_SIZE = 2
+INDEX_VERSION = 1
+
+def index_path_for(events_file: str) -> str:
+    """
+    イベントファイルに対応する検索インデックスのパスを返す
+
+    Args:
+        events_file: イベントファイルのパス (例: "events.yml")
+
+    Returns:
+        str: 検索インデックスのパス (例: "events.search.json")
+    """
+    return f"{os.path.splitext(events_file)[0]}.search.json"
+
+def normalize_text(text: Optional[str]) -> str:
+    """全角・半角や大文字・小文字の違いを吸収した検索用の文字列を返す"""
+    return unicodedata.normalize('NFKC', text or '').lower()
+
+def ngrams(text: str, n: int = NGRAM_SIZE) -> Set[str]:
+    """
+    文字列の文字n-gramの集合を返す
+
+    Args:
+        text: 正規化済みの文字列
+        n: n-gramの長さ
+
+    Returns:
+        Set[str]: 空白を含まないn-gramの集合。n文字未満の語はそのまま1要素として含める
+    """
+    grams = set()
+    for word in text.split():
+        if len(word) < n:
+            grams.add(word)
+            continue
+        for i in range(len(word) - n + 1):
+            grams.add(word[i:i + n])
+    return grams
+
+def file_stamp(file_path: str) -> Optional[List[int]]:
+    """ファイルの更新時刻と大きさを返す（存在しない場合はNone）"""
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+def source_stamps(events_file: str, deleted_events_file: str) -> Dict[str, Optional[List[int]]]:
+    """
+    インデックスの元になるファイルの状態を返す
+
+    Args:
+        events_file: イベントファイルのパス
+        deleted_events_file: 削除済みイベントファイルのパス
+
+    Returns:
+        Dict[str, Optional[List[int]]]: 'events'のstorage_stamp()と'deleted'のfile_stamp()
+    """
+    return {'events': storage_stamp(events_file), 'deleted': file_stamp(deleted_events_file)}
+
+def new_index() -> Dict:
+    """空の検索インデックスを作成"""
+    return {'version': INDEX_VERSION, 'ngram': NGRAM_SIZE, 'sources': {}, 'docs': {}, 'postings': {}}
+
+def remove_from_index(index: Dict, event_id: str) -> None:
+    """
+    インデックスからイベントを取り除く
+
+    Args:
+        index: 検索インデックス
+        event_id: 取り除くイベントのID
+    """
+    doc = index['docs'].pop(event_id, None)
+    if doc is None:
+        return
+    for gram in ngrams(doc['text'], index['ngram']):
+        posting = index['postings'].get(gram)
+        if posting is not None:
+            posting.discard(event_id)
+            if not posting:
+                del index['postings'][gram]
+
+def add_to_index(index: Dict, event: Dict, source: str = 'events') -> None:
+    """
+    イベントのタイトルと詳細をインデックスに登録（登録済みなら置き換え）
+
+    Args:
+        index: 検索インデックス
+        event: ローカル形式のイベント
+        source: 'events'（現在のイベント）または'deleted'（削除済みイベント）
+    """
+    remove_from_index(index, event['id'])
+    text = normalize_text(f"{event.get('title') or ''}\n{event.get('detail') or ''}")
+    index['docs'][event['id']] = {
+        'title': event.get('title'),
+        'start_datetime': event.get('start_datetime'),
+        'end_datetime': event.get('end_datetime'),
+        'source': source,
+        'text': text
+    }
+    for gram in ngrams(text, index['ngram']):
+        index['postings'].setdefault(gram, set()).add(event['id'])
+
+def build_index(events: Iterable[Dict], deleted_events: Iterable[Dict] = ()) -> Dict:
+    """
+    イベントから検索インデックスを作成
+
+    Args:
+        events: 現在のイベント
+        deleted_events: 削除済みイベント
+
+    Returns:
+        Dict: 検索インデックス
+    """
+    index = new_index()
+    for event in deleted_events:
+        add_to_index(index, event, source='deleted')
+    # 同じIDが両方にある場合は現在のイベントを優先する
+    for event in events:
+        add_to_index(index, event, source='events')
+    return index
+
+def load_index(index_file: str) -> Optional[Dict]:
+    """
+    検索インデックスを読み込む
+
+    Args:
+        index_file: 検索インデックスのパス
+
+    Returns:
+        Optional[Dict]: 検索インデックス。存在しないか形式が古い場合はNone
+    """
+    try:
+        with open(index_file, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if index.get('version') != INDEX_VERSION or index.get('ngram') != NGRAM_SIZE:
+        return None
+    index['postings'] = {gram: set(ids) for gram, ids in index['postings'].items()}
+    return index
+
+def save_index(index_file: str, index: Dict) -> None:
+    """
+    検索インデックスを保存
+
+    Args:
+        index_file: 検索インデックスのパス
+        index: 検索インデックス
+    """
+    data = dict(index, postings={gram: sorted(ids) for gram, ids in index['postings'].items()})
+    tmp_file = f"{index_file}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_file, index_file)
+
+def load_or_build_index(events_file: str = "events.yml",
+                        deleted_events_file: str = "deletedevents.yml") -> Dict:
+    """
+    最新の検索インデックスを返す
+
+    インデックスが存在しないか、イベントファイルが手作業などで変更されている場合は作り直して保存する。
+
+    Args:
+        events_file: イベントファイルのパス
+        deleted_events_file: 削除済みイベントファイルのパス
+
+    Returns:
+        Dict: 検索インデックス
+    """
+    index_file = index_path_for(events_file)
+    stamps = source_stamps(events_file, deleted_events_file)
+    index = load_index(index_file)
+    if index is not None and index['sources'] == stamps:
+        return index
+
+    index = build_index(load_events(events_file), load_events(deleted_events_file, snapshot=False))
+    index['sources'] = stamps
+    save_index(index_file, index)
+    return index
+
+def update_index(events_file: str, deleted_events_file: str,
+                 previous_stamps: Dict[str, Optional[List[int]]],
+                 upserts: Iterable[Dict] = (), removals: Iterable[str] = (),
+                 archived: Iterable[Dict] = ()) -> None:
+    """
+    ローカルの変更を保存済みの検索インデックスに反映
+
+    インデックスがまだ作られていなければ何もしない（次回の検索時に作られる）。
+    変更前のファイルの状態がインデックスと一致しない場合は、差分を当てずに
+    次回の検索時に作り直させる。
+
+    Args:
+        events_file: イベントファイルのパス
+        deleted_events_file: 削除済みイベントファイルのパス
+        previous_stamps: 変更前のsource_stamps()
+        upserts: 追加・更新したイベント
+        removals: イベントファイルから削除したイベントのID
+        archived: 削除済みイベントファイルに追加したイベント
+    """
+    index_file = index_path_for(events_file)
+    index = load_index(index_file)
+    if index is None:
+        return
+    if index['sources'] != previous_stamps:
+        os.remove(index_file)
+        return
+
+    for event_id in removals:
+        remove_from_index(index, event_id)
+    for event in archived:
+        add_to_index(index, event, source='deleted')
+    for event in upserts:
+        add_to_index(index, event, source='events')
+    index['sources'] = source_stamps(events_file, deleted_events_file)
+    try:
+        save_index(index_file, index)
+    except OSError:
+        # 保存できなければ古いインデックスを残さず、次回の検索時に作り直させる
+        if os.path.exists(index_file):
+            os.remove(index_file)
+
+def search(index: Dict, query: str, include_deleted: bool = False) -> List[Dict]:
+    """
+    タイトルと詳細にクエリを含むイベントを検索
+
+    空白で区切った語はすべてを含むもの（AND検索）を返す。
+
+    Args:
+        index: 検索インデックス
+        query: 検索語
+        include_deleted: Trueなら削除済みイベントも対象にする
+
+    Returns:
+        List[Dict]: id, title, start_datetime, end_datetime, sourceを持つイベントの開始日時順のリスト
+    """
+    terms = normalize_text(query).split()
+    if not terms:
+        return []
+
+    n = index['ngram']
+    postings = index['postings']
+    candidates: Optional[Set[str]] = None
+    for term in terms:
+        if len(term) < n:
+            # 短い語はその文字を含むn-gramの和集合を候補にする
+            ids = set()
+            for gram, gram_ids in postings.items():
+                if term in gram:
+                    ids |= gram_ids
+        else:
+            grams = sorted(ngrams(term, n), key=lambda gram: len(postings.get(gram, ())))
+            ids = set(postings.get(grams[0], ()))
+            for gram in grams[1:]:
+                if not ids:
+                    break
+                ids &= postings.get(gram, set())
+        candidates = ids if candidates is None else candidates & ids
+        if not candidates:
+            return []
+
+    results = []
+    for event_id in candidates:
+        doc = index['docs'][event_id]
+        if doc['source'] == 'deleted' and not include_deleted:
+            continue
+        # n-gramの一致だけでは語順を確認できないので本文で確かめる
+        if all(term in doc['text'] for term in terms):
+            results.append({
+                'id': event_id,
+                'title': doc['title'],
+                'start_datetime': doc['start_datetime'],
+                'end_datetime': doc['end_datetime'],
+                'source': doc['source']
+            })
+    results.sort(key=lambda doc: doc['start_datetime'] or '')
+    return results
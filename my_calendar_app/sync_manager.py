@@ -0,0 +1,290 @@
+import os
+import json
+from typing import Dict, Iterable, List
+from googleapiclient.errors import HttpError
+
+from local_data_manager import content_hash
+from google_calendar_service import (
+    build_event_body,
+    build_patch_body,
+    execute_batch,
+    to_local_event,
+    PAGE_SIZE
+)
+
+# 一覧取得時にIDとetagだけを受け取るためのフィールド指定
+ETAG_LIST_FIELDS = 'items(id,etag,status,recurringEventId),nextPageToken,nextSyncToken'
+
+# 競合時の解決方針
+POLICIES = ('remote', 'local')
+
+def sync_state_path_for(events_file: str) -> str:
+    """
+    イベントファイルに対応する同期状態ファイルのパスを返す
+
+    Args:
+        events_file: イベントファイルのパス (例: "events.yml")
+
+    Returns:
+        str: 同期状態ファイルのパス (例: "events.sync.json")
+    """
+    return f"{os.path.splitext(events_file)[0]}.sync.json"
+
+def load_sync_state(state_file: str) -> Dict:
+    """
+    前回の同期状態を読み込む
+
+    Args:
+        state_file: 同期状態ファイルのパス
+
+    Returns:
+        Dict: sync_token（次回の差分取得用トークン）と、イベントIDから
+            {'etag': Google Calendar上のetag, 'hash': 同期時の内容のハッシュ値}への辞書events
+    """
+    if not os.path.exists(state_file):
+        return {'sync_token': None, 'events': {}}
+    with open(state_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_sync_state(state_file: str, state: Dict) -> None:
+    """
+    同期状態を保存
+
+    Args:
+        state_file: 同期状態ファイルのパス
+        state: 同期状態
+    """
+    tmp_file = f"{state_file}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_file, state_file)
+
+def fetch_remote_changes(service: any, calendar_id: str, state: Dict) -> Dict:
+    """
+    前回の同期以降にGoogle Calendar上で変わったイベントを取得
+
+    同期トークンがあれば変更分だけを取得する。トークンがないか失効している場合は
+    IDとetagだけの一覧を取得し、etagが前回と異なるイベントだけ本体をバッチリクエストで取得する。
+    定期イベントの個別の予定（recurringEventIdを持つもの）は対象外。
+
+    Args:
+        service: Google Calendar APIサービスインスタンス
+        calendar_id: カレンダーID
+        state: load_sync_state()の同期状態
+
+    Returns:
+        Dict: 以下のキーを持つ結果
+            changed: イベントIDから変更後のイベント（削除された場合はNone）への辞書
+            sync_token: 次回の差分取得用トークン
+            full: 一覧の全件取得を行ったかどうか
+    """
+    known = state.get('events', {})
+    events_api = service.events()
+
+    if state.get('sync_token'):
+        params = {'calendarId': calendar_id, 'syncToken': state['sync_token'], 'maxResults': PAGE_SIZE}
+        changed = {}
+        try:
+            while True:
+                result = events_api.list(**params).execute()
+                for item in result.get('items', []):
+                    if item.get('recurringEventId'):
+                        continue
+                    if item.get('status') == 'cancelled':
+                        changed[item['id']] = None
+                    elif known.get(item['id'], {}).get('etag') != item.get('etag'):
+                        changed[item['id']] = item
+                if not result.get('nextPageToken'):
+                    return {'changed': changed, 'sync_token': result.get('nextSyncToken'), 'full': False}
+                params['pageToken'] = result['nextPageToken']
+        except HttpError as error:
+            # 同期トークンが失効している場合（410 Gone）は全件取得に切り替える
+            if error.status_code != 410:
+                raise
+
+    params = {'calendarId': calendar_id, 'maxResults': PAGE_SIZE, 'fields': ETAG_LIST_FIELDS}
+    remote_etags = {}
+    while True:
+        result = events_api.list(**params).execute()
+        for item in result.get('items', []):
+            if item.get('recurringEventId') or item.get('status') == 'cancelled':
+                continue
+            remote_etags[item['id']] = item.get('etag')
+        if not result.get('nextPageToken'):
+            sync_token = result.get('nextSyncToken')
+            break
+        params['pageToken'] = result['nextPageToken']
+
+    stale_ids = [event_id for event_id, etag in remote_etags.items()
+                 if known.get(event_id, {}).get('etag') != etag]
+    changed = {event_id: None for event_id in known if event_id not in remote_etags}
+    responses = execute_batch(service, [
+        events_api.get(calendarId=calendar_id, eventId=event_id) for event_id in stale_ids
+    ])
+    for event_id, (event, error) in zip(stale_ids, responses):
+        if error is not None:
+            # 一覧の取得後に削除されたイベントは削除として扱う
+            if isinstance(error, HttpError) and error.status_code in (404, 410):
+                changed[event_id] = None
+                continue
+            raise error
+        changed[event_id] = event
+    return {'changed': changed, 'sync_token': sync_token, 'full': True}
+
+def plan_reconcile(local_events: List[Dict], remote: Dict, state: Dict, policy: str = 'remote',
+                   skip_ids: Iterable[str] = ()) -> Dict:
+    """
+    ローカルとGoogle Calendarの差分から、それぞれに反映する変更を決める
+
+    片方だけが変わったイベントはもう片方に反映し、両方が異なる内容に変わった
+    イベントはpolicyに従って解決する。同期状態がない初回は、ローカルだけにある
+    イベントをpolicyに関わらずGoogle Calendarに追加する（削除はしない）。
+
+    Args:
+        local_events: ローカルのイベント
+        remote: fetch_remote_changes()の結果
+        state: 前回の同期状態
+        policy: 競合時に'remote'ならGoogle Calendar、'local'ならローカルの内容を優先
+        skip_ids: 対象外にするイベントID（送信待ちキューにあるものなど）
+
+    Returns:
+        Dict: 以下のキーを持つ計画
+            local_upserts: ローカルに追加・上書きするイベント（ローカル形式）
+            local_deletes: ローカルから削除するイベントID
+            remote_inserts: Google Calendarに追加するローカルのイベント
+            remote_patches: Google Calendarを上書きするローカルのイベント
+            remote_deletes: Google Calendarから削除するイベントID
+            in_sync: 内容が一致していたイベントIDからetagへの辞書
+            forgotten: 両方で削除済みのため同期状態から取り除くイベントID
+            conflicts: 両方で変更されていたイベントID
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"不明な解決方針です: {policy}")
+
+    skip_ids = set(skip_ids)
+    known = state.get('events', {})
+    local_by_id = {event['id']: event for event in local_events if event['id'] not in skip_ids}
+    changed = remote['changed']
+    plan = {
+        'local_upserts': [], 'local_deletes': [], 'remote_inserts': [], 'remote_patches': [],
+        'remote_deletes': [], 'in_sync': {}, 'forgotten': [], 'conflicts': []
+    }
+
+    for event_id in sorted(set(local_by_id) | set(changed) | set(known)):
+        if event_id in skip_ids:
+            continue
+        local = local_by_id.get(event_id)
+        base_hash = known.get(event_id, {}).get('hash')
+        local_hash = content_hash(local) if local is not None else None
+        local_changed = local is not None and local_hash != base_hash
+
+        if event_id not in changed:
+            # Google Calendar側は前回から変わっていない
+            if local is None:
+                if base_hash is not None:
+                    plan['remote_deletes'].append(event_id)
+            elif base_hash is None:
+                # Google Calendarに存在しないローカルだけのイベント
+                if not known:
+                    # 初回の同期では、まだ送信していないイベントとみなす
+                    plan['remote_inserts'].append(local)
+                    continue
+                plan['conflicts'].append(event_id)
+                if policy == 'local':
+                    plan['remote_inserts'].append(local)
+                else:
+                    plan['local_deletes'].append(event_id)
+            elif local_changed:
+                plan['remote_patches'].append(local)
+            continue
+
+        remote_event = changed[event_id]
+        if remote_event is None:
+            # Google Calendar側で削除された
+            if local is None:
+                plan['forgotten'].append(event_id)
+            elif not local_changed:
+                plan['local_deletes'].append(event_id)
+            else:
+                plan['conflicts'].append(event_id)
+                if policy == 'local':
+                    plan['remote_inserts'].append(local)
+                else:
+                    plan['local_deletes'].append(event_id)
+            continue
+
+        remote_local = to_local_event(remote_event)
+        remote_hash = content_hash(remote_local)
+        if local is None:
+            if base_hash is None:
+                plan['local_upserts'].append(dict(remote_local, etag=remote_event.get('etag')))
+            elif remote_hash == base_hash:
+                # ローカルで削除され、Google Calendar側の内容は変わっていない
+                plan['remote_deletes'].append(event_id)
+            else:
+                plan['conflicts'].append(event_id)
+                if policy == 'local':
+                    plan['remote_deletes'].append(event_id)
+                else:
+                    plan['local_upserts'].append(dict(remote_local, etag=remote_event.get('etag')))
+        elif remote_hash == local_hash:
+            plan['in_sync'][event_id] = remote_event.get('etag')
+        elif not local_changed:
+            plan['local_upserts'].append(dict(remote_local, etag=remote_event.get('etag')))
+        elif remote_hash == base_hash:
+            plan['remote_patches'].append(local)
+        else:
+            plan['conflicts'].append(event_id)
+            if policy == 'local':
+                plan['remote_patches'].append(local)
+            else:
+                plan['local_upserts'].append(dict(remote_local, etag=remote_event.get('etag')))
+
+    return plan
+
+def apply_remote_plan(service: any, calendar_id: str, plan: Dict) -> Dict:
+    """
+    計画のうちGoogle Calendarへの変更をバッチリクエストで反映
+
+    Args:
+        service: Google Calendar APIサービスインスタンス
+        calendar_id: カレンダーID
+        plan: plan_reconcile()の計画
+
+    Returns:
+        Dict: 以下のキーを持つ結果
+            etags: 反映後のイベントIDからetagへの辞書
+            id_map: Google Calendarに追加し直したイベントの旧IDから新IDへの辞書
+            deleted: 削除できたイベントID
+            failed: (イベントID, 例外)のリスト
+    """
+    events_api = service.events()
+    entries = []
+    for event in plan['remote_inserts']:
+        body = build_event_body(event['start_datetime'], event['end_datetime'], event['title'],
+                                event.get('detail'), event.get('recurrence'))
+        entries.append(('insert', event['id'], events_api.insert(calendarId=calendar_id, body=body)))
+    for event in plan['remote_patches']:
+        # ローカルで表現できない繰り返しルールを消さないよう、recurrenceがNoneなら送らない
+        body = build_patch_body(event.get('title'), event.get('start_datetime'), event.get('end_datetime'),
+                                event.get('detail'), event.get('recurrence'))
+        if not event.get('detail'):
+            body['description'] = ''
+        entries.append(('patch', event['id'], events_api.patch(calendarId=calendar_id, eventId=event['id'], body=body)))
+    for event_id in plan['remote_deletes']:
+        entries.append(('delete', event_id, events_api.delete(calendarId=calendar_id, eventId=event_id)))
+
+    result = {'etags': {}, 'id_map': {}, 'deleted': [], 'failed': []}
+    responses = execute_batch(service, [request for _, _, request in entries])
+    for (op, event_id, _), (response, error) in zip(entries, responses):
+        status = getattr(error, 'status_code', None)
+        if error is not None and not (op == 'delete' and status in (404, 410)):
+            result['failed'].append((event_id, error))
+        elif op == 'delete':
+            result['deleted'].append(event_id)
+        elif op == 'insert':
+            result['id_map'][event_id] = response['id']
+            result['etags'][response['id']] = response.get('etag')
+        else:
+            result['etags'][event_id] = response.get('etag')
+    return result
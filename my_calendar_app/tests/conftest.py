@@ -1,6 +1,47 @@
 import pytest
 import os
 import yaml
+from unittest.mock import MagicMock
+
+
+class FakeBatch:
+    """new_batch_http_request()の戻り値を模したバッチ"""
+
+    def __init__(self, callback, responder):
+        self.callback = callback
+        self.responder = responder
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        for request_id, request in self.requests:
+            response, exception = self.responder(request)
+            self.callback(request_id, response, exception)
+
+@pytest.fixture
+def batch_service():
+    """
+    バッチリクエストを使うテスト用のGoogle Calendar APIサービスのモック
+
+    events()のinsert/get/patch/update/deleteは('メソッド名', キーワード引数)のタプルを返す。
+    service.respondにそのタプルを受け取って(レスポンス, 例外)を返す関数を設定して使う。
+    送信されたバッチはservice.batchesに記録される。
+    """
+    service = MagicMock()
+    service.batches = []
+
+    def new_batch(callback):
+        batch = FakeBatch(callback, lambda request: service.respond(request))
+        service.batches.append(batch)
+        return batch
+
+    service.new_batch_http_request.side_effect = new_batch
+    events_api = service.events.return_value
+    for method in ('insert', 'get', 'patch', 'update', 'delete'):
+        getattr(events_api, method).side_effect = lambda method=method, **kwargs: (method, kwargs)
+    return service
 
 @pytest.fixture
 def sample_event():
@@ -37,4 +78,19 @@ def sample_events_data():
             'end_datetime': '2024-03-20 19:00',
             'detail': 'プロジェクトBについて'
         }
-    ] 
\ No newline at end of file
+    ]
+
+def pytest_addoption(parser):
+    parser.addoption('--run-benchmarks', action='store_true', default=False,
+                     help='時間のかかる計測（benchmarkマーカーのテスト）も実行する')
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'benchmark: 件数を増やして時間とメモリの回帰を調べる計測（--run-benchmarksで実行）')
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--run-benchmarks'):
+        return
+    skip = pytest.mark.skip(reason='計測は--run-benchmarksを指定したときだけ実行する')
+    for item in items:
+        if 'benchmark' in item.keywords:
+            item.add_marker(skip)
@@ -0,0 +1,31 @@
+from datetime import datetime
+from ..availability import merge_intervals, working_windows, free_slots
+
+def at(value):
+    """"YYYY-MM-DD HH:MM"形式の日時を変換"""
+    return datetime.strptime(value, "%Y-%m-%d %H:%M")
+
+def test_merge_intervals():
+    """重なっている時間帯と接している時間帯をまとめるテスト"""
+    merged = merge_intervals([
+        (at('2024-03-18 13:00'), at('2024-03-18 14:00')),
+        (at('2024-03-18 09:00'), at('2024-03-18 10:00')),
+        (at('2024-03-18 09:30'), at('2024-03-18 10:30')),
+        (at('2024-03-18 10:30'), at('2024-03-18 11:00')),
+    ])
+
+    assert merged == [(at('2024-03-18 09:00'), at('2024-03-18 11:00')),
+                      (at('2024-03-18 13:00'), at('2024-03-18 14:00'))]
+
+def test_free_slots_common_to_all():
+    """2人の予定をまとめて、全員が空いている勤務時間を探すテスト"""
+    # 2024-03-22は金曜日、23日・24日は土日
+    windows = working_windows(at('2024-03-22 00:00'), at('2024-03-24 00:00'))
+    sato = [(at('2024-03-22 09:00'), at('2024-03-22 10:00')), (at('2024-03-22 17:50'), at('2024-03-22 19:00'))]
+    suzuki = [(at('2024-03-22 10:15'), at('2024-03-22 12:00'))]
+
+    slots = free_slots(sato + suzuki, windows, min_minutes=30)
+
+    # 10:00-10:15は30分未満なので含めない
+    assert slots == [(at('2024-03-22 12:00'), at('2024-03-22 17:50'))]
+    assert len(working_windows(at('2024-03-22 00:00'), at('2024-03-24 00:00'), weekdays_only=False)) == 3
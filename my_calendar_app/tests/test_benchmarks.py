@@ -0,0 +1,45 @@
+import pytest
+from ..benchmarks import synthetic_events, scaling_exponents, check_thresholds, run_benchmarks, EVENTS_PER_MONTH
+
+def test_synthetic_events_are_deterministic_and_realistic():
+    """同じ種なら同じイベントを、日本語と繰り返しを含めて生成するテスト"""
+    events = list(synthetic_events(1000))
+
+    assert events == list(synthetic_events(1000))
+    assert events != list(synthetic_events(1000, seed=1))
+    assert len({event['id'] for event in events}) == 1000
+    assert any('打ち合わせ' in event['title'] for event in events)
+    assert {event['recurrence'] for event in events} >= {None, 'daily', 'weekly', 'monthly', 'weekday'}
+    assert all(event['start_datetime'] < event['end_datetime'] for event in events)
+    # 1か月あたりの件数が一定になるよう、件数に応じて期間が延びる
+    months = {event['start_datetime'][:7] for event in events}
+    assert len(months) == pytest.approx(1000 / EVENTS_PER_MONTH, abs=1)
+
+def row(layout, operation, size, seconds, peak_bytes=None):
+    return {'layout': layout, 'operation': operation, 'size': size, 'seconds': seconds, 'peak_bytes': peak_bytes}
+
+def test_scaling_exponents_and_thresholds():
+    """時間の増え方、分割保存の速さ、1件あたりのメモリのピークを上限と比べるテスト"""
+    rows = [row('flat', 'load', 1000, 0.1, 1000 * 1024), row('flat', 'load', 10000, 1.0, 10000 * 4096),
+            row('sharded', 'add', 1000, 0.02), row('sharded', 'add', 10000, 0.4), row('flat', 'add', 10000, 1.0),
+            row('sharded', 'archive', 1000, 0.001), row('sharded', 'archive', 10000, 0.005)]
+
+    curves = {(curve['layout'], curve['operation']): curve['exponent'] for curve in scaling_exponents(rows)}
+
+    assert curves[('flat', 'load')] == pytest.approx(1.0)
+    assert curves[('sharded', 'add')] == pytest.approx(1.3, abs=0.01)
+    # 短すぎる計測は誤差が大きいため判定しない
+    assert curves[('sharded', 'archive')] is None
+    violations = check_thresholds(rows)
+    assert len(violations) == 3
+    assert violations[0].startswith('sharded/add: 1000件→10000件')
+    # 1ファイルの保存形式の2.5倍の速さしかない
+    assert violations[1].startswith('sharded/add: 10000件で')
+    assert violations[2].startswith('flat/load: 10000件')
+
+@pytest.mark.benchmark
+def test_local_data_manager_scaling():
+    """件数を10倍にしても、時間の増え方とメモリ使用量が上限を超えないことを確かめる"""
+    rows = run_benchmarks(sizes=(500, 5000), repeat=1)
+
+    assert check_thresholds(rows) == []
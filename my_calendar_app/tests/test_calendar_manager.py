@@ -1,6 +1,11 @@
+import os
+import json
 import pytest
+import yaml
 from unittest.mock import Mock, patch, MagicMock
-from ..calendar_manager import main, handle_add, handle_update, handle_delete, handle_list
+from googleapiclient.errors import HttpError
+from ..calendar_manager import main, handle_add, handle_update, handle_delete, handle_list, handle_import, handle_search, handle_flush, handle_reconcile, handle_free, handle_restore
+from ..calendar_manager import handle_bulk_delete, handle_shift, handle_run, parse_offset, EventStore
 
 @pytest.fixture
 def mock_google_service():
@@ -125,4 +130,462 @@ def test_handle_list(mock_google_service, mock_local_events, tmp_path):
 
             # 検証
             assert len(events) > 0
-            mock_google_service.events.return_value.list.assert_called_once() 
\ No newline at end of file
+            mock_google_service.events.return_value.list.assert_called_once()
+
+def test_handle_import_resumes_from_progress(mock_google_service, tmp_path):
+    """iCalendarインポートのテスト（バッチ追加と中断からの再開）"""
+    ics_file = tmp_path / "import.ics"
+    vevents = ''.join(
+        "BEGIN:VEVENT\r\n"
+        f"UID:uid-{i}\r\n"
+        f"DTSTART;TZID=Asia/Tokyo:2024032{i}T100000\r\n"
+        f"DTEND;TZID=Asia/Tokyo:2024032{i}T110000\r\n"
+        f"SUMMARY:イベント{i}\r\n"
+        "END:VEVENT\r\n"
+        for i in range(5)
+    )
+    ics_file.write_text(f"BEGIN:VCALENDAR\r\n{vevents}END:VCALENDAR\r\n", encoding='utf-8')
+    events_file = tmp_path / "events.yml"
+    batches = []
+
+    def add_events_batch(service, events, calendar_id=None):
+        batches.append([event['title'] for event in events])
+        if len(batches) == 2:
+            raise RuntimeError('通信断')
+        return [({'id': f"id-{event['title']}"}, None) for event in events]
+
+    with patch('my_calendar_app.calendar_manager.get_authenticated_service', return_value=mock_google_service), \
+            patch('my_calendar_app.calendar_manager.get_or_create_calendar', return_value='withai_calendar_id'), \
+            patch('my_calendar_app.calendar_manager.google_add_events_batch', side_effect=add_events_batch):
+        # 2回目のバッチで中断
+        with pytest.raises(SystemExit):
+            handle_import(str(ics_file), batch_size=2, events_file=str(events_file))
+        assert os.path.exists(f"{ics_file}.progress")
+
+        # 再実行すると中断したバッチから再開する
+        handle_import(str(ics_file), batch_size=2, events_file=str(events_file))
+
+    assert batches == [['イベント0', 'イベント1'], ['イベント2', 'イベント3'],
+                       ['イベント2', 'イベント3'], ['イベント4']]
+    assert not os.path.exists(f"{ics_file}.progress")
+    saved = yaml.safe_load(events_file.read_text(encoding='utf-8'))
+    assert [event['id'] for event in saved] == [f'id-イベント{i}' for i in range(5)]
+    assert saved[0]['start_datetime'] == '2024-03-20 10:00'
+
+def test_handle_import_retries_failed_events_with_same_ids(mock_google_service, tmp_path):
+    """失敗したイベントから送り直し、UIDのないイベントも同じIDで追加するテスト"""
+    ics_file = tmp_path / "import.ics"
+    vevents = ''.join(
+        "BEGIN:VEVENT\r\n"
+        + (f"UID:uid-{i}\r\n" if i != 1 else "")
+        + f"DTSTART;TZID=Asia/Tokyo:2024032{i}T100000\r\n"
+        f"DTEND;TZID=Asia/Tokyo:2024032{i}T110000\r\n"
+        f"SUMMARY:イベント{i}\r\n"
+        "END:VEVENT\r\n"
+        for i in range(4)
+    )
+    ics_file.write_text(f"BEGIN:VCALENDAR\r\n{vevents}END:VCALENDAR\r\n", encoding='utf-8')
+    events_file = tmp_path / "events.yml"
+    sent = []
+
+    def add_events_batch(service, events, calendar_id=None):
+        sent.append([event['id'] for event in events])
+        # 1回目はUIDのないイベント1だけ失敗する
+        return [(None, RuntimeError('一時的なエラー')) if len(sent) == 1 and event['title'] == 'イベント1'
+                else ({'id': event['id']}, None) for event in events]
+
+    with patch('my_calendar_app.calendar_manager.get_authenticated_service', return_value=mock_google_service), \
+            patch('my_calendar_app.calendar_manager.get_or_create_calendar', return_value='withai_calendar_id'), \
+            patch('my_calendar_app.calendar_manager.google_add_events_batch', side_effect=add_events_batch):
+        handle_import(str(ics_file), batch_size=2, events_file=str(events_file))
+        # 失敗したイベントの手前までの進捗が残る
+        assert os.path.exists(f"{ics_file}.progress")
+
+        handle_import(str(ics_file), batch_size=2, events_file=str(events_file))
+
+    assert len(sent) == 4
+    assert sent[2] == sent[0][1:] + sent[1][:1]
+    assert sent[3] == sent[1][1:]
+    assert not os.path.exists(f"{ics_file}.progress")
+    saved = yaml.safe_load(events_file.read_text(encoding='utf-8'))
+    assert sorted(event['title'] for event in saved) == [f'イベント{i}' for i in range(4)]
+
+def test_handle_search(tmp_path, capsys):
+    """ローカル検索のテスト（APIを呼び出さない）"""
+    events_file = tmp_path / "events.yml"
+    deleted_events_file = tmp_path / "deletedevents.yml"
+    events_file.write_text(yaml.dump([{
+        'id': 'event_1',
+        'title': 'Officeのプロダクトキー確認',
+        'start_datetime': '2024-03-21 10:00',
+        'end_datetime': '2024-03-21 11:00',
+        'detail': None
+    }], allow_unicode=True), encoding='utf-8')
+
+    with patch('my_calendar_app.calendar_manager.get_authenticated_service') as mock_auth:
+        results = handle_search('プロダクトキー', events_file=str(events_file),
+                                deleted_events_file=str(deleted_events_file))
+
+    assert [result['id'] for result in results] == ['event_1']
+    assert 'Officeのプロダクトキー確認' in capsys.readouterr().out
+    mock_auth.assert_not_called()
+
+def test_handle_list_local(tmp_path):
+    """ローカルのイベントから期間内のものを開始日時順に表示するテスト（APIを呼び出さない）"""
+    events_file = tmp_path / "events.yml"
+    events_file.write_text(yaml.dump([
+        {'id': f'event_{day}', 'title': f'{day}日の予定', 'start_datetime': f'2024-03-{day:02d} 10:00',
+         'end_datetime': f'2024-03-{day:02d} 11:00', 'detail': None}
+        for day in (25, 5, 20, 21)
+    ], allow_unicode=True), encoding='utf-8')
+
+    with patch('my_calendar_app.calendar_manager.get_authenticated_service') as mock_auth:
+        events = handle_list('2024-03-20', '2024-03-21', events_file=str(events_file), from_local=True)
+
+    assert [event['id'] for event in events] == ['event_20', 'event_21']
+    mock_auth.assert_not_called()
+
+def test_handle_list_prefetch_history_is_per_profile():
+    """先読みの履歴をプロファイルごとのファイルに記録するテスト"""
+    with patch('my_calendar_app.calendar_manager.get_authenticated_service'), \
+            patch('my_calendar_app.calendar_manager.google_list_events', return_value=[]), \
+            patch('my_calendar_app.calendar_manager.response_cache_enabled', return_value=True), \
+            patch('my_calendar_app.calendar_manager.start_prefetch') as mock_start, \
+            patch('my_calendar_app.calendar_manager.record_request',
+                  return_value=[{'start': '2024-03-18', 'end': '2024-03-24'}]) as mock_record:
+        handle_list('2024-03-18', '2024-03-24', prefetch=2, profiles=['sato'])
+
+    assert mock_record.call_args.kwargs['history_file'] == os.path.join('profiles', 'sato', '.calendar_prefetch.json')
+    assert mock_start.call_args.args[1] == [('2024-03-25', '2024-03-31'), ('2024-04-01', '2024-04-07')]
+
+def test_offline_add_is_queued_and_flushed(tmp_path):
+    """接続できないときの追加が送信待ちになり、flushで送信されるテスト"""
+    events_file = tmp_path / "events.yml"
+    deleted_events_file = tmp_path / "deletedevents.yml"
+
+    with patch('my_calendar_app.calendar_manager.get_authenticated_service',
+               side_effect=ConnectionError('network is unreachable')):
+        handle_add('2024-03-20 15:00', '2024-03-20 16:00', 'オフライン会議',
+                   events_file=str(events_file), deleted_events_file=str(deleted_events_file))
+        handle_update(yaml.safe_load(events_file.read_text(encoding='utf-8'))[0]['id'], new_title='変更後',
+                      events_file=str(events_file), deleted_events_file=str(deleted_events_file))
+
+    saved = yaml.safe_load(events_file.read_text(encoding='utf-8'))
+    assert saved[0]['title'] == '変更後'
+    queue = yaml.safe_load((tmp_path / "events.queue.yml").read_text(encoding='utf-8'))
+    assert [(entry['op'], entry['id'], entry['data']['title']) for entry in queue] == [
+        ('add', saved[0]['id'], '変更後')]
+
+    # 送信時も同じIDで作成されるので、ローカルのIDはそのまま
+    flush_result = {'sent': queue, 'conflicts': [], 'failed': [], 'remaining': []}
+    with patch('my_calendar_app.calendar_manager.get_authenticated_service'), \
+            patch('my_calendar_app.calendar_manager.get_or_create_calendar', return_value='withai_calendar_id'), \
+            patch('my_calendar_app.calendar_manager.flush_queue', return_value=flush_result) as mock_flush:
+        handle_flush(events_file=str(events_file), deleted_events_file=str(deleted_events_file))
+
+    assert mock_flush.call_args.args[1] == queue
+    assert yaml.safe_load(events_file.read_text(encoding='utf-8'))[0]['id'] == saved[0]['id']
+    assert not (tmp_path / "events.queue.yml").exists()
+
+def test_remote_failure_leaves_local_unchanged(tmp_path):
+    """Google Calendarへの反映が失敗したらローカルを書き換えないテスト"""
+    events_file = tmp_path / "events.yml"
+    original = [{'id': 'event_1', 'title': '元のタイトル', 'start_datetime': '2024-03-20 15:00',
+                 'end_datetime': '2024-03-20 16:00', 'detail': None, 'recurrence': None}]
+    events_file.write_text(yaml.dump(original, allow_unicode=True), encoding='utf-8')
+    resp = MagicMock()
+    resp.status = 500
+    error = HttpError(resp, b'{}')
+
+    with patch('my_calendar_app.calendar_manager.get_authenticated_service'), \
+            patch('my_calendar_app.calendar_manager.google_update_event', side_effect=error), \
+            patch('my_calendar_app.calendar_manager.google_delete_event', side_effect=error):
+        with pytest.raises(SystemExit):
+            handle_update('event_1', new_title='変更後', events_file=str(events_file),
+                          deleted_events_file=str(tmp_path / "deletedevents.yml"))
+        with pytest.raises(SystemExit):
+            handle_delete('event_1', events_file=str(events_file),
+                          deleted_events_file=str(tmp_path / "deletedevents.yml"))
+
+    assert yaml.safe_load(events_file.read_text(encoding='utf-8')) == original
+    assert not (tmp_path / "deletedevents.yml").exists()
+    assert not (tmp_path / "events.queue.yml").exists()
+
+def test_handle_add_idempotency_key_retry(tmp_path):
+    """同じ冪等キーでの再実行がGoogle Calendarでもローカルでも重複しないテスト"""
+    events_file = tmp_path / "events.yml"
+    created = {}
+
+    def add_event(service, start, end, title, detail, recurrence=None, event_id=None):
+        # 2回目は作成済みのイベントが返る（add_event()が409を処理した結果）
+        return created.setdefault(event_id, {'id': event_id, 'summary': title})
+
+    with patch('my_calendar_app.calendar_manager.get_authenticated_service'), \
+            patch('my_calendar_app.calendar_manager.google_add_event', side_effect=add_event) as mock_add:
+        for _ in range(2):
+            handle_add('2024-03-20 15:00', '2024-03-20 16:00', '会議', idempotency_key='request-1',
+                       events_file=str(events_file), deleted_events_file=str(tmp_path / "deletedevents.yml"))
+
+    event_ids = {call.kwargs['event_id'] for call in mock_add.call_args_list}
+    assert len(event_ids) == 1
+    saved = yaml.safe_load(events_file.read_text(encoding='utf-8'))
+    assert [event['id'] for event in saved] == list(event_ids)
+
+def test_handle_reconcile_first_run(batch_service, tmp_path):
+    """初回の差分解消でGoogle Calendar側のイベントを取り込み、同期状態を保存するテスト"""
+    events_file = tmp_path / "events.yml"
+    events_file.write_text(yaml.dump([{
+        'id': 'event_1', 'title': 'ミーティングA', 'start_datetime': '2024-03-20 15:00',
+        'end_datetime': '2024-03-20 16:00', 'detail': None, 'recurrence': None
+    }], allow_unicode=True), encoding='utf-8')
+    remote_events = {
+        event_id: {
+            'id': event_id, 'etag': f'etag_{event_id}', 'summary': title,
+            'start': {'dateTime': '2024-03-20T15:00:00+09:00'},
+            'end': {'dateTime': '2024-03-20T16:00:00+09:00'}
+        }
+        for event_id, title in [('event_1', 'ミーティングA'), ('event_2', 'Googleで追加')]
+    }
+    events_api = batch_service.events.return_value
+    events_api.list.side_effect = None
+    events_api.list.return_value.execute.return_value = {
+        'items': [{'id': e['id'], 'etag': e['etag']} for e in remote_events.values()],
+        'nextSyncToken': 'token_1'
+    }
+    batch_service.respond = lambda request: (remote_events[request[1]['eventId']], None)
+
+    with patch('my_calendar_app.calendar_manager.get_authenticated_service', return_value=batch_service), \
+            patch('my_calendar_app.calendar_manager.get_or_create_calendar', return_value='withai_calendar_id'):
+        plan = handle_reconcile(events_file=str(events_file),
+                                deleted_events_file=str(tmp_path / "deletedevents.yml"))
+
+    assert plan['in_sync'] == {'event_1': 'etag_event_1'}
+    saved = yaml.safe_load(events_file.read_text(encoding='utf-8'))
+    assert [event['id'] for event in saved] == ['event_1', 'event_2']
+    assert 'etag' not in saved[1]
+    state = json.loads((tmp_path / "events.sync.json").read_text(encoding='utf-8'))
+    assert state['sync_token'] == 'token_1'
+    assert set(state['events']) == {'event_1', 'event_2'}
+
+def test_handle_free_fans_out_across_profiles():
+    """複数のプロファイルのfreebusyを並行して問い合わせ、全員の空き時間を返すテスト"""
+    busy = {
+        'sato': [{'start': '2024-03-18T09:00:00+09:00', 'end': '2024-03-18T12:00:00+09:00'}],
+        'suzuki': [{'start': '2024-03-18T13:00:00+09:00', 'end': '2024-03-18T17:00:00+09:00'}],
+    }
+    services = {}
+    for profile, periods in busy.items():
+        service = MagicMock()
+        service.freebusy.return_value.query.return_value.execute.return_value = {
+            'calendars': {'primary': {'busy': periods}}
+        }
+        services[profile] = service
+
+    with patch('my_calendar_app.calendar_manager.get_authenticated_service', side_effect=services.get) as mock_auth, \
+            patch('google_calendar_service.get_or_create_calendar', return_value='withai_calendar_id'):
+        slots = handle_free('2024-03-18', profiles=['sato', 'suzuki'], min_minutes=30)
+
+    assert sorted(call.args[0] for call in mock_auth.call_args_list) == ['sato', 'suzuki']
+    assert [(start.strftime('%H:%M'), end.strftime('%H:%M')) for start, end in slots] == [
+        ('12:00', '13:00'), ('17:00', '18:00')]
+
+def test_handle_restore_batches_inserts_and_rewrites_archive_once(tmp_path, batch_service):
+    """条件に合う削除済みイベントをまとめて追加し、削除済みイベントファイルから取り除くテスト"""
+    events_file = tmp_path / "events.yml"
+    deleted_events_file = tmp_path / "deletedevents.yml"
+    archive = [
+        {'id': 'a', 'title': '定例MTG', 'start_datetime': '2024-03-20 10:00', 'end_datetime': '2024-03-20 11:00',
+         'detail': None, 'recurrence': 'weekly', 'deleted_at': '2024-03-01 09:00:00'},
+        {'id': 'b', 'title': '定例MTG', 'start_datetime': '2024-03-21 10:00', 'end_datetime': '2024-03-21 11:00',
+         'detail': None, 'recurrence': None, 'deleted_at': '2024-03-20 18:00:00'},
+        {'id': 'c', 'title': '面談', 'start_datetime': '2024-03-22 10:00', 'end_datetime': '2024-03-22 11:00',
+         'detail': None, 'recurrence': None, 'deleted_at': '2024-03-20 18:00:00'},
+        {'id': 'd', 'title': '定例MTG', 'start_datetime': '2024-03-25 10:00', 'end_datetime': '2024-03-25 11:00',
+         'detail': None, 'recurrence': None, 'deleted_at': '2024-03-20 18:05:00'},
+    ]
+    deleted_events_file.write_text(yaml.dump(archive, allow_unicode=True), encoding='utf-8')
+    batch_service.respond = lambda request: (request[1]['body'], None)
+
+    with patch('my_calendar_app.calendar_manager.get_authenticated_service', return_value=batch_service), \
+            patch('my_calendar_app.calendar_manager.get_or_create_calendar', return_value='withai_calendar_id'):
+        restored = handle_restore(title='定例', deleted_after='2024-03-20', events_file=str(events_file),
+                                  deleted_events_file=str(deleted_events_file))
+        # 再実行しても対象がないので何もしない
+        assert handle_restore(title='定例', deleted_after='2024-03-20', events_file=str(events_file),
+                              deleted_events_file=str(deleted_events_file)) == []
+
+    assert len(batch_service.batches) == 1
+    assert [event['title'] for event in restored] == ['定例MTG', '定例MTG']
+    saved = yaml.safe_load(events_file.read_text(encoding='utf-8'))
+    assert [event['start_datetime'] for event in saved] == ['2024-03-21 10:00', '2024-03-25 10:00']
+    assert [event['id'] for event in saved] == [event['id'] for event in restored]
+    remaining = yaml.safe_load(deleted_events_file.read_text(encoding='utf-8'))
+    assert [event['id'] for event in remaining] == ['a', 'c']
+
+def remote_event(event_id, summary, start, end, **extra):
+    """Google Calendar API形式のイベントを作成"""
+    return dict({'id': event_id, 'summary': summary, 'status': 'confirmed',
+                 'start': {'dateTime': f'{start}:00+09:00'}, 'end': {'dateTime': f'{end}:00+09:00'}}, **extra)
+
+@pytest.fixture
+def bulk_calendar(tmp_path, batch_service):
+    """一括変更のテスト用のローカルファイルとGoogle Calendarのモック"""
+    events_file = tmp_path / "events.yml"
+    events_file.write_text(yaml.dump([
+        {'id': 'a', 'title': '旧プロジェクト定例', 'start_datetime': '2024-03-18 10:00',
+         'end_datetime': '2024-03-18 11:00', 'detail': None, 'recurrence': None},
+        {'id': 'b', 'title': '面談', 'start_datetime': '2024-03-19 10:00',
+         'end_datetime': '2024-03-19 11:00', 'detail': None, 'recurrence': None},
+    ], allow_unicode=True), encoding='utf-8')
+    deleted_events_file = tmp_path / "deletedevents.yml"
+    deleted_events_file.write_text(yaml.dump([
+        {'id': 'old', 'title': '前に削除', 'start_datetime': '2024-01-01 10:00', 'end_datetime': '2024-01-01 11:00',
+         'detail': None, 'recurrence': None, 'deleted_at': '2024-01-01 12:00:00'}
+    ], allow_unicode=True), encoding='utf-8')
+
+    events_api = batch_service.events.return_value
+    events_api.list.side_effect = None
+    events_api.list.return_value.execute.return_value = {'items': [
+        remote_event('a', '旧プロジェクト定例', '2024-03-18T10:00', '2024-03-18T11:00'),
+        remote_event('b', '面談', '2024-03-19T10:00', '2024-03-19T11:00'),
+        # ローカルにないイベント
+        remote_event('c', '旧プロジェクト振り返り', '2024-03-20T15:00', '2024-03-20T16:00'),
+        # 期間より前から続いている定期イベント
+        remote_event('series', '旧プロジェクト朝会', '2024-03-01T09:00', '2024-03-01T09:15',
+                     recurrence=['RRULE:FREQ=DAILY']),
+    ]}
+    return events_file, deleted_events_file, batch_service
+
+def test_parse_offset():
+    """ずらす時間の指定の変換テスト"""
+    from datetime import timedelta
+    assert parse_offset('1d') == timedelta(days=1)
+    assert parse_offset('-2h') == timedelta(hours=-2)
+    assert parse_offset('1w1d12h30m') == timedelta(days=8, hours=12, minutes=30)
+    with pytest.raises(ValueError):
+        parse_offset('1 day')
+
+def test_handle_bulk_delete(bulk_calendar):
+    """1回の一覧取得で選んだイベントをバッチでまとめて削除するテスト"""
+    events_file, deleted_events_file, service = bulk_calendar
+    service.respond = lambda request: ('', None)
+
+    with patch('my_calendar_app.calendar_manager.get_authenticated_service', return_value=service), \
+            patch('my_calendar_app.calendar_manager.get_or_create_calendar', return_value='withai_calendar_id'):
+        preview = handle_bulk_delete('2024-03-18', '2024-03-24', match='旧プロジェクト', dry_run=True,
+                                     events_file=str(events_file), deleted_events_file=str(deleted_events_file))
+        assert [event['id'] for event in preview] == ['a', 'c']
+        assert service.batches == []
+
+        deleted = handle_bulk_delete('2024-03-18', '2024-03-24', match='旧プロジェクト',
+                                     events_file=str(events_file), deleted_events_file=str(deleted_events_file))
+
+    assert [event['id'] for event in deleted] == ['a', 'c']
+    assert service.events.return_value.list.call_count == 2
+    assert [request[0] for _, request in service.batches[0].requests] == ['delete', 'delete']
+    saved = yaml.safe_load(events_file.read_text(encoding='utf-8'))
+    assert [event['id'] for event in saved] == ['b']
+    archive = yaml.safe_load(deleted_events_file.read_text(encoding='utf-8'))
+    assert [event['id'] for event in archive] == ['old', 'a', 'c']
+    assert archive[1]['deleted_at'] == archive[2]['deleted_at']
+
+def test_handle_bulk_delete_skips_series_continuing_after_range(bulk_calendar, capsys):
+    """期間の後まで続く定期イベントは対象にせず、期間内で終わる定期イベントだけを削除するテスト"""
+    events_file, deleted_events_file, service = bulk_calendar
+    service.events.return_value.list.return_value.execute.return_value = {'items': [
+        remote_event('endless', '朝会', '2024-03-20T09:00', '2024-03-20T09:15', recurrence=['RRULE:FREQ=DAILY']),
+        remote_event('counted', '勉強会', '2024-03-20T18:00', '2024-03-20T19:00',
+                     recurrence=['RRULE:FREQ=DAILY;COUNT=3']),
+        remote_event('bounded', '研修', '2024-03-21T10:00', '2024-03-21T12:00',
+                     recurrence=['RRULE:FREQ=DAILY;UNTIL=20240324T145959Z']),
+        remote_event('later', '振り返り', '2024-03-22T10:00', '2024-03-22T11:00',
+                     recurrence=['RRULE:FREQ=DAILY;UNTIL=20240325T005959Z']),
+    ]}
+    service.respond = lambda request: ('', None)
+
+    with patch('my_calendar_app.calendar_manager.get_authenticated_service', return_value=service), \
+            patch('my_calendar_app.calendar_manager.get_or_create_calendar', return_value='withai_calendar_id'):
+        deleted = handle_bulk_delete('2024-03-18', '2024-03-24',
+                                     events_file=str(events_file), deleted_events_file=str(deleted_events_file))
+
+    assert [event['id'] for event in deleted] == ['bounded']
+    assert [request[1]['eventId'] for _, request in service.batches[0].requests] == ['bounded']
+    assert "期間の後まで続いている定期イベント3件は対象外です" in capsys.readouterr().out
+
+def test_handle_shift(bulk_calendar):
+    """期間内のイベントをバッチでまとめてずらし、ローカルにも反映するテスト"""
+    events_file, deleted_events_file, service = bulk_calendar
+    service.respond = lambda request: (dict(request[1]['body'], id=request[1]['eventId']), None)
+
+    with patch('my_calendar_app.calendar_manager.get_authenticated_service', return_value=service), \
+            patch('my_calendar_app.calendar_manager.get_or_create_calendar', return_value='withai_calendar_id'):
+        shifted = handle_shift('2024-03-18', '2024-03-19', '1d',
+                               events_file=str(events_file), deleted_events_file=str(deleted_events_file))
+
+    assert [(event['id'], event['start_datetime']) for event in shifted] == [
+        ('a', '2024-03-19 10:00'), ('b', '2024-03-20 10:00')]
+    patches = [request[1] for _, request in service.batches[0].requests]
+    assert patches[0]['body']['start']['dateTime'] == '2024-03-19T10:00:00+09:00'
+    saved = yaml.safe_load(events_file.read_text(encoding='utf-8'))
+    assert [(event['id'], event['end_datetime']) for event in saved] == [
+        ('a', '2024-03-19 11:00'), ('b', '2024-03-20 11:00')]
+
+def test_handle_run_batches_operations_and_writes_once(tmp_path, batch_service, capsys):
+    """複数の操作をまとめて送信し、ローカルへの書き込みと結果の出力を行うテスト"""
+    events_file = tmp_path / "events.yml"
+    events_file.write_text(yaml.dump([
+        {'id': 'event_1', 'title': 'ミーティングA', 'start_datetime': '2024-03-20 15:00',
+         'end_datetime': '2024-03-20 16:00', 'detail': None, 'recurrence': None},
+        {'id': 'event_2', 'title': 'ミーティングB', 'start_datetime': '2024-03-20 18:00',
+         'end_datetime': '2024-03-20 19:00', 'detail': None, 'recurrence': None},
+    ], allow_unicode=True), encoding='utf-8')
+    script = tmp_path / "operations.jsonl"
+    script.write_text('\n'.join(json.dumps(operation, ensure_ascii=False) for operation in [
+        {'command': 'add', 'start_datetime': '2024-03-21 10:00', 'end_datetime': '2024-03-21 11:00', 'title': '会議'},
+        {'command': 'update', 'event_id': 'event_1', 'title': '変更後'},
+        {'command': 'delete', 'event_id': 'event_2'},
+        {'command': 'update', 'event_id': 'event_1', 'start_datetime': '2024-03-20 16:00',
+         'end_datetime': '2024-03-20 17:00'},
+        {'command': 'list', 'start': '2024-03-20', 'end': '2024-03-21', 'local': True},
+    ]), encoding='utf-8')
+    batch_service.respond = lambda request: (request[1].get('body', {}), None)
+
+    with patch('my_calendar_app.calendar_manager.get_authenticated_service', return_value=batch_service), \
+            patch('my_calendar_app.calendar_manager.get_or_create_calendar', return_value='withai_calendar_id'), \
+            patch.object(EventStore, 'save', autospec=True, side_effect=EventStore.save) as mock_save:
+        results = handle_run(str(script), events_file=str(events_file),
+                             deleted_events_file=str(tmp_path / "deletedevents.yml"))
+
+    # event_1への2回目の更新だけが次のバッチになる
+    assert [[request[0] for _, request in batch.requests] for batch in batch_service.batches] == [
+        ['insert', 'patch', 'delete'], ['patch']]
+    assert mock_save.call_count == 1
+    assert [result['status'] for result in results] == ['ok'] * 5
+    assert [event['title'] for event in results[4]['events']] == ['変更後', '会議']
+    printed = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert printed == results
+
+    saved = yaml.safe_load(events_file.read_text(encoding='utf-8'))
+    assert [(event['title'], event['start_datetime']) for event in saved] == [
+        ('変更後', '2024-03-20 16:00'), ('会議', '2024-03-21 10:00')]
+    assert saved[1]['id'] == results[0]['event_id']
+    archived = yaml.safe_load((tmp_path / "deletedevents.yml").read_text(encoding='utf-8'))
+    assert [event['id'] for event in archived] == ['event_2']
+
+def test_handle_run_rejects_script_with_invalid_operation(tmp_path, capsys):
+    """不正な操作が1つでもあれば何も実行しないテスト"""
+    script = tmp_path / "operations.jsonl"
+    script.write_text('\n'.join([
+        json.dumps({'command': 'delete', 'event_id': 'event_1'}),
+        json.dumps({'command': 'add', 'start_datetime': '2024-03-21', 'end_datetime': '2024-03-21 11:00',
+                    'title': '会議'}),
+    ]), encoding='utf-8')
+
+    with patch('my_calendar_app.calendar_manager.get_authenticated_service') as mock_auth, \
+            pytest.raises(SystemExit):
+        handle_run(str(script), events_file=str(tmp_path / "events.yml"),
+                   deleted_events_file=str(tmp_path / "deletedevents.yml"))
+
+    mock_auth.assert_not_called()
+    assert [json.loads(line)['line'] for line in capsys.readouterr().out.splitlines()] == [2]
+    assert not (tmp_path / "events.yml").exists()
@@ -0,0 +1,72 @@
+import pytest
+np = pytest.importorskip('numpy')
+from ..calendar_stats import (
+    to_minutes,
+    expand_recurrence,
+    collect_occurrences,
+    compute_stats
+)
+
+def minutes(value):
+    """ローカル形式の日時を分数に変換"""
+    return int(to_minutes([value])[0])
+
+def event(event_id, start, end, recurrence=None):
+    """ローカル形式のイベントを作成"""
+    return {'id': event_id, 'title': '予定', 'start_datetime': start, 'end_datetime': end,
+            'detail': None, 'recurrence': recurrence}
+
+def test_expand_recurrence_weekday():
+    """平日の繰り返しが土日を飛ばして期間内だけ展開されるテスト"""
+    # 2024-03-18は月曜日
+    starts = expand_recurrence(minutes('2024-01-01 09:00'), 30, 'weekday',
+                               minutes('2024-03-18 00:00'), minutes('2024-03-25 00:00'))
+
+    assert [str(np.datetime64(int(value), 'm')) for value in starts] == [
+        f'2024-03-{day}T09:00' for day in (18, 19, 20, 21, 22)]
+
+def test_expand_recurrence_monthly_skips_short_months():
+    """31日始まりの毎月の繰り返しが31日のない月を飛ばすテスト"""
+    starts = expand_recurrence(minutes('2024-01-31 10:00'), 60, 'monthly',
+                               minutes('2024-01-01 00:00'), minutes('2024-06-01 00:00'))
+
+    assert [str(np.datetime64(int(value), 'm').astype('datetime64[D]')) for value in starts] == [
+        '2024-01-31', '2024-03-31', '2024-05-31']
+
+def test_compute_stats():
+    """予定が入っている時間・稼働率・空き時間・ヒートマップの集計テスト"""
+    range_start, range_end = minutes('2024-03-18 00:00'), minutes('2024-03-25 00:00')
+    events = [
+        event('daily', '2024-03-01 09:00', '2024-03-01 10:00', recurrence='daily'),
+        # 毎日の予定と30分重なる
+        event('overlap', '2024-03-18 09:30', '2024-03-18 10:30'),
+        event('afternoon', '2024-03-18 13:00', '2024-03-18 14:00'),
+        # 期間外
+        event('outside', '2024-03-26 09:00', '2024-03-26 10:00'),
+    ]
+    starts, ends = collect_occurrences(events, range_start, range_end)
+    stats = compute_stats(starts, ends, range_start, range_end)
+
+    assert stats['occurrences'] == 9
+    assert stats['booked_hours'] == 9.0
+    # 月曜日は09:00-10:30と13:00-14:00
+    assert stats['daily'][0] == {'date': '2024-03-18', 'busy_hours': 2.5}
+    assert stats['busy_hours'] == 8.5
+    assert stats['utilization'] == round((2.5 + 4) / (5 * 9), 4)
+    assert stats['average_gap_minutes'] == 150.0
+    assert [week['week_start'] for week in stats['weekly']] == ['2024-03-18']
+    assert stats['heatmap'][0][9] == 1.0
+    assert stats['heatmap'][0][10] == 0.5
+    assert stats['busiest_hours'][0]['hour'] == 9
+
+def test_compute_stats_many_occurrences():
+    """10万件以上の予定をまとめて集計できるテスト"""
+    range_start, range_end = minutes('2024-01-01 00:00'), minutes('2025-01-01 00:00')
+    events = [event(f'event_{i}', f'2024-01-01 {i % 24:02d}:00', f'2024-01-01 {i % 24:02d}:15', recurrence='daily')
+              for i in range(300)]
+
+    starts, ends = collect_occurrences(events, range_start, range_end)
+    stats = compute_stats(starts, ends, range_start, range_end)
+
+    assert stats['occurrences'] == 300 * 366
+    assert len(stats['daily']) == 366
@@ -0,0 +1,60 @@
+import json
+import pstats
+import sys
+import httplib2
+import pytest
+from ..command_profiler import profile_command, profile_paths, argument_sizes
+
+def test_profile_command_writes_pstats_and_tagged_summary(tmp_path, monkeypatch):
+    """プロファイルと、コマンド名・引数の大きさ・APIの呼び出し回数を付けた要約を書き出すテスト"""
+    monkeypatch.setattr(httplib2.Http, 'request', lambda self, *args, **kwargs: ({'status': '200'}, b'{}'))
+    events_file = tmp_path / "events.yml"
+    events_file.write_text("- id: a\n", encoding='utf-8')
+
+    def run():
+        http = httplib2.Http()
+        for _ in range(3):
+            http.request('https://www.googleapis.com/calendar/v3/calendars')
+        return [bytearray(1024) for _ in range(100)]
+
+    summary = profile_command(str(tmp_path / "list"), 'list',
+                              {'start': '2024-03-01', 'title': '社外秘の打ち合わせ', 'profile': ['sato', 'suzuki'],
+                               'local': False, 'end': None},
+                              run, files={'events_file': str(events_file)}, trace_memory=True, top=5)
+
+    paths = profile_paths(str(tmp_path / "list"))
+    assert paths['pstats'].endswith('list.pstats')
+    assert pstats.Stats(paths['pstats']).total_calls > 0
+    with open(paths['summary'], encoding='utf-8') as f:
+        assert json.load(f) == summary
+    assert summary['command'] == 'list'
+    assert summary['api_calls'] == 3
+    assert summary['exit_status'] == 0
+    assert summary['files'] == {'events_file': events_file.stat().st_size}
+    assert summary['arguments'] == {'start': {'chars': 10}, 'title': {'chars': 9},
+                                    'profile': {'items': 2}, 'local': False}
+    assert summary['peak_bytes'] >= 100 * 1024
+    assert 0 < len(summary['top_allocations']) <= 5
+    assert any('run' in row['function'] for row in summary['top_functions'])
+    # 計測が終わったら元に戻す
+    assert httplib2.Http.request.__name__ == '<lambda>'
+
+def test_profile_command_writes_even_when_command_exits(tmp_path):
+    """sys.exit()で終わったコマンドも書き出してから終了するテスト"""
+    with pytest.raises(SystemExit):
+        profile_command(str(tmp_path / "add.pstats"), 'add', {}, lambda: sys.exit(1))
+
+    with open(tmp_path / "add.json", encoding='utf-8') as f:
+        summary = json.load(f)
+    assert summary['exit_status'] == 1
+    assert summary['api_calls'] == 0
+    assert 'top_allocations' not in summary
+    assert (tmp_path / "add.pstats").exists()
+
+def test_argument_sizes_records_file_sizes(tmp_path):
+    """ファイルを指す引数はバイト数も記録するテスト"""
+    source = tmp_path / "operations.jsonl"
+    source.write_text('{"command": "list"}\n', encoding='utf-8')
+
+    assert argument_sizes({'file': str(source), 'days': 3}) == {
+        'file': {'chars': len(str(source)), 'bytes': source.stat().st_size}, 'days': 3}
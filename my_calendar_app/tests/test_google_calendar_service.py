@@ -1,6 +1,12 @@
+import os
+import sys
+import time
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 import pytest
 from unittest.mock import Mock, patch, MagicMock
 from datetime import datetime
+from googleapiclient.errors import HttpError
 from ..google_calendar_service import (
     get_authenticated_service,
     add_event,
@@ -8,7 +14,27 @@ from ..google_calendar_service import (
     delete_event,
     list_events,
     get_or_create_calendar,
-    CALENDAR_NAME
+    iter_events,
+    execute_batch,
+    rrule_to_recurrence,
+    recurrence_until,
+    to_local_event,
+    get_event,
+    event_id_for,
+    new_event_id,
+    add_events_batch,
+    enable_response_cache,
+    disable_response_cache,
+    invalidate_cache,
+    _cache_put,
+    _read_cache,
+    query_busy,
+    shift_event_body,
+    profile_path,
+    service_pool,
+    ServicePool,
+    CALENDAR_NAME,
+    BATCH_SIZE
 )
 
 @pytest.fixture
@@ -105,9 +131,13 @@ def test_get_authenticated_service(mock_build, mock_from_file, mock_exists):
     mock_from_file.return_value = mock_creds
     mock_service = MagicMock()
     mock_build.return_value = mock_service
+    service_pool.clear()
 
     # テスト実行
     result = get_authenticated_service()
+    # 2回目はプールのサービスを返す
+    assert get_authenticated_service() is result
+    service_pool.clear()
 
     # 検証
     mock_exists.assert_called_once_with('token.json')
@@ -115,6 +145,32 @@ def test_get_authenticated_service(mock_build, mock_from_file, mock_exists):
     mock_build.assert_called_once_with('calendar', 'v3', credentials=mock_creds)
     assert result == mock_service
 
+def test_profile_path():
+    """プロファイルごとのファイルのパスのテスト"""
+    assert profile_path('default', 'token.json') == 'token.json'
+    assert profile_path('sato', 'events.yml') == os.path.join('profiles', 'sato', 'events.yml')
+    with pytest.raises(ValueError):
+        profile_path('../other', 'token.json')
+
+def test_service_pool_creates_each_profile_once():
+    """サービスのプールがプロファイルごとに1回だけ作成して使い回すテスト"""
+    created = []
+
+    def factory(profile):
+        time.sleep(0.05)
+        created.append(profile)
+        return MagicMock(name=profile)
+
+    pool = ServicePool(factory)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        services = list(executor.map(pool.get, ['sato', 'suzuki', 'sato', 'suzuki']))
+
+    assert sorted(created) == ['sato', 'suzuki']
+    assert services[0] is services[2] and services[1] is services[3]
+    assert services[0] is not services[1]
+    pool.clear()
+    assert pool.get('sato') is not services[0]
+
 def test_add_event(mock_service, sample_event, sample_google_event, mock_withai_calendar):
     """イベント追加のテスト"""
     # モックの設定
@@ -139,6 +195,76 @@ def test_add_event(mock_service, sample_event, sample_google_event, mock_withai_
     assert kwargs['calendarId'] == mock_withai_calendar['id']
     assert kwargs['body']['summary'] == sample_event['title']
 
+def test_event_id_for():
+    """冪等キーから決定的にCalendar APIの規則に沿ったIDを生成するテスト"""
+    event_id = event_id_for('request-1')
+
+    assert event_id == event_id_for('request-1')
+    assert event_id != event_id_for('request-2')
+    assert 5 <= len(event_id) <= 1024
+    assert set(event_id) <= set('0123456789abcdefghijklmnopqrstuv')
+    assert new_event_id() != new_event_id()
+
+def test_add_event_with_client_id_treats_conflict_as_created(mock_service, sample_event, sample_google_event,
+                                                            mock_withai_calendar):
+    """同じIDでの再送が409 Conflictになっても作成済みとして扱うテスト"""
+    resp = MagicMock()
+    resp.status = 409
+    mock_service.events.return_value.insert.return_value.execute.side_effect = HttpError(resp, b'{}')
+    mock_service.events.return_value.get.return_value.execute.return_value = dict(sample_google_event, id='abc123')
+
+    result = add_event(mock_service, sample_event['start_datetime'], sample_event['end_datetime'],
+                       sample_event['title'], calendar_id='withai_calendar_id', event_id='abc123')
+
+    assert result['id'] == 'abc123'
+    assert mock_service.events.return_value.insert.call_args.kwargs['body']['id'] == 'abc123'
+
+    # 削除済みのIDは再利用できないのでエラーにする
+    mock_service.events.return_value.get.return_value.execute.return_value = {'id': 'abc123', 'status': 'cancelled'}
+    with pytest.raises(HttpError):
+        add_event(mock_service, sample_event['start_datetime'], sample_event['end_datetime'],
+                  sample_event['title'], calendar_id='withai_calendar_id', event_id='abc123')
+
+def test_add_events_batch_conflict_is_created(batch_service, sample_event):
+    """バッチでの再送の409 Conflictを、既存のイベントを取得して作成済みとして扱うテスト"""
+    resp = MagicMock()
+    resp.status = 409
+
+    def respond(request):
+        method, kwargs = request
+        if method == 'get':
+            return {'id': kwargs['eventId'], 'status': 'confirmed', 'summary': sample_event['title']}, None
+        return None, HttpError(resp, b'{}')
+    batch_service.respond = respond
+
+    results = add_events_batch(batch_service, [dict(sample_event, id='abc123'), sample_event],
+                               calendar_id='withai_calendar_id')
+
+    assert results[0] == ({'id': 'abc123', 'status': 'confirmed', 'summary': sample_event['title']}, None)
+    assert results[1][0] is None and results[1][1].status_code == 409
+    # IDを決めていない追加の409は確かめない
+    assert [request for _, request in batch_service.batches[-1].requests] == [
+        ('get', {'calendarId': 'withai_calendar_id', 'eventId': 'abc123'})]
+
+def test_add_events_batch_conflict_with_cancelled_event_is_error(batch_service, sample_event):
+    """削除済み（cancelled）のIDと409 Conflictになった場合は作成済みとせずエラーにするテスト"""
+    resp = MagicMock()
+    resp.status = 409
+
+    def respond(request):
+        method, kwargs = request
+        if method == 'get':
+            status = 'cancelled' if kwargs['eventId'] == 'deleted' else 'confirmed'
+            return {'id': kwargs['eventId'], 'status': status}, None
+        return None, HttpError(resp, b'{}')
+    batch_service.respond = respond
+
+    results = add_events_batch(batch_service, [dict(sample_event, id='deleted'), dict(sample_event, id='alive')],
+                               calendar_id='withai_calendar_id')
+
+    assert results[0][0] is None and results[0][1].status_code == 409
+    assert results[1] == ({'id': 'alive', 'status': 'confirmed'}, None)
+
 def test_update_event(mock_service, sample_google_event, mock_withai_calendar):
     """イベント更新のテスト"""
     event_id = 'test_event_id'
@@ -228,4 +354,209 @@ def test_list_events_empty(mock_service, mock_withai_calendar):
     assert len(events) == 0
     mock_service.events.return_value.list.assert_called_once()
     args, kwargs = mock_service.events.return_value.list.call_args
-    assert kwargs['calendarId'] == mock_withai_calendar['id'] 
\ No newline at end of file
+    assert kwargs['calendarId'] == mock_withai_calendar['id'] 
+
+def test_execute_batch(batch_service):
+    """バッチリクエストの実行テスト"""
+    batch_service.respond = lambda request: (None, ValueError('失敗')) if request == 'bad' else ({'id': request}, None)
+    requests = [f'req_{i}' for i in range(BATCH_SIZE + 1)]
+    requests[3] = 'bad'
+
+    results = execute_batch(batch_service, requests)
+
+    # BATCH_SIZE件ごとに分割して送信し、結果は元の順序で返す
+    assert len(batch_service.batches) == 2
+    assert len(results) == BATCH_SIZE + 1
+    assert results[0] == ({'id': 'req_0'}, None)
+    assert results[-1] == ({'id': f'req_{BATCH_SIZE}'}, None)
+    assert results[3][0] is None and isinstance(results[3][1], ValueError)
+
+def test_iter_events_follows_pages(mock_service, sample_google_event):
+    """ページをたどってイベントを取得するテスト"""
+    mock_service.events.return_value.list.return_value.execute.side_effect = [
+        {'items': [sample_google_event], 'nextPageToken': 'page_2'},
+        {'items': [dict(sample_google_event, id='test_event_id_2')]}
+    ]
+
+    events = list(iter_events(mock_service, '2024-03-01', '2024-03-31', calendar_id='withai_calendar_id'))
+
+    assert [event['id'] for event in events] == ['test_event_id_1', 'test_event_id_2']
+    assert mock_service.events.return_value.list.call_count == 2
+    args, kwargs = mock_service.events.return_value.list.call_args
+    assert kwargs['pageToken'] == 'page_2'
+
+def test_rrule_to_recurrence():
+    """RRULEからパターン名への変換テスト"""
+    assert rrule_to_recurrence('RRULE:FREQ=DAILY') == 'daily'
+    assert rrule_to_recurrence('BYDAY=MO,TU,WE,TH,FR;FREQ=WEEKLY') == 'weekday'
+    assert rrule_to_recurrence('FREQ=MONTHLY;WKST=MO') == 'monthly'
+    assert rrule_to_recurrence('FREQ=WEEKLY;INTERVAL=2') is None
+
+def test_recurrence_until():
+    """定期イベントの繰り返しが終わる日時の判定テスト"""
+    from datetime import datetime as dt
+    assert recurrence_until(['RRULE:FREQ=DAILY;UNTIL=20240324T145959Z']) == dt(2024, 3, 24, 23, 59, 59)
+    assert recurrence_until(['RRULE:FREQ=WEEKLY;UNTIL=20240331', 'EXDATE;TZID=Asia/Tokyo:20240320T090000']) \
+        == dt(2024, 3, 31)
+    # 終わりのないもの、回数で決まるもの、日付を足したものは分からない
+    assert recurrence_until(['RRULE:FREQ=DAILY']) is None
+    assert recurrence_until(['RRULE:FREQ=DAILY;COUNT=3']) is None
+    assert recurrence_until(['RRULE:FREQ=DAILY;UNTIL=20240324', 'RDATE;VALUE=DATE:20240501']) is None
+
+def test_to_local_event(sample_google_event):
+    """ローカル形式への変換テスト"""
+    google_event = dict(sample_google_event, recurrence=['RRULE:FREQ=WEEKLY'])
+    google_event['end'] = {'dateTime': '2024-03-20T08:00:00Z'}
+
+    local_event = to_local_event(google_event)
+
+    assert local_event == {
+        'id': 'test_event_id_1',
+        'title': 'テストミーティング',
+        'start_datetime': '2024-03-20 15:00',
+        'end_datetime': '2024-03-20 17:00',
+        'detail': 'テスト用ミーティング',
+        'recurrence': 'weekly'
+    }
+
+@pytest.fixture
+def response_cache(tmp_path):
+    """テスト中だけレスポンスキャッシュを有効にするフィクスチャ"""
+    cache_file = tmp_path / "cache.json"
+    enable_response_cache(str(cache_file), ttl=60, max_entries=3)
+    yield cache_file
+    disable_response_cache()
+
+def test_list_events_cache_hit_and_precise_invalidation(mock_service, sample_google_event,
+                                                         mock_withai_calendar, response_cache):
+    """一覧のキャッシュと、変更による影響のあるエントリだけの無効化のテスト"""
+    mock_service.calendarList.return_value.list.return_value.execute.return_value = {
+        'items': [mock_withai_calendar]
+    }
+    list_api = mock_service.events.return_value.list
+    list_api.return_value.execute.return_value = {'items': [sample_google_event]}
+
+    march = list_events(mock_service, '2024-03-01', '2024-03-31')
+    assert list_events(mock_service, '2024-03-01', '2024-03-31') == march
+    list_events(mock_service, '2024-04-01', '2024-04-30')
+    # 同じ条件の2回目はAPIを呼ばない。カレンダーIDの取得もキャッシュされる
+    assert list_api.call_count == 2
+    mock_service.calendarList.return_value.list.assert_called_once()
+
+    # 4月のイベントを追加すると4月の一覧だけが無効になる
+    mock_service.events.return_value.insert.return_value.execute.return_value = {
+        'id': 'april_event',
+        'start': {'dateTime': '2024-04-10T10:00:00+09:00'},
+        'end': {'dateTime': '2024-04-10T11:00:00+09:00'}
+    }
+    add_event(mock_service, '2024-04-10 10:00', '2024-04-10 11:00', '4月の予定')
+    list_events(mock_service, '2024-03-01', '2024-03-31')
+    list_events(mock_service, '2024-04-01', '2024-04-30')
+    assert list_api.call_count == 3
+
+    # 3月の一覧に含まれるイベントを削除すると3月の一覧が無効になる
+    delete_event(mock_service, sample_google_event['id'])
+    list_events(mock_service, '2024-03-01', '2024-03-31')
+    assert list_api.call_count == 4
+
+def test_response_cache_ttl_and_lru(mock_service, sample_google_event, response_cache):
+    """キャッシュの有効期限と件数の上限のテスト"""
+    get_api = mock_service.events.return_value.get
+    get_api.return_value.execute.return_value = sample_google_event
+
+    for event_id in ('a', 'b', 'c'):
+        get_event(mock_service, event_id, calendar_id='calendar_id')
+    get_event(mock_service, 'a', calendar_id='calendar_id')  # 'a'を最近使ったものにする
+    get_event(mock_service, 'd', calendar_id='calendar_id')  # 上限3件なので'b'が捨てられる
+    assert get_api.call_count == 4
+
+    get_event(mock_service, 'a', calendar_id='calendar_id')
+    assert get_api.call_count == 4
+    get_event(mock_service, 'b', calendar_id='calendar_id')
+    assert get_api.call_count == 5
+
+    # 有効期限切れ
+    with patch('my_calendar_app.google_calendar_service.time.time', return_value=time.time() + 61):
+        get_event(mock_service, 'a', calendar_id='calendar_id')
+    assert get_api.call_count == 6
+
+def test_response_cache_hit_does_not_rewrite_file(mock_service, sample_google_event, response_cache):
+    """キャッシュから取り出すだけではファイルを書き直さないテスト"""
+    mock_service.events.return_value.get.return_value.execute.return_value = sample_google_event
+    get_event(mock_service, 'a', calendar_id='calendar_id')
+
+    with patch('my_calendar_app.google_calendar_service.os.replace') as mock_replace:
+        for _ in range(3):
+            get_event(mock_service, 'a', calendar_id='calendar_id')
+    mock_replace.assert_not_called()
+    assert mock_service.events.return_value.get.call_count == 1
+
+def _put_cache_entries(worker):
+    """別のプロセスからキャッシュに書き込む（test_response_cache_is_shared_safely_between_processes用）"""
+    for number in range(30):
+        _cache_put(f'{worker}-{number}', number, calendar_id='calendar_id', event_id=f'{worker}-{number}')
+
+@pytest.mark.skipif(sys.platform == 'win32', reason='fcntlのロックがない')
+def test_response_cache_is_shared_safely_between_processes(tmp_path):
+    """別々のプロセスが同時に読み書きしても、互いの書き込みや無効化を失わないテスト"""
+    enable_response_cache(str(tmp_path / "cache.json"), ttl=60, max_entries=1000)
+    try:
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=_put_cache_entries, args=(worker,)) for worker in ('a', 'b')]
+        for process in workers:
+            process.start()
+        for process in workers:
+            process.join()
+        assert len(_read_cache()) == 60
+
+        invalidate_cache('calendar_id', event_id='a-0')
+        assert 'a-0' not in {entry['event_id'] for entry in _read_cache().values()}
+    finally:
+        disable_response_cache()
+
+def test_calendar_id_cache_is_per_profile(response_cache, mock_withai_calendar):
+    """アカウントごとにWithAIカレンダーのIDを分けてキャッシュするテスト"""
+    def factory(profile):
+        service = MagicMock()
+        service.calendarList.return_value.list.return_value.execute.return_value = {
+            'items': [dict(mock_withai_calendar, id=f'{profile}_calendar')]
+        }
+        return service
+
+    pool = ServicePool(factory)
+    assert get_or_create_calendar(pool.get('sato')) == 'sato_calendar'
+    assert get_or_create_calendar(pool.get('suzuki')) == 'suzuki_calendar'
+    assert get_or_create_calendar(pool.get('sato')) == 'sato_calendar'
+    pool.get('sato').calendarList.return_value.list.assert_called_once()
+    pool.clear()
+
+def test_query_busy(mock_service):
+    """freebusy APIの結果を日本時間の時間帯に変換するテスト"""
+    mock_service.freebusy.return_value.query.return_value.execute.return_value = {
+        'calendars': {
+            'calendar_id': {'busy': [{'start': '2024-03-18T01:00:00Z', 'end': '2024-03-18T02:00:00Z'}]},
+            'primary': {'busy': [{'start': '2024-03-18T09:00:00+09:00', 'end': '2024-03-18T09:30:00+09:00'}]}
+        }
+    }
+
+    busy = query_busy(mock_service, '2024-03-18', '2024-03-18', calendar_ids=['calendar_id', 'primary'])
+
+    assert [(start.strftime('%H:%M'), end.strftime('%H:%M')) for start, end in busy] == [
+        ('09:00', '09:30'), ('10:00', '11:00')]
+    body = mock_service.freebusy.return_value.query.call_args.kwargs['body']
+    assert body['items'] == [{'id': 'calendar_id'}, {'id': 'primary'}]
+    assert body['timeMin'] == '2024-03-18T00:00:00+09:00'
+
+def test_shift_event_body():
+    """イベントの開始・終了をずらすイベント本体の作成テスト"""
+    from datetime import timedelta
+    timed = {'start': {'dateTime': '2024-03-18T23:30:00+09:00', 'timeZone': 'Asia/Tokyo'},
+             'end': {'dateTime': '2024-03-19T00:30:00+09:00'}}
+    assert shift_event_body(timed, timedelta(hours=1)) == {
+        'start': {'dateTime': '2024-03-19T00:30:00+09:00', 'timeZone': 'Asia/Tokyo'},
+        'end': {'dateTime': '2024-03-19T01:30:00+09:00', 'timeZone': 'Asia/Tokyo'}}
+
+    all_day = {'start': {'date': '2024-03-18'}, 'end': {'date': '2024-03-19'}}
+    assert shift_event_body(all_day, timedelta(days=7)) == {'start': {'date': '2024-03-25'},
+                                                            'end': {'date': '2024-03-26'}}
+    assert shift_event_body(all_day, timedelta(hours=2)) is None
@@ -0,0 +1,137 @@
+import os
+import pytest
+from ..ics_manager import (
+    iter_ics_events,
+    write_ics,
+    fold_line,
+    parse_duration,
+    ics_signature,
+    load_import_progress,
+    save_import_progress
+)
+
+SAMPLE_ICS = (
+    "BEGIN:VCALENDAR\r\n"
+    "VERSION:2.0\r\n"
+    "BEGIN:VEVENT\r\n"
+    "UID:event-1@example.com\r\n"
+    "DTSTART;TZID=Asia/Tokyo:20240320T150000\r\n"
+    "DTEND;TZID=Asia/Tokyo:20240320T160000\r\n"
+    "SUMMARY:定例ミーティング\r\n"
+    "DESCRIPTION:議題\\n・進捗確認\\, 共有\r\n"
+    "RRULE:BYDAY=MO,TU,WE,TH,FR;FREQ=WEEKLY\r\n"
+    "BEGIN:VALARM\r\n"
+    "DESCRIPTION:リマインダー\r\n"
+    "END:VALARM\r\n"
+    "END:VEVENT\r\n"
+    "BEGIN:VEVENT\r\n"
+    "UID:event-2@example.com\r\n"
+    "DTSTART:20240321T010000Z\r\n"
+    "DURATION:PT1H30M\r\n"
+    "SUMMARY:とても長いタイトルのイベントで折り返しが発生するかどうかを確認するためのテスト\r\n"
+    " 用イベント\r\n"
+    "RRULE:FREQ=DAILY;COUNT=5\r\n"
+    "END:VEVENT\r\n"
+    "BEGIN:VEVENT\r\n"
+    "UID:event-3@example.com\r\n"
+    "DTSTART;VALUE=DATE:20240322\r\n"
+    "SUMMARY:キャンセル済み\r\n"
+    "STATUS:CANCELLED\r\n"
+    "END:VEVENT\r\n"
+    "END:VCALENDAR\r\n"
+)
+
+@pytest.fixture
+def sample_ics_file(tmp_path):
+    """テスト用のiCalendarファイルを提供するフィクスチャ"""
+    ics_file = tmp_path / "sample.ics"
+    ics_file.write_text(SAMPLE_ICS, encoding='utf-8')
+    return str(ics_file)
+
+def test_iter_ics_events(sample_ics_file):
+    """iCalendarファイルの読み込みテスト"""
+    events = list(iter_ics_events(sample_ics_file))
+
+    # キャンセル済みの予定は読み飛ばす
+    assert len(events) == 2
+
+    assert events[0]['uid'] == 'event-1@example.com'
+    assert events[0]['title'] == '定例ミーティング'
+    assert events[0]['start_datetime'] == '2024-03-20 15:00'
+    assert events[0]['end_datetime'] == '2024-03-20 16:00'
+    assert events[0]['detail'] == '議題\n・進捗確認, 共有'
+    assert events[0]['recurrence'] == 'weekday'
+
+    # UTCは日本時間に変換し、折り返された行は連結する
+    assert events[1]['title'].endswith('テスト用イベント')
+    assert events[1]['start_datetime'] == '2024-03-21 10:00'
+    assert events[1]['end_datetime'] == '2024-03-21 11:30'
+    # 既存の繰り返しパターンで表現できないルール
+    assert events[1]['recurrence'] is None
+    assert events[1]['rrule'] == 'FREQ=DAILY;COUNT=5'
+
+def test_write_ics_round_trip(tmp_path, sample_events_data):
+    """書き出したファイルを読み込み直すテスト"""
+    events = [dict(event, recurrence='monthly') for event in sample_events_data]
+    events[0]['detail'] = 'カンマ, セミコロン; 改行\nを含む詳細'
+    ics_file = tmp_path / "export.ics"
+
+    with open(ics_file, 'w', encoding='utf-8', newline='') as f:
+        count = write_ics(f, iter(events))
+
+    assert count == 2
+    loaded = list(iter_ics_events(str(ics_file)))
+    assert [event['uid'] for event in loaded] == ['test_event_id_1', 'test_event_id_2']
+    assert loaded[0]['detail'] == events[0]['detail']
+    assert loaded[1]['start_datetime'] == events[1]['start_datetime']
+    assert all(event['recurrence'] == 'monthly' for event in loaded)
+
+def test_fold_line_keeps_multibyte_characters():
+    """マルチバイト文字の途中で折り返さないことのテスト"""
+    line = 'SUMMARY:' + 'あ' * 100
+    folded = fold_line(line)
+
+    for physical_line in folded.split('\r\n')[:-1]:
+        assert len(physical_line.encode('utf-8')) <= 75
+    assert folded.replace('\r\n ', '') == line + '\r\n'
+
+def test_parse_duration():
+    """DURATIONの解析テスト"""
+    assert parse_duration('PT1H30M').total_seconds() == 90 * 60
+    assert parse_duration('P1D').days == 1
+    assert parse_duration('-PT15M').total_seconds() == -15 * 60
+
+def test_import_progress(tmp_path, sample_ics_file):
+    """インポートの進捗の保存と読み込みのテスト"""
+    progress_file = str(tmp_path / "sample.ics.progress")
+    signature = ics_signature(sample_ics_file)
+    assert load_import_progress(progress_file, signature) == 0
+
+    save_import_progress(progress_file, signature, 1)
+    assert load_import_progress(progress_file, signature) == 1
+    assert not os.path.exists(f"{progress_file}.tmp")
+
+    # ファイルが変わった場合は最初から
+    with open(sample_ics_file, 'a', encoding='utf-8') as f:
+        f.write("\r\n")
+    assert load_import_progress(progress_file, ics_signature(sample_ics_file)) == 0
+
+    # 書き込みの途中で止まって壊れた進捗も最初から
+    with open(progress_file, 'w', encoding='utf-8') as f:
+        f.write('{"size": 1')
+    assert load_import_progress(progress_file, ics_signature(sample_ics_file)) == 0
+
+def test_import_progress_detects_same_size_edit(tmp_path, sample_ics_file):
+    """大きさと更新時刻を変えずに書き換えられた場合も最初からにするテスト"""
+    progress_file = str(tmp_path / "sample.ics.progress")
+    save_import_progress(progress_file, ics_signature(sample_ics_file), 1)
+    stat = os.stat(sample_ics_file)
+
+    with open(sample_ics_file, 'rb') as f:
+        content = f.read()
+    with open(sample_ics_file, 'wb') as f:
+        f.write(content.replace(b'UID:', b'UID:x', 1)[:-1])
+    os.utime(sample_ics_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    assert os.path.getsize(sample_ics_file) == stat.st_size
+    assert load_import_progress(progress_file, ics_signature(sample_ics_file)) == 0
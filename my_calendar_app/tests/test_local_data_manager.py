@@ -1,6 +1,24 @@
 import pytest
 import yaml
+import os
+import threading
+from datetime import datetime
 from ..local_data_manager import load_events, save_events, add_local_event, update_local_event, delete_local_event
+from ..local_data_manager import (
+    EventStore,
+    start_key,
+    migrate_to_shards,
+    migrate_to_flat,
+    shard_dir_for,
+    is_sharded,
+    save_deleted_event,
+    save_deleted_events,
+    iter_deleted_events,
+    remove_deleted_events,
+    file_lock,
+    load_yaml_list,
+    SNAPSHOT_SUFFIX
+)
 
 def test_load_events_empty_file(test_events_file):
     """空のファイルからの読み込みテスト"""
@@ -68,4 +86,233 @@ def test_delete_local_event(sample_events_data):
     
     # 検証
     assert len(updated_data) == len(sample_events_data) - 1
-    assert not any(event['id'] == event_id for event in updated_data) 
\ No newline at end of file
+    assert not any(event['id'] == event_id for event in updated_data) 
+
+@pytest.fixture
+def sharded_events_file(test_events_file, sample_events_data):
+    """3月と4月のイベントを月別シャードに分割したイベントファイル"""
+    april_event = dict(sample_events_data[0], id='test_event_id_3', start_datetime='2024-04-01 10:00',
+                       end_datetime='2024-04-01 11:00')
+    save_events(test_events_file, sample_events_data + [april_event])
+    migrate_to_shards(test_events_file)
+    return test_events_file
+
+def test_migrate_to_shards(sharded_events_file):
+    """月別シャードへの分割と1ファイルへの復元のテスト"""
+    shard_dir = shard_dir_for(sharded_events_file)
+    assert is_sharded(sharded_events_file)
+    # 各シャードにはスナップショットが並ぶ
+    assert sorted(name for name in os.listdir(shard_dir) if not name.endswith(SNAPSHOT_SUFFIX)) == [
+        '2024-03.yml', '2024-04.yml', 'manifest.json']
+    assert not os.path.exists(sharded_events_file)
+    assert [event['id'] for event in load_events(sharded_events_file)] == [
+        'test_event_id_1', 'test_event_id_2', 'test_event_id_3']
+
+    assert migrate_to_flat(sharded_events_file) == 3
+    assert not is_sharded(sharded_events_file)
+    assert len(load_events(sharded_events_file)) == 3
+
+def test_event_store_loads_and_writes_only_touched_shards(sharded_events_file):
+    """該当する月のシャードだけを読み書きするテスト"""
+    shard_dir = shard_dir_for(sharded_events_file)
+    april_mtime = os.stat(os.path.join(shard_dir, '2024-04.yml')).st_mtime_ns
+
+    store = EventStore(sharded_events_file)
+    store.update('test_event_id_1', {'title': '更新後のミーティング'})
+    store.delete('test_event_id_2')
+    store.add({'id': 'test_event_id_4', 'title': '5月の予定', 'start_datetime': '2024-05-01 10:00',
+               'end_datetime': '2024-05-01 11:00'})
+    store.save()
+
+    assert store.loaded_shards == ['2024-03', '2024-05']
+    assert os.stat(os.path.join(shard_dir, '2024-04.yml')).st_mtime_ns == april_mtime
+    reloaded = EventStore(sharded_events_file)
+    assert reloaded.get('test_event_id_1')['title'] == '更新後のミーティング'
+    assert reloaded.get('test_event_id_2') is None
+    assert reloaded.loaded_shards == ['2024-03']
+
+def test_event_store_moves_event_between_shards(sharded_events_file):
+    """開始月の変更でイベントが別のシャードに移るテスト"""
+    store = EventStore(sharded_events_file)
+    store.update('test_event_id_3', {'start_datetime': '2024-03-25 10:00', 'end_datetime': '2024-03-25 11:00'})
+    store.save()
+
+    assert not os.path.exists(os.path.join(shard_dir_for(sharded_events_file), '2024-04.yml'))
+    assert EventStore(sharded_events_file).get('test_event_id_3')['start_datetime'] == '2024-03-25 10:00'
+
+def test_event_store_recovers_from_stale_manifest(sharded_events_file):
+    """手作業でシャードを編集して対応表がずれても見つけられるテスト"""
+    shard_dir = shard_dir_for(sharded_events_file)
+    march = os.path.join(shard_dir, '2024-03.yml')
+    with open(march, 'r', encoding='utf-8') as f:
+        events = yaml.safe_load(f)
+    moved = events.pop()
+    with open(march, 'w', encoding='utf-8') as f:
+        yaml.dump(events, f, allow_unicode=True)
+    with open(os.path.join(shard_dir, '2024-04.yml'), 'a', encoding='utf-8') as f:
+        yaml.dump([moved], f, allow_unicode=True)
+
+    assert EventStore(sharded_events_file).get(moved['id'])['title'] == moved['title']
+
+def test_event_store_flat_file(test_events_file, sample_events_data):
+    """分割していないイベントファイルでも同じ操作ができるテスト"""
+    save_events(test_events_file, sample_events_data)
+
+    store = EventStore(test_events_file)
+    store.delete('test_event_id_2')
+    store.save()
+
+    assert [event['id'] for event in load_events(test_events_file)] == ['test_event_id_1']
+
+def test_event_store_keeps_start_order(test_events_file, sample_events_data):
+    """追加・更新しても開始日時順が保たれるテスト"""
+    save_events(test_events_file, list(reversed(sample_events_data)))
+
+    store = EventStore(test_events_file)
+    store.add(dict(sample_events_data[0], id='early', start_datetime='2024-03-01 09:00'))
+    store.update('test_event_id_2', {'start_datetime': '2024-03-10 09:00'})
+
+    events = store.all()
+    assert [event['id'] for event in events] == ['early', 'test_event_id_2', 'test_event_id_1']
+    assert events == sorted(events, key=start_key)
+
+@pytest.mark.parametrize('sharded', [False, True])
+def test_event_store_query_range(test_events_file, sharded):
+    """二分探索による期間指定の取得テスト"""
+    events = [
+        {'id': f'event_{month}_{day}', 'title': '予定', 'start_datetime': f'2024-{month:02d}-{day:02d} 10:00',
+         'end_datetime': f'2024-{month:02d}-{day:02d} 11:00'}
+        for month in (1, 2, 3) for day in (1, 15, 28)
+    ]
+    save_events(test_events_file, events)
+    if sharded:
+        migrate_to_shards(test_events_file)
+
+    store = EventStore(test_events_file)
+    result = store.query_range(datetime(2024, 1, 28, 10, 0), datetime(2024, 2, 28, 10, 0))
+
+    # 開始は含み、終了は含まない
+    assert [event['id'] for event in result] == ['event_1_28', 'event_2_1', 'event_2_15']
+    if sharded:
+        # 期間に含まれる月のシャードだけを読み込む
+        assert store.loaded_shards == ['2024-01', '2024-02']
+    assert store.query_range(datetime(2024, 4, 1), datetime(2024, 5, 1)) == []
+
+def test_iter_and_remove_deleted_events(tmp_path, sample_events_data):
+    """削除済みイベントを1件ずつ読み込み、指定したものだけを取り除くテスト"""
+    deleted_events_file = str(tmp_path / "deletedevents.yml")
+    multiline = dict(sample_events_data[0], id='multiline', detail='1行目\n- 2行目')
+    for event in [sample_events_data[0], multiline, sample_events_data[1]]:
+        save_deleted_event(dict(event), deleted_events_file)
+    archived = list(iter_deleted_events(deleted_events_file))
+    assert [event['id'] for event in archived] == ['test_event_id_1', 'multiline', 'test_event_id_2']
+    assert archived[1]['detail'] == '1行目\n- 2行目'
+
+    removed = remove_deleted_events(deleted_events_file, {('multiline', archived[1]['deleted_at'])})
+
+    assert removed == 1
+    assert load_events(deleted_events_file) == [archived[0], archived[2]]
+    assert remove_deleted_events(deleted_events_file, {('unknown', None)}) == 0
+    assert list(iter_deleted_events(str(tmp_path / "missing.yml"))) == []
+
+@pytest.mark.parametrize('sharded', [False, True])
+def test_event_store_save_replays_changes_onto_latest_file(test_events_file, sample_events_data, sharded):
+    """別のプロセスが先に保存していても、両方の変更が残るテスト"""
+    save_events(test_events_file, sample_events_data)
+    if sharded:
+        migrate_to_shards(test_events_file)
+    first = EventStore(test_events_file)
+    second = EventStore(test_events_file)
+    first.all()
+    second.all()
+
+    first.add({'id': 'added', 'title': '追加', 'start_datetime': '2024-03-25 10:00',
+               'end_datetime': '2024-03-25 11:00'})
+    first.delete('test_event_id_2')
+    first.save()
+    second.update('test_event_id_1', {'title': '更新'})
+    # 先に保存された削除は取り消さない
+    second.update('test_event_id_2', {'title': '削除済み'})
+    second.save()
+
+    events = EventStore(test_events_file).all()
+    assert [event['id'] for event in events] == ['test_event_id_1', 'added']
+    assert events[0]['title'] == '更新'
+
+def test_event_store_parallel_saves(test_events_file):
+    """並行して保存しても追加したイベントが失われないテスト"""
+    save_events(test_events_file, [])
+
+    def add(number):
+        store = EventStore(test_events_file)
+        store.all()
+        store.add({'id': f'event_{number}', 'title': '予定', 'start_datetime': f'2024-03-{number + 1:02d} 10:00',
+                   'end_datetime': f'2024-03-{number + 1:02d} 11:00'})
+        store.save()
+
+    threads = [threading.Thread(target=add, args=(number,)) for number in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(event['id'] for event in load_events(test_events_file)) == [f'event_{number}' for number in range(8)]
+
+def test_file_lock_without_fcntl(monkeypatch, test_events_file):
+    """fcntlのない環境ではロックファイルを作らないテスト"""
+    from .. import local_data_manager
+    monkeypatch.setattr(local_data_manager, 'fcntl', None)
+    with file_lock(test_events_file):
+        with file_lock(test_events_file):
+            pass
+    assert not os.path.exists(test_events_file + '.lock')
+
+def test_load_events_uses_snapshot_until_yaml_changes(test_events_file, sample_events_data, monkeypatch):
+    """スナップショットが新しい間はYAMLを解析せず、手で編集されたら作り直すテスト"""
+    save_events(test_events_file, sample_events_data)
+    assert os.path.exists(test_events_file + SNAPSHOT_SUFFIX)
+    with monkeypatch.context() as patch:
+        patch.setattr(yaml, 'safe_load', lambda stream: pytest.fail('YAMLを解析した'))
+        assert load_events(test_events_file) == sample_events_data
+
+    # 大きさと更新時刻を変えずに書き換えても、先頭のハッシュ値で気づく
+    stat = os.stat(test_events_file)
+    with open(test_events_file, 'r', encoding='utf-8') as f:
+        edited = f.read().replace('test_event_id_1', 'test_event_id_9')
+    with open(test_events_file, 'w', encoding='utf-8') as f:
+        f.write(edited)
+    os.utime(test_events_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    assert [event['id'] for event in load_events(test_events_file)][0] == 'test_event_id_9'
+    with monkeypatch.context() as patch:
+        patch.setattr(yaml, 'safe_load', lambda stream: pytest.fail('YAMLを解析した'))
+        assert [event['id'] for event in load_events(test_events_file)][0] == 'test_event_id_9'
+
+def test_broken_snapshot_falls_back_to_yaml(test_events_file, sample_events_data):
+    """壊れたスナップショットは無視してYAMLを読み込むテスト"""
+    save_events(test_events_file, sample_events_data)
+    with open(test_events_file + SNAPSHOT_SUFFIX, 'wb') as f:
+        f.write(b'broken')
+
+    assert load_yaml_list(test_events_file) == sample_events_data
+    assert load_yaml_list(str(os.path.dirname(test_events_file)) + '/missing.yml') == []
+
+def test_snapshot_is_private_and_skipped_for_deleted_events(tmp_path, test_events_file, sample_events_data):
+    """スナップショットは本人だけが読み書きでき、削除済みイベントファイルには作らないテスト"""
+    save_events(test_events_file, sample_events_data)
+    assert os.stat(test_events_file + SNAPSHOT_SUFFIX).st_mode & 0o777 == 0o600
+
+    deleted_events_file = str(tmp_path / "deletedevents.yml")
+    save_deleted_events([dict(sample_events_data[0], deleted_at='2024-03-01 09:00:00')], deleted_events_file)
+    save_deleted_events([dict(sample_events_data[0], deleted_at='2024-03-02 09:00:00')], deleted_events_file)
+    assert len(load_events(deleted_events_file, snapshot=False)) == 2
+    assert not os.path.exists(deleted_events_file + SNAPSHOT_SUFFIX)
+
+def test_snapshot_skipped_for_values_marshal_cannot_store(test_events_file, sample_events_data):
+    """YAMLのdate型など、marshalで保存できない値を含む場合はスナップショットを作らないテスト"""
+    with open(test_events_file, 'w', encoding='utf-8') as f:
+        f.write("- id: a\n  start_datetime: 2024-03-20\n")
+
+    assert [event['id'] for event in load_yaml_list(test_events_file)] == ['a']
+    assert not os.path.exists(test_events_file + SNAPSHOT_SUFFIX)
+
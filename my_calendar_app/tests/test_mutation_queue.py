@@ -0,0 +1,148 @@
+import pytest
+from googleapiclient.errors import HttpError
+from unittest.mock import MagicMock
+from ..mutation_queue import (
+    enqueue,
+    flush_queue,
+    load_queue,
+    save_queue
+)
+from ..google_calendar_service import new_event_id
+
+def http_error(status):
+    """指定されたステータスコードのHttpErrorを作成"""
+    resp = MagicMock()
+    resp.status = status
+    resp.reason = 'error'
+    return HttpError(resp, b'{}')
+
+def test_enqueue_add_update_delete_cancels_out(sample_event):
+    """追加→更新→削除が何も送信しない変更にまとまるテスト"""
+    event_id = new_event_id()
+    queue = enqueue([], 'add', event_id, data=sample_event)
+    queue = enqueue(queue, 'update', event_id, data={'title': '変更後'})
+
+    assert len(queue) == 1
+    assert queue[0]['op'] == 'add'
+    assert queue[0]['data']['title'] == '変更後'
+
+    queue = enqueue(queue, 'delete', event_id)
+    assert queue == []
+
+def test_enqueue_merges_updates(sample_event):
+    """更新の繰り返しが1つのパッチにまとまるテスト"""
+    base = dict(sample_event)
+    queue = enqueue([], 'update', 'event_1', data={'title': 'A'}, base=base)
+    queue = enqueue(queue, 'update', 'event_1', data={'title': 'B', 'detail': '詳細'}, base={'title': 'A'})
+    queue = enqueue(queue, 'update', 'event_2', data={'title': 'C'})
+
+    assert len(queue) == 2
+    merged = next(entry for entry in queue if entry['id'] == 'event_1')
+    assert merged['data'] == {'title': 'B', 'detail': '詳細'}
+    # 競合の判定には最初の変更前の状態を使う
+    assert merged['base'] == base
+
+    queue = enqueue(queue, 'delete', 'event_1')
+    assert next(entry for entry in queue if entry['id'] == 'event_1')['op'] == 'delete'
+
+def test_save_and_load_queue(tmp_path, sample_event):
+    """キューの保存と読み込みのテスト"""
+    queue_file = str(tmp_path / "events.queue.yml")
+    queue = enqueue([], 'add', new_event_id(), data=sample_event)
+
+    save_queue(queue_file, queue)
+    assert load_queue(queue_file) == queue
+
+    # 空になったらファイルを削除する
+    save_queue(queue_file, [])
+    assert load_queue(queue_file) == []
+    assert not (tmp_path / "events.queue.yml").exists()
+
+def test_flush_queue_detects_conflicts(batch_service, sample_google_event_pair):
+    """送信と競合検知のテスト"""
+    unchanged, changed = sample_google_event_pair
+    new_id = new_event_id()
+    queue = [
+        {'op': 'add', 'id': new_id, 'data': {'title': '新規', 'start_datetime': '2024-03-22 10:00',
+                                                'end_datetime': '2024-03-22 11:00'}, 'base': None},
+        {'op': 'update', 'id': 'event_1', 'data': {'title': '更新'}, 'base': unchanged['local']},
+        {'op': 'update', 'id': 'event_2', 'data': {'title': '更新'}, 'base': changed['local']},
+        {'op': 'delete', 'id': 'event_3', 'data': {}, 'base': unchanged['local']},
+    ]
+
+    def respond(request):
+        method, kwargs = request
+        if method == 'get':
+            if kwargs['eventId'] == 'event_1':
+                return unchanged['remote'], None
+            if kwargs['eventId'] == 'event_2':
+                return changed['remote'], None
+            return None, http_error(404)
+        if method == 'insert':
+            return dict(kwargs['body']), None
+        return {}, None
+
+    batch_service.respond = respond
+    result = flush_queue(batch_service, queue, 'withai_calendar_id')
+
+    # 追加はキューに入れたときのIDで作成する
+    assert batch_service.events.return_value.insert.call_args.kwargs['body']['id'] == new_id
+    assert sorted(entry['id'] for entry in result['sent']) == sorted(['event_1', 'event_3', new_id])
+    assert [entry['id'] for entry in result['conflicts']] == ['event_2']
+    assert result['remaining'] == result['conflicts']
+    # 競合していない更新だけをパッチとして送信する
+    events_api = batch_service.events.return_value
+    events_api.patch.assert_called_once()
+    assert events_api.patch.call_args.kwargs['eventId'] == 'event_1'
+    assert events_api.patch.call_args.kwargs['body'] == {'summary': '更新'}
+    # 既に削除済みのイベントは削除リクエストを送らない
+    events_api.delete.assert_not_called()
+
+@pytest.fixture
+def sample_google_event_pair():
+    """Google Calendar上で変更されていないイベントと変更されたイベント"""
+    local = {
+        'id': 'event_1',
+        'title': 'ミーティングA',
+        'start_datetime': '2024-03-20 15:00',
+        'end_datetime': '2024-03-20 16:00',
+        'detail': None,
+        'recurrence': None
+    }
+    remote = {
+        'id': 'event_1',
+        'summary': 'ミーティングA',
+        'description': '',
+        'start': {'dateTime': '2024-03-20T15:00:00+09:00'},
+        'end': {'dateTime': '2024-03-20T16:00:00+09:00'}
+    }
+    unchanged = {'local': local, 'remote': remote}
+    changed = {
+        'local': dict(local, id='event_2'),
+        'remote': dict(remote, id='event_2', summary='Google側で変更')
+    }
+    return unchanged, changed
+
+def test_flush_queue_resend_with_client_id(batch_service, sample_event):
+    """IDを決めて追加した変更の再送が409 Conflictでも送信済みとして扱うテスト"""
+    queue = enqueue([], 'add', 'abc123', data={key: value for key, value in sample_event.items() if key != 'id'})
+    batch_service.respond = lambda request: (
+        ({'id': 'abc123', 'status': 'confirmed'}, None) if request[0] == 'get' else (None, http_error(409)))
+
+    result = flush_queue(batch_service, queue, 'withai_calendar_id')
+
+    assert [entry['id'] for entry in result['sent']] == ['abc123']
+    assert result['remaining'] == []
+    assert batch_service.events.return_value.insert.call_args.kwargs['body']['id'] == 'abc123'
+
+def test_flush_queue_resend_onto_cancelled_event_fails(batch_service, sample_event):
+    """再送の409 Conflictの相手が削除済み（cancelled）なら送信済みにせず失敗として残すテスト"""
+    queue = enqueue([], 'add', 'abc123', data={key: value for key, value in sample_event.items() if key != 'id'})
+    batch_service.respond = lambda request: (
+        ({'id': 'abc123', 'status': 'cancelled'}, None) if request[0] == 'get' else (None, http_error(409)))
+
+    result = flush_queue(batch_service, queue, 'withai_calendar_id')
+
+    assert result['sent'] == []
+    assert [entry['id'] for entry, _ in result['failed']] == ['abc123']
+    assert [entry['id'] for entry in result['remaining']] == ['abc123']
@@ -0,0 +1,58 @@
+import time
+import pytest
+from ..prefetch import (
+    shift_range,
+    record_request,
+    learn_stride,
+    plan_prefetch,
+    start_prefetch,
+    wait_prefetch
+)
+
+def history_of(*ranges):
+    """(開始日, 終了日)の並びから履歴を作成"""
+    return [{'start': start, 'end': end} for start, end in ranges]
+
+def test_shift_range_months():
+    """月単位でずらすと月末に合わせるテスト"""
+    assert shift_range('2024-01-01', '2024-01-31', ('months', 1)) == ('2024-02-01', '2024-02-29')
+    assert shift_range('2024-01-01', '2024-01-31', ('months', -2)) == ('2023-11-01', '2023-11-30')
+    assert shift_range('2024-03-18', '2024-03-24', ('days', 7)) == ('2024-03-25', '2024-03-31')
+
+@pytest.mark.parametrize('ranges, expected', [
+    # 初回は期間の長さだけ先に進む
+    ([('2024-03-18', '2024-03-24')], ('days', 7)),
+    ([('2024-03-20', '2024-03-20')], ('days', 1)),
+    ([('2024-03-01', '2024-03-31')], ('months', 1)),
+    # 週を遡って見ている
+    ([('2024-03-18', '2024-03-24'), ('2024-03-11', '2024-03-17'), ('2024-03-04', '2024-03-10')], ('days', -7)),
+    # 1日の表示を平日だけ（月→火→水）見ている。長さの違う期間は学習に使わない
+    ([('2024-03-01', '2024-03-31'), ('2024-03-18', '2024-03-18'), ('2024-03-19', '2024-03-19')], ('days', 1)),
+    # 2か月おきに見ている
+    ([('2024-01-01', '2024-01-31'), ('2024-03-01', '2024-03-31')], ('months', 2)),
+])
+def test_learn_stride(ranges, expected):
+    """表示の履歴から先読みする間隔を学習するテスト"""
+    assert learn_stride(history_of(*ranges)) == expected
+
+def test_record_request_and_plan(tmp_path):
+    """履歴の保存と先読みする期間の計画のテスト"""
+    history_file = str(tmp_path / "prefetch.json")
+    record_request('2024-03-11', '2024-03-17', history_file=history_file)
+    history = record_request('2024-03-18', '2024-03-24', history_file=history_file)
+
+    assert plan_prefetch(history, budget=2) == [('2024-03-25', '2024-03-31'), ('2024-04-01', '2024-04-07')]
+    assert plan_prefetch(history, budget=0) == []
+
+def test_start_prefetch_respects_time_budget():
+    """時間の上限を過ぎたら残りの期間を取得しないテスト"""
+    fetched = []
+
+    def slow_fetch(start_date, end_date):
+        fetched.append(start_date)
+        time.sleep(0.2)
+
+    start_prefetch(slow_fetch, [('2024-03-25', '2024-03-31'), ('2024-04-01', '2024-04-07')], time_budget=0.1)
+    wait_prefetch()
+
+    assert fetched == ['2024-03-25']
@@ -0,0 +1,108 @@
+import time
+import threading
+import urllib.error
+import urllib.request
+import pytest
+from unittest.mock import MagicMock
+from ..push_sync import NotificationReceiver, watch_changes, open_channel
+
+def post(receiver, channel_id, state='exists', token=None):
+    """Google Calendarと同じヘッダーで通知を送り、ステータスコードを返す"""
+    request = urllib.request.Request(receiver.url, data=b'', method='POST', headers={
+        'X-Goog-Channel-ID': channel_id,
+        'X-Goog-Channel-Token': token or receiver.token,
+        'X-Goog-Resource-State': state,
+        'X-Goog-Message-Number': '1',
+    })
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as error:
+        return error.code
+
+def channel(channel_id, expires_in):
+    """期限がexpires_in秒後のチャネル"""
+    return {'id': channel_id, 'resourceId': f'resource-{channel_id}',
+            'expiration': str(int((time.time() + expires_in) * 1000))}
+
+def test_open_channel_requests_web_hook():
+    """events().watchにweb_hookのチャネルを登録するテスト"""
+    service = MagicMock()
+    service.events.return_value.watch.return_value.execute.return_value = {'id': 'c1'}
+
+    assert open_channel(service, 'calendar', 'https://example.com/notify', 'secret', ttl=3600) == {'id': 'c1'}
+    kwargs = service.events.return_value.watch.call_args.kwargs
+    assert kwargs['calendarId'] == 'calendar'
+    assert kwargs['body']['type'] == 'web_hook'
+    assert kwargs['body']['token'] == 'secret'
+    assert kwargs['body']['params'] == {'ttl': '3600'}
+
+def test_receiver_accepts_only_known_channels():
+    """登録中のチャネルで合言葉が一致する通知だけを受け付けるテスト"""
+    with NotificationReceiver(port=0) as receiver:
+        receiver.allow('c1')
+        assert post(receiver, 'c1') == 200
+        assert post(receiver, 'c1', token='wrong') == 403
+        assert post(receiver, 'unknown') == 403
+        receiver.revoke('c1')
+        assert post(receiver, 'c1') == 403
+
+    assert receiver.notifications.get_nowait()['channel_id'] == 'c1'
+    assert receiver.notifications.empty()
+
+def test_watch_changes_syncs_once_per_burst_of_notifications():
+    """確認の通知は無視し、続けて届いた通知は1回の取得にまとめるテスト"""
+    closed = []
+    syncs = []
+
+    def sync():
+        syncs.append(time.monotonic())
+        if len(syncs) == 1:
+            # チャネルを張った直後の取得のあとに通知が届く
+            threading.Thread(target=lambda: [post(receiver, 'c1', state=state)
+                                             for state in ('sync', 'exists', 'exists', 'exists')]).start()
+        else:
+            raise KeyboardInterrupt
+
+    with NotificationReceiver(port=0) as receiver:
+        with pytest.raises(KeyboardInterrupt):
+            watch_changes(receiver, subscribe=lambda: channel('c1', 3600), unsubscribe=closed.append,
+                          sync=sync, renew_margin=60, settle=0.3)
+
+    assert len(syncs) == 2
+    assert receiver.notifications.empty()
+    assert [entry['id'] for entry in closed] == ['c1']
+
+def test_watch_changes_renews_channel_before_expiry():
+    """期限の前に新しいチャネルを張り、古いチャネルの通知は受け付けないテスト"""
+    channels = iter([channel('c1', 0.5), channel('c2', 3600)])
+    renewed = threading.Event()
+    closed = []
+    statuses = []
+
+    def subscribe():
+        current = next(channels)
+        if current['id'] == 'c2':
+            renewed.set()
+        return current
+
+    def poster():
+        renewed.wait(5)
+        # 古いチャネルを止めるのを待ってから送る
+        while not closed:
+            time.sleep(0.01)
+        statuses.append(post(receiver, 'c1'))
+        statuses.append(post(receiver, 'c2'))
+
+    def sync():
+        if renewed.is_set():
+            raise KeyboardInterrupt
+
+    with NotificationReceiver(port=0) as receiver:
+        threading.Thread(target=poster).start()
+        with pytest.raises(KeyboardInterrupt):
+            watch_changes(receiver, subscribe=subscribe, unsubscribe=closed.append,
+                          sync=sync, renew_margin=0.3, settle=0)
+
+    assert statuses == [403, 200]
+    assert [entry['id'] for entry in closed] == ['c1', 'c2']
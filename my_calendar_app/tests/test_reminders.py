@@ -0,0 +1,155 @@
+import os
+import pytest
+import yaml
+from datetime import datetime, timedelta
+from itertools import islice
+from .. import reminders
+from ..reminders import iter_occurrences, ReminderScheduler, upcoming, watch_reminders
+
+def at(value):
+    """"YYYY-MM-DD HH:MM"形式の日時を変換"""
+    return datetime.strptime(value, "%Y-%m-%d %H:%M")
+
+def event(event_id, start, end, recurrence=None, title='予定'):
+    """ローカル形式のイベントを作成"""
+    return {'id': event_id, 'title': title, 'start_datetime': start, 'end_datetime': end,
+            'detail': None, 'recurrence': recurrence}
+
+def test_iter_occurrences_skips_past_lazily():
+    """定期イベントの過去の繰り返しを飛ばして必要な分だけ展開するテスト"""
+    # 2024-03-22は金曜日
+    weekday = event('weekday', '2000-01-03 09:00', '2000-01-03 09:30', recurrence='weekday')
+    assert list(islice(iter_occurrences(weekday, at('2024-03-22 09:00')), 2)) == [
+        at('2024-03-25 09:00'), at('2024-03-26 09:00')]
+
+    monthly = event('monthly', '2024-01-31 10:00', '2024-01-31 11:00', recurrence='monthly')
+    assert list(islice(iter_occurrences(monthly, at('2024-02-01 00:00')), 2)) == [
+        at('2024-03-31 10:00'), at('2024-05-31 10:00')]
+
+    single = event('single', '2024-03-20 10:00', '2024-03-20 11:00')
+    assert list(iter_occurrences(single, at('2024-03-20 10:00'))) == []
+
+def test_scheduler_pops_in_order_and_requeues_series():
+    """通知時刻順に取り出し、定期イベントは次の予定を入れ直すテスト"""
+    scheduler = ReminderScheduler(lead=timedelta(minutes=10))
+    scheduler.load([
+        event('daily', '2024-03-01 09:00', '2024-03-01 09:15', recurrence='daily', title='朝会'),
+        event('review', '2024-03-20 08:55', '2024-03-20 09:30', title='レビュー'),
+    ], at('2024-03-20 08:00'))
+
+    assert scheduler.next_due() == at('2024-03-20 08:45')
+    due = scheduler.pop_due(at('2024-03-20 08:50'))
+    assert [(reminder.title, reminder.start) for reminder in due] == [
+        ('レビュー', at('2024-03-20 08:55')), ('朝会', at('2024-03-20 09:00'))]
+    assert due[1].end == at('2024-03-20 09:15')
+    # 朝会の次の予定が入れ直される
+    assert scheduler.next_due() == at('2024-03-21 08:50')
+
+def test_scheduler_update_only_touches_changed_events():
+    """変更・削除・追加されたイベントの分だけヒープを更新するテスト"""
+    scheduler = ReminderScheduler(lead=timedelta(minutes=10))
+    events = [event('a', '2024-03-20 10:00', '2024-03-20 11:00'),
+              event('b', '2024-03-20 11:00', '2024-03-20 12:00'),
+              event('c', '2024-03-20 12:00', '2024-03-20 13:00')]
+    now = at('2024-03-20 09:00')
+    scheduler.load(events, now)
+
+    counts = scheduler.update([
+        events[0],
+        dict(events[1], start_datetime='2024-03-20 14:00', end_datetime='2024-03-20 15:00'),
+        event('d', '2024-03-20 13:00', '2024-03-20 14:00'),
+    ], now)
+
+    assert counts == {'added': 1, 'changed': 1, 'removed': 1}
+    assert [reminder.event_id for reminder in scheduler.pop_due(at('2024-03-20 23:00'))] == ['a', 'd', 'b']
+
+def test_changed_event_is_not_notified_twice():
+    """通知済みの予定のタイトルを変えても通知し直さないテスト"""
+    scheduler = ReminderScheduler(lead=timedelta(minutes=10))
+    meeting = event('a', '2024-03-20 10:00', '2024-03-20 11:00')
+    scheduler.load([meeting], at('2024-03-20 09:00'))
+    assert len(scheduler.pop_due(at('2024-03-20 09:50'))) == 1
+
+    scheduler.update([dict(meeting, title='変更後')], at('2024-03-20 09:52'))
+    assert scheduler.next_due() is None
+
+def test_upcoming():
+    """期間内の予定を定期イベントを展開して開始日時順に返すテスト"""
+    events = [event('weekly', '2024-03-04 10:00', '2024-03-04 11:00', recurrence='weekly'),
+              event('single', '2024-03-19 09:00', '2024-03-19 10:00')]
+
+    reminders = upcoming(events, at('2024-03-18 00:00'), at('2024-03-26 00:00'))
+
+    assert [(reminder.event_id, reminder.start) for reminder in reminders] == [
+        ('weekly', at('2024-03-18 10:00')), ('single', at('2024-03-19 09:00')), ('weekly', at('2024-03-25 10:00'))]
+
+def test_upcoming_keeps_start_order_across_recurring_and_single_events():
+    """定期イベントの2回目以降も、単発の予定と開始日時順に並ぶテスト"""
+    events = [event('daily', '2024-03-20 09:00', '2024-03-20 09:30', recurrence='daily'),
+              event('single', '2024-03-22 08:00', '2024-03-22 08:30')]
+
+    reminders = upcoming(events, at('2024-03-20 00:00'), at('2024-03-23 00:00'))
+
+    assert [(reminder.event_id, reminder.start) for reminder in reminders] == [
+        ('daily', at('2024-03-20 09:00')), ('daily', at('2024-03-21 09:00')),
+        ('single', at('2024-03-22 08:00')), ('daily', at('2024-03-22 09:00'))]
+    assert all(reminder.remind_at == reminder.start for reminder in reminders)
+
+def test_watch_reminders_sleeps_until_due_and_reloads_on_change(tmp_path):
+    """次の通知時刻まで眠り、events.ymlが変わったら読み込み直すテスト"""
+    events_file = tmp_path / "events.yml"
+    events_file.write_text(yaml.dump([event('a', '2024-03-20 10:00', '2024-03-20 11:00')],
+                                     allow_unicode=True), encoding='utf-8')
+    clock = [at('2024-03-20 09:00')]
+    sleeps = []
+    notified = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) == 1:
+            # 眠っている間に予定が追加される
+            events_file.write_text(yaml.dump([event('a', '2024-03-20 10:00', '2024-03-20 11:00'),
+                                              event('b', '2024-03-20 09:25', '2024-03-20 10:00')],
+                                             allow_unicode=True), encoding='utf-8')
+            os.utime(events_file, (1, 1))
+        if len(notified) == 2:
+            raise KeyboardInterrupt
+        clock[0] += timedelta(seconds=seconds)
+
+    with pytest.raises(KeyboardInterrupt):
+        watch_reminders(str(events_file), notified.append, lead=timedelta(minutes=10),
+                        poll_seconds=600, clock=lambda: clock[0], sleep=sleep)
+
+    # 変更の確認間隔（10分）で起きて追加に気づき、追加された予定の通知時刻（09:15）まで眠る
+    assert sleeps[:2] == [600, 300]
+    assert [(reminder.event_id, reminder.remind_at) for reminder in notified] == [
+        ('b', at('2024-03-20 09:15')), ('a', at('2024-03-20 09:50'))]
+    assert max(sleeps) <= 600
+
+def test_watch_reminders_checks_file_only_at_poll_interval(tmp_path, monkeypatch):
+    """通知のために起きたときはevents.ymlを確認せず、確認間隔ごとにだけ確認するテスト"""
+    events_file = tmp_path / "events.yml"
+    events_file.write_text(yaml.dump([event(name, f'2024-03-20 09:0{minute}', '2024-03-20 10:00')
+                                      for minute, name in enumerate('abc', start=1)],
+                                     allow_unicode=True), encoding='utf-8')
+    checks = []
+    original = reminders.storage_stamp
+    monkeypatch.setattr(reminders, 'storage_stamp', lambda path: checks.append(path) or original(path))
+    clock = [at('2024-03-20 09:00')]
+    sleeps = []
+    notified = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        if len(notified) == 3:
+            raise KeyboardInterrupt
+        clock[0] += timedelta(seconds=seconds)
+
+    with pytest.raises(KeyboardInterrupt):
+        watch_reminders(str(events_file), notified.append, lead=timedelta(0),
+                        poll_seconds=3600, clock=lambda: clock[0], sleep=sleep)
+
+    assert [reminder.event_id for reminder in notified] == ['a', 'b', 'c']
+    assert sleeps[:3] == [60, 60, 60]
+    # 起動時の1回だけ
+    assert len(checks) == 1
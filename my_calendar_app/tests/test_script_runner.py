@@ -0,0 +1,37 @@
+import json
+from ..script_runner import parse_operations, schedule_rounds
+
+def test_parse_operations_normalizes_and_validates():
+    """操作を読み込み、不正な行を行番号付きで返すテスト"""
+    lines = [
+        '# 会議の準備',
+        json.dumps({'command': 'add', 'start_datetime': '2024-03-20 15:00', 'end_datetime': '2024-03-20 16:00',
+                    'title': '会議', 'idempotency-key': 'meeting'}),
+        '',
+        json.dumps({'command': 'update', 'event_id': 'event_1', 'recurrence': 'none'}),
+        json.dumps({'command': 'list', 'start': '2024-03-20', 'local': True}),
+        json.dumps({'command': 'add', 'start_datetime': '2024-03-20 16:00', 'end_datetime': '2024-03-20 15:00',
+                    'title': '逆転'}),
+        json.dumps({'command': 'update', 'event_id': 'event_1'}),
+        json.dumps({'command': 'delete', 'event_id': 'event_1', 'match': '会議'}),
+        json.dumps({'command': 'move'}),
+        '{"command": "add"',
+        json.dumps({'command': 'list', 'start': '2024/03/20'}),
+    ]
+
+    operations, errors = parse_operations(lines)
+
+    assert [(operation['line'], operation['command']) for operation in operations] == [
+        (2, 'add'), (4, 'update'), (5, 'list')]
+    assert operations[0]['idempotency_key'] == 'meeting'
+    assert [error['line'] for error in errors] == [6, 7, 8, 9, 10, 11]
+    assert errors[0]['error'] == '開始時刻は終了時刻より前である必要があります'
+    assert errors[1]['error'] == '更新する項目がありません'
+    assert 'match' in errors[2]['error']
+
+def test_schedule_rounds_orders_operations_on_same_event():
+    """同じイベントへの操作だけを後の組に送るテスト"""
+    operations = [{'event_id': event_id} for event_id in ['a', 'b', 'a', 'c', 'a', 'b']]
+
+    assert schedule_rounds(operations) == [[0, 1, 3], [2, 5], [4]]
+    assert schedule_rounds([]) == []
@@ -0,0 +1,100 @@
+import os
+import pytest
+from ..local_data_manager import save_events
+from ..search_index import (
+    build_index,
+    add_to_index,
+    remove_from_index,
+    search,
+    ngrams,
+    index_path_for,
+    load_or_build_index,
+    update_index,
+    source_stamps
+)
+
+@pytest.fixture
+def japanese_events():
+    """日本語のタイトルと詳細を持つイベント"""
+    return [
+        {
+            'id': 'event_1',
+            'title': 'Officeのプロダクトキー確認',
+            'start_datetime': '2024-03-21 10:00',
+            'end_datetime': '2024-03-21 11:00',
+            'detail': 'ライセンス管理表を更新する'
+        },
+        {
+            'id': 'event_2',
+            'title': '定例ミーティング',
+            'start_datetime': '2024-03-20 15:00',
+            'end_datetime': '2024-03-20 16:00',
+            'detail': None
+        }
+    ]
+
+def test_ngrams():
+    """文字2-gramの生成テスト"""
+    assert ngrams('定例会議') == {'定例', '例会', '会議'}
+    assert ngrams('a b') == {'a', 'b'}
+
+def test_search(japanese_events):
+    """タイトルと詳細の検索テスト"""
+    index = build_index(japanese_events)
+
+    assert [r['id'] for r in search(index, 'プロダクトキー')] == ['event_1']
+    # 詳細も検索対象
+    assert [r['id'] for r in search(index, 'ライセンス')] == ['event_1']
+    # 全角・半角と大文字・小文字は区別しない
+    assert [r['id'] for r in search(index, 'ＯＦＦＩＣＥ')] == ['event_1']
+    # n-gramは一致しても文字列として含まれないものは返さない
+    assert search(index, 'キープロダクト') == []
+    # AND検索と1文字の検索
+    assert [r['id'] for r in search(index, '定例 ミーティング')] == ['event_2']
+    assert [r['id'] for r in search(index, '例')] == ['event_2']
+
+def test_search_deleted_events(japanese_events):
+    """削除済みイベントの検索テスト"""
+    deleted = [dict(japanese_events[1], id='event_3', deleted_at='2024-03-01 10:00:00')]
+    index = build_index(japanese_events, deleted)
+
+    assert [r['id'] for r in search(index, '定例')] == ['event_2']
+    results = search(index, '定例', include_deleted=True)
+    assert {r['id']: r['source'] for r in results} == {'event_2': 'events', 'event_3': 'deleted'}
+
+def test_update_and_remove(japanese_events):
+    """インデックスの差分更新テスト"""
+    index = build_index(japanese_events)
+
+    add_to_index(index, dict(japanese_events[1], title='週次レビュー'))
+    assert search(index, '定例') == []
+    assert [r['id'] for r in search(index, 'レビュー')] == ['event_2']
+
+    remove_from_index(index, 'event_2')
+    assert search(index, 'レビュー') == []
+    assert 'レビ' not in index['postings']
+
+def test_load_or_build_index(tmp_path, japanese_events):
+    """インデックスの永続化と差分更新、手作業での変更検知のテスト"""
+    events_file = str(tmp_path / "events.yml")
+    deleted_events_file = str(tmp_path / "deletedevents.yml")
+    save_events(events_file, japanese_events)
+
+    index = load_or_build_index(events_file, deleted_events_file)
+    assert os.path.exists(index_path_for(events_file))
+    assert [r['id'] for r in search(index, '定例')] == ['event_2']
+
+    # コマンドからの変更は差分で反映する
+    stamps = source_stamps(events_file, deleted_events_file)
+    new_event = {'id': 'event_3', 'title': '予算会議', 'start_datetime': '2024-04-01 09:00',
+                 'end_datetime': '2024-04-01 10:00', 'detail': None}
+    save_events(events_file, japanese_events + [new_event])
+    update_index(events_file, deleted_events_file, stamps, upserts=[new_event])
+    index = load_or_build_index(events_file, deleted_events_file)
+    assert [r['id'] for r in search(index, '予算')] == ['event_3']
+
+    # 手作業での変更は次回の検索時に作り直して反映する
+    save_events(events_file, [dict(japanese_events[0], title='棚卸し')])
+    index = load_or_build_index(events_file, deleted_events_file)
+    assert [r['id'] for r in search(index, '棚卸')] == ['event_1']
+    assert search(index, '予算') == []
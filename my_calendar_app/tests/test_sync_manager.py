@@ -0,0 +1,203 @@
+import pytest
+from googleapiclient.errors import HttpError
+from unittest.mock import MagicMock
+from ..sync_manager import (
+    content_hash,
+    fetch_remote_changes,
+    plan_reconcile,
+    apply_remote_plan
+)
+
+def google_event(event_id, title, etag):
+    """Google Calendar API形式のイベントを作成"""
+    return {
+        'id': event_id,
+        'etag': etag,
+        'summary': title,
+        'start': {'dateTime': '2024-03-20T15:00:00+09:00'},
+        'end': {'dateTime': '2024-03-20T16:00:00+09:00'}
+    }
+
+def local_event(event_id, title):
+    """ローカル形式のイベントを作成"""
+    return {
+        'id': event_id,
+        'title': title,
+        'start_datetime': '2024-03-20 15:00',
+        'end_datetime': '2024-03-20 16:00',
+        'detail': None,
+        'recurrence': None
+    }
+
+def synced_state(*events, sync_token='token_1'):
+    """指定されたローカルのイベントで同期済みの状態を作成"""
+    return {
+        'sync_token': sync_token,
+        'events': {event['id']: {'etag': f"etag_{event['id']}", 'hash': content_hash(event)} for event in events}
+    }
+
+def test_content_hash_normalizes_empty_values():
+    """空の値と'none'の繰り返しを同じ内容として扱うテスト"""
+    event = local_event('event_1', 'A')
+    assert content_hash(event) == content_hash(dict(event, detail='', recurrence='none'))
+    assert content_hash(event) != content_hash(dict(event, title='B'))
+
+def test_fetch_remote_changes_full_fetches_only_stale_bodies(batch_service):
+    """全件取得ではetagが変わったイベントだけ本体を取得するテスト"""
+    state = synced_state(local_event('event_1', 'A'), local_event('event_2', 'B'), sync_token=None)
+    events_api = batch_service.events.return_value
+    events_api.list.side_effect = None
+    events_api.list.return_value.execute.return_value = {
+        'items': [
+            {'id': 'event_1', 'etag': 'etag_event_1'},
+            {'id': 'event_3', 'etag': 'etag_event_3'},
+            {'id': 'event_3_20240321', 'etag': 'x', 'recurringEventId': 'event_3'},
+        ],
+        'nextSyncToken': 'token_2'
+    }
+    batch_service.respond = lambda request: (google_event(request[1]['eventId'], '新規', 'etag_event_3'), None)
+
+    remote = fetch_remote_changes(batch_service, 'calendar_id', state)
+
+    assert remote['full'] is True
+    assert remote['sync_token'] == 'token_2'
+    # event_1は変わっていない、event_2は削除された、event_3は新規
+    assert set(remote['changed']) == {'event_2', 'event_3'}
+    assert remote['changed']['event_2'] is None
+    assert events_api.get.call_count == 1
+    assert events_api.list.call_args.kwargs['fields'].startswith('items(id,etag')
+
+def test_fetch_remote_changes_incremental_falls_back_on_410(batch_service):
+    """同期トークンが失効していたら全件取得に切り替えるテスト"""
+    state = synced_state(local_event('event_1', 'A'))
+    resp = MagicMock()
+    resp.status = 410
+    events_api = batch_service.events.return_value
+    events_api.list.side_effect = None
+    events_api.list.return_value.execute.side_effect = [
+        HttpError(resp, b'{}'),
+        {'items': [{'id': 'event_1', 'etag': 'etag_event_1'}], 'nextSyncToken': 'token_2'}
+    ]
+    batch_service.respond = lambda request: pytest.fail('本体を取得する必要はない')
+
+    remote = fetch_remote_changes(batch_service, 'calendar_id', state)
+
+    assert remote == {'changed': {}, 'sync_token': 'token_2', 'full': True}
+    assert events_api.list.call_args_list[0].kwargs['syncToken'] == 'token_1'
+
+def test_fetch_remote_changes_treats_vanished_event_as_deleted(batch_service):
+    """一覧の取得後に削除されたイベント（404/410）は削除として扱い、他のエラーは送出するテスト"""
+    state = synced_state(local_event('event_1', 'A'), local_event('event_2', 'B'), sync_token=None)
+    events_api = batch_service.events.return_value
+    events_api.list.side_effect = None
+    events_api.list.return_value.execute.return_value = {
+        'items': [{'id': 'event_1', 'etag': 'etag_new_1'}, {'id': 'event_2', 'etag': 'etag_new_2'}],
+        'nextSyncToken': 'token_2'
+    }
+
+    def http_error(status):
+        resp = MagicMock()
+        resp.status = status
+        return HttpError(resp, b'{}')
+
+    statuses = {'event_1': 404, 'event_2': 410}
+    batch_service.respond = lambda request: (None, http_error(statuses[request[1]['eventId']]))
+
+    remote = fetch_remote_changes(batch_service, 'calendar_id', state)
+
+    assert remote['changed'] == {'event_1': None, 'event_2': None}
+
+    statuses['event_2'] = 500
+    with pytest.raises(HttpError):
+        fetch_remote_changes(batch_service, 'calendar_id', state)
+
+def test_plan_reconcile_one_sided_changes():
+    """片方だけの変更をもう片方に反映する計画のテスト"""
+    base = [local_event(f'event_{i}', f'元{i}') for i in range(1, 6)]
+    state = synced_state(*base)
+    local_events = [
+        base[0],                                  # 変更なし
+        dict(base[1], title='ローカルで変更'),      # ローカルだけ変更
+        base[2],                                  # Google Calendarだけ変更
+        base[3],                                  # Google Calendarで削除
+        # base[4]はローカルで削除
+    ]
+    remote = {'changed': {
+        'event_3': google_event('event_3', 'Googleで変更', 'etag_new'),
+        'event_4': None,
+        'event_9': google_event('event_9', 'Googleで追加', 'etag_9'),
+    }, 'sync_token': 'token_2', 'full': False}
+
+    plan = plan_reconcile(local_events, remote, state)
+
+    assert [event['id'] for event in plan['remote_patches']] == ['event_2']
+    assert [(event['id'], event['title']) for event in plan['local_upserts']] == [
+        ('event_3', 'Googleで変更'), ('event_9', 'Googleで追加')]
+    assert plan['local_deletes'] == ['event_4']
+    assert plan['remote_deletes'] == ['event_5']
+    assert plan['conflicts'] == []
+
+@pytest.mark.parametrize('policy, expected_title', [('remote', 'Google側'), ('local', 'ローカル側')])
+def test_plan_reconcile_conflict_policy(policy, expected_title):
+    """両方で変更されたイベントを方針に従って解決するテスト"""
+    base = local_event('event_1', '元')
+    state = synced_state(base)
+    local_events = [dict(base, title='ローカル側')]
+    remote = {'changed': {'event_1': google_event('event_1', 'Google側', 'etag_new')},
+              'sync_token': 'token_2', 'full': False}
+
+    plan = plan_reconcile(local_events, remote, state, policy=policy)
+
+    assert plan['conflicts'] == ['event_1']
+    winners = plan['local_upserts'] + plan['remote_patches']
+    assert [event['title'] for event in winners] == [expected_title]
+
+def test_plan_reconcile_same_content_is_in_sync():
+    """両方が同じ内容に変わっていれば何も反映しないテスト"""
+    local_events = [local_event('event_1', '同じ')]
+    remote = {'changed': {'event_1': google_event('event_1', '同じ', 'etag_1')}, 'sync_token': 't', 'full': True}
+
+    plan = plan_reconcile(local_events, remote, {'sync_token': None, 'events': {}})
+
+    assert plan['in_sync'] == {'event_1': 'etag_1'}
+    assert not (plan['local_upserts'] or plan['remote_patches'] or plan['conflicts'])
+
+def test_plan_reconcile_first_run_pushes_local_only_events():
+    """同期状態がない初回は、方針に関わらずローカルだけのイベントを送信するテスト"""
+    local_events = [local_event('event_1', 'ローカルだけ')]
+    remote = {'changed': {'event_2': google_event('event_2', 'Googleだけ', 'etag_2')},
+              'sync_token': 't', 'full': True}
+
+    plan = plan_reconcile(local_events, remote, {'sync_token': None, 'events': {}}, policy='remote')
+
+    assert [event['id'] for event in plan['remote_inserts']] == ['event_1']
+    assert [event['id'] for event in plan['local_upserts']] == ['event_2']
+    assert plan['local_deletes'] == [] and plan['conflicts'] == []
+
+def test_apply_remote_plan(batch_service):
+    """Google Calendarへの反映のテスト"""
+    plan = {
+        'remote_inserts': [local_event('event_1', '追加')],
+        'remote_patches': [local_event('event_2', '更新')],
+        'remote_deletes': ['event_3'],
+    }
+
+    def respond(request):
+        method, kwargs = request
+        if method == 'insert':
+            return {'id': 'new_id', 'etag': 'etag_new'}, None
+        if method == 'patch':
+            return {'id': kwargs['eventId'], 'etag': 'etag_patched'}, None
+        return None, None
+
+    batch_service.respond = respond
+    result = apply_remote_plan(batch_service, 'calendar_id', plan)
+
+    assert result['id_map'] == {'event_1': 'new_id'}
+    assert result['etags'] == {'new_id': 'etag_new', 'event_2': 'etag_patched'}
+    assert result['deleted'] == ['event_3']
+    assert result['failed'] == []
+    body = batch_service.events.return_value.patch.call_args.kwargs['body']
+    assert body['summary'] == '更新'
+    assert body['description'] == ''
+    assert 'recurrence' not in body